@@ -0,0 +1,297 @@
+"""Deadlines, step and token budgets, and hedged model requests for agent runs.
+
+`BudgetMiddleware` sits in the LangChain agent loop. Before every model turn it checks
+the run against its budget:
+- a deadline for the whole analysis, shared by nested agents (the cascade's tiers)
+- the number of model turns
+- the tokens reported by the model so far
+
+When any of them is exhausted, or a model call is still outstanding at the deadline, the
+run stops with `BudgetExceededError`. The error carries the conversation so far, and
+`partial_response` turns that into a best-effort verdict from the tool results gathered
+up to that point.
+
+Model calls slower than a recent latency percentile are hedged: a duplicate request is
+sent and whichever answers first is used, which trims the tail that one slow upstream
+response would otherwise add. Hedging only starts once enough calls have been timed.
+Latency is timed from when a request leaves the rate-limit queue, so a throttled call is
+not hedged (which would only add to the demand), and an attempt still queued when its
+call is answered or out of time gives its slot back instead of being sent.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+import numpy as np
+from langchain.agents.middleware import AgentMiddleware, ModelRequest
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from pydantic import BaseModel
+
+from agents.models import ProcessResponse
+from agents.ratelimit import ScheduledChatOpenAI, before_send
+
+# gunicorn kills a request after 120s (see Dockerfile); stop early enough to still answer
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("NIDS_DEADLINE_SECONDS", 90))
+DEFAULT_MAX_STEPS = int(os.getenv("NIDS_MAX_STEPS", 12))
+DEFAULT_MAX_TOKENS = int(os.getenv("NIDS_MAX_TOKENS", 100_000))
+DEFAULT_HEDGE_PERCENTILE = float(os.getenv("NIDS_HEDGE_PERCENTILE", 95))
+# Markers the verification tools use for a failed check
+FAILURE_MARKERS = ("✗", "⚠️", "❌", "NOT found", "not found in either")
+OLD_PRICING_MARKERS = ("OUTDATED pricing", "old pricing should NOT be used")
+
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("run_deadline", default=None)
+
+
+class Budget(BaseModel):
+    """Limits for one agent run; None turns a limit off."""
+    deadline_seconds: float | None = DEFAULT_DEADLINE_SECONDS
+    max_steps: int | None = DEFAULT_MAX_STEPS
+    max_tokens: int | None = DEFAULT_MAX_TOKENS
+    # Hedge model calls still running after this percentile of recent call latencies
+    hedge_percentile: float | None = DEFAULT_HEDGE_PERCENTILE
+    # Calls faster than this are never hedged, whatever the percentile says
+    min_hedge_seconds: float = 1.0
+
+
+class BudgetExceededError(Exception):
+    """Raised inside the agent loop when a run is out of time, steps or tokens."""
+
+    def __init__(self, reason: str, messages: list[BaseMessage]):
+        super().__init__(reason)
+        self.reason = reason
+        self.messages = messages
+
+
+@contextmanager
+def run_deadline(seconds: float | None):
+    """Give the analysis in the block `seconds` to finish; an enclosing deadline that is sooner still applies."""
+    outer = _deadline.get()
+    deadline = outer if seconds is None else time.monotonic() + seconds
+    if outer is not None:
+        deadline = min(outer, deadline)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_remaining() -> float | None:
+    """Seconds left before the current deadline, or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class LatencyTracker:
+    """Recent model call latencies per model, to decide when a call is slow enough to hedge."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: dict[str, deque[float]] = {}
+        self._lock = threading.Lock()
+        self.hedged = 0
+        self.hedges_won = 0
+
+    def observe(self, model: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model: str, q: float) -> float | None:
+        with self._lock:
+            samples = list(self._samples.get(model, ()))
+        return float(np.percentile(samples, q)) if len(samples) >= self.min_samples else None
+
+    def record_hedge(self, won: bool):
+        with self._lock:
+            self.hedged += 1
+            self.hedges_won += int(won)
+
+
+latency_tracker = LatencyTracker()
+# Synchronous model calls that race a deadline or a hedge run here while the caller waits: one
+# thread per in-flight analysis, two while a hedge is outstanding
+_hedge_pool = ThreadPoolExecutor(max_workers=int(os.getenv("NIDS_MODEL_CALL_THREADS", 32)), thread_name_prefix="model-call")
+
+
+def _model_name(request: ModelRequest) -> str:
+    return getattr(request.model, "model_name", None) or type(request.model).__name__
+
+
+def _sooner(a: float | None, b: float | None) -> float | None:
+    """The smaller of two timeouts, where None means no timeout; never negative."""
+    timeouts = [t for t in (a, b) if t is not None]
+    return max(min(timeouts), 0.0) if timeouts else None
+
+
+def _before_deadline(seconds: float) -> bool:
+    remaining = time_remaining()
+    return remaining is None or seconds < remaining
+
+
+def _check_not_abandoned(decided: threading.Event, messages: list[BaseMessage]):
+    """Stop an attempt that left the rate-limit queue after its call was answered or timed out."""
+    remaining = time_remaining()
+    if decided.is_set() or (remaining is not None and remaining <= 0):
+        raise BudgetExceededError("the model call was abandoned before it was sent", messages)
+
+
+def _tokens_used(messages: list[BaseMessage]) -> int:
+    return sum((m.usage_metadata or {}).get("total_tokens", 0) for m in messages if isinstance(m, AIMessage))
+
+
+class BudgetMiddleware(AgentMiddleware):
+    """Enforces a Budget on the agent loop and hedges slow model calls."""
+
+    def __init__(self, budget: Budget, tracker: LatencyTracker = latency_tracker):
+        super().__init__()
+        self.budget = budget
+        self.tracker = tracker
+
+    def _check(self, messages: list[BaseMessage]):
+        """Stop the run before the next model turn when a limit is reached."""
+        remaining = time_remaining()
+        steps = sum(isinstance(m, AIMessage) for m in messages)
+        tokens = _tokens_used(messages)
+        if remaining is not None and remaining <= 0:
+            raise BudgetExceededError("the deadline passed", messages)
+        if self.budget.max_steps is not None and steps >= self.budget.max_steps:
+            raise BudgetExceededError(f"the limit of {self.budget.max_steps} model turns was reached", messages)
+        if self.budget.max_tokens is not None and tokens >= self.budget.max_tokens:
+            raise BudgetExceededError(f"the budget of {self.budget.max_tokens} tokens was used up ({tokens})", messages)
+
+    def _hedge_after(self, request: ModelRequest) -> float | None:
+        if self.budget.hedge_percentile is None:
+            return None
+        delay = self.tracker.percentile(_model_name(request), self.budget.hedge_percentile)
+        return None if delay is None else max(delay, self.budget.min_hedge_seconds)
+
+    def wrap_model_call(self, request: ModelRequest, handler):
+        self._check(request.messages)
+        remaining, hedge_after = time_remaining(), self._hedge_after(request)
+        model, queued = _model_name(request), isinstance(request.model, ScheduledChatOpenAI)
+        decided = threading.Event()
+
+        def call(sent: threading.Event):
+            started = time.perf_counter()
+
+            def send():
+                nonlocal started
+                _check_not_abandoned(decided, request.messages)
+                started = time.perf_counter()
+                sent.set()
+
+            if not queued:
+                sent.set()
+            try:
+                with before_send(send):
+                    response = handler(request)
+            finally:
+                sent.set()
+            # Only the time after the rate limiter let the request through counts as model latency
+            self.tracker.observe(model, time.perf_counter() - started)
+            return response
+
+        if remaining is None and hedge_after is None:
+            return call(threading.Event())
+        # Each attempt runs in a copy of this context, so tracing and the catalog pin carry over
+        first_sent = threading.Event()
+        attempts = [_hedge_pool.submit(contextvars.copy_context().run, call, first_sent)]
+        try:
+            if hedge_after is not None:
+                # The hedge timer starts once the first attempt is sent, so waiting for the rate limit is not mistaken for a slow call
+                first_sent.wait(timeout=_sooner(time_remaining(), None))
+                done, _ = wait(attempts, timeout=_sooner(hedge_after, time_remaining()))
+                if not done and _before_deadline(hedge_after):
+                    attempts.append(_hedge_pool.submit(contextvars.copy_context().run, call, threading.Event()))
+            pending = set(attempts)
+            while True:
+                done, pending = wait(pending, timeout=_sooner(time_remaining(), None), return_when=FIRST_COMPLETED)
+                if not done:
+                    # Outstanding calls finish in the background; those still queued for the rate limit are not sent
+                    raise BudgetExceededError("the deadline passed while waiting for the model", request.messages)
+                winner = next((attempt for attempt in done if attempt.exception() is None), None)
+                if winner is not None or not pending:
+                    if len(attempts) > 1:
+                        self.tracker.record_hedge(won=winner is attempts[1])
+                    return (winner or next(iter(done))).result()
+        finally:
+            decided.set()
+
+    async def awrap_model_call(self, request: ModelRequest, handler):
+        self._check(request.messages)
+        remaining, hedge_after = time_remaining(), self._hedge_after(request)
+        model, queued = _model_name(request), isinstance(request.model, ScheduledChatOpenAI)
+
+        async def call(sent: asyncio.Event):
+            started = time.perf_counter()
+
+            def send():
+                nonlocal started
+                started = time.perf_counter()
+                sent.set()
+
+            if not queued:
+                sent.set()
+            try:
+                with before_send(send):
+                    response = await handler(request)
+            finally:
+                sent.set()
+            self.tracker.observe(model, time.perf_counter() - started)
+            return response
+
+        if remaining is None and hedge_after is None:
+            return await call(asyncio.Event())
+        first_sent = asyncio.Event()
+        attempts = [asyncio.ensure_future(call(first_sent))]
+        try:
+            if hedge_after is not None:
+                try:
+                    await asyncio.wait_for(first_sent.wait(), timeout=_sooner(time_remaining(), None))
+                except asyncio.TimeoutError:
+                    pass
+                done, _ = await asyncio.wait(attempts, timeout=_sooner(hedge_after, time_remaining()))
+                if not done and _before_deadline(hedge_after):
+                    attempts.append(asyncio.ensure_future(call(asyncio.Event())))
+            pending = set(attempts)
+            while True:
+                done, pending = await asyncio.wait(pending, timeout=_sooner(time_remaining(), None), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise BudgetExceededError("the deadline passed while waiting for the model", request.messages)
+                winner = next((attempt for attempt in done if attempt.exception() is None), None)
+                if winner is not None or not pending:
+                    if len(attempts) > 1:
+                        self.tracker.record_hedge(won=winner is attempts[1])
+                    return (winner or next(iter(done))).result()
+        finally:
+            # Losing attempts are cancelled rather than left running, including any still queued for the rate limit
+            for attempt in attempts:
+                attempt.cancel()
+
+
+def partial_response(messages: list[BaseMessage], reason: str) -> ProcessResponse:
+    """A best-effort verdict from the tool results of a run that was stopped early.
+
+    Failed checks found so far make the invoice invalid with some confidence; without
+    them it is still not passed as valid, since lines may be unchecked.
+    """
+    report = "\n".join(str(m.content) for m in messages if isinstance(m, ToolMessage))
+    failures = [line.strip(" -") for line in report.splitlines() if any(marker in line for marker in FAILURE_MARKERS)]
+    checks = sum(isinstance(m, ToolMessage) for m in messages)
+    if failures:
+        verdict = "Problems found before the analysis stopped: " + "; ".join(failures[:5])
+    else:
+        verdict = f"No problems found in the {checks} checks completed, but not every line item was verified; review manually."
+    return ProcessResponse(
+        is_valid=False,
+        reason=f"Analysis incomplete because {reason}. {verdict}",
+        is_using_old_pricing=any(marker in report for marker in OLD_PRICING_MARKERS),
+        confidence=0.8 if failures else 0.0,
+        incomplete=reason,
+    )
@@ -0,0 +1,173 @@
+"""Vectorized validation of bulk claim tables against the NIDS catalogs."""
+import time
+
+import numpy as np
+import pandas as pd
+
+from agents.catalog import Catalogs
+from agents.descriptions import description_index, is_mismatch
+from agents.models import NIDSSource, ProcessResponse
+from agents.regions import DEFAULT_STATE, REGION_INDEX, STATE_ALIASES
+from agents.tools import get_catalogs, use_catalogs
+
+FLAG_COLUMNS = [
+    "unknown_code",
+    "inactive_only",
+    "old_pricing",
+    "quotable",
+    "missing_price",
+    "price_mismatch",
+    "price_over_cap",
+    "outside_effective_dates",
+    "arithmetic_error",
+    "description_mismatch",
+]
+
+
+def _price_column_indices(claims: pd.DataFrame) -> np.ndarray:
+    """Pick the price column for every claim from its location type and state."""
+    n = len(claims)
+    column_index = REGION_INDEX
+
+    if "state" in claims:
+        states = claims["state"].astype("string").str.strip().str.upper()
+        states = states.replace({name.upper(): code for name, code in STATE_ALIASES.items()})
+        indices = states.map(column_index).fillna(column_index[DEFAULT_STATE]).to_numpy(dtype=np.int64)
+    else:
+        indices = np.full(n, column_index[DEFAULT_STATE], dtype=np.int64)
+
+    if "location_type" in claims:
+        location = claims["location_type"].astype("string").str.strip().str.lower().str.replace(" ", "_")
+        indices = np.where(location.eq("remote").fillna(False).to_numpy(), column_index["Remote"], indices)
+        indices = np.where(location.eq("very_remote").fillna(False).to_numpy(), column_index["Very Remote"], indices)
+    return indices
+
+
+def _numeric(claims: pd.DataFrame, column: str) -> np.ndarray:
+    if column not in claims:
+        return np.full(len(claims), np.nan)
+    return pd.to_numeric(claims[column], errors="coerce").to_numpy(dtype=np.float64)
+
+
+def validate_claims(claims: pd.DataFrame, active: NIDSSource | None = None,
+                    inactive: NIDSSource | None = None, tolerance: float = 0.01) -> tuple[pd.DataFrame, dict]:
+    """Validate a table of claims in one vectorized pass.
+
+    `claims` needs an item_code column and may have rate (unit price), quantity, amount,
+    state, location_type, service_date and description. Returns the claims with the expected
+    price, the description score, one boolean column per flag and an is_valid column added,
+    plus a summary of the batch. Dated claims are priced from the catalog version in effect on
+    their service date. The loaded NIDS catalogs are used unless `active` and `inactive` are given.
+    """
+    started = time.perf_counter()
+    catalogs = get_catalogs()
+    if active is not None or inactive is not None:
+        catalogs = Catalogs(catalogs.active if active is None else active, catalogs.inactive if inactive is None else inactive)
+    active, inactive = catalogs.active, catalogs.inactive
+    codes = claims["item_code"].astype("string").str.strip()
+    active_rows = active.row_ids(codes)
+    inactive_rows = inactive.row_ids(codes)
+    in_active = active_rows >= 0
+    in_inactive = inactive_rows >= 0
+    safe_rows = np.where(in_active, active_rows, 0)
+
+    price_columns = _price_column_indices(claims)
+    expected = np.where(in_active, active.price_matrix[safe_rows, price_columns], np.nan)
+    quotable = in_active & active.quotable[safe_rows]
+    # Claims dated while the superseded (inactive) price list was in effect are priced from it
+    superseded = np.zeros(len(claims), dtype=bool)
+    outside_effective_dates = np.zeros(len(claims), dtype=bool)
+    if "service_date" in claims:
+        service_dates = pd.to_datetime(claims["service_date"], errors="coerce", dayfirst=True)
+        yyyymmdd = (service_dates.dt.year * 10000 + service_dates.dt.month * 100 + service_dates.dt.day).to_numpy(dtype=np.float64)
+        sources, rows = catalogs.history.lookup_many(codes, yyyymmdd)
+        for rank, source in enumerate(catalogs.history.sources):
+            in_effect = sources == rank
+            source_rows = np.where(in_effect, rows, 0)
+            expected = np.where(in_effect, source.price_matrix[source_rows, price_columns], expected)
+            quotable = np.where(in_effect, source.quotable[source_rows], quotable)
+            if source is inactive:
+                superseded = in_effect
+        outside_effective_dates = (in_active | in_inactive) & ~np.isnan(yyyymmdd) & (sources < 0)
+    priced = in_active | superseded
+    has_price = ~np.isnan(expected)
+
+    rate = _numeric(claims, "rate")
+    quantity = _numeric(claims, "quantity")
+    amount = _numeric(claims, "amount")
+    has_rate = ~np.isnan(rate)
+
+    flags = {
+        "unknown_code": ~in_active & ~in_inactive,
+        "inactive_only": ~in_active & in_inactive,
+        "old_pricing": in_inactive & ~superseded,
+        "quotable": priced & (quotable | ~has_price),
+        "missing_price": priced & has_price & ~has_rate,
+        "outside_effective_dates": outside_effective_dates,
+    }
+    with np.errstate(invalid="ignore"):
+        flags["price_mismatch"] = has_price & has_rate & (np.abs(rate - expected) >= tolerance)
+        flags["price_over_cap"] = has_price & has_rate & (rate - expected >= tolerance)
+        line_total = quantity * rate
+        flags["arithmetic_error"] = ~np.isnan(line_total) & ~np.isnan(amount) & (np.abs(line_total - amount) > tolerance + 0.001)
+
+    description_score = np.full(len(claims), np.nan)
+    flags["description_mismatch"] = np.zeros(len(claims), dtype=bool)
+    if "description" in claims:
+        descriptions = claims["description"].astype("string").fillna("").to_list()
+        index = description_index(catalogs)
+        description_score = index.score(descriptions, codes.fillna("").to_list())
+        best_score, best_codes = index.best_scores(descriptions)
+        best_rows = active.row_ids(pd.Series(best_codes, dtype="string"))
+        best_price = np.where(best_rows >= 0, active.price_matrix[np.maximum(best_rows, 0), price_columns], np.nan)
+        # Flag descriptions that fit a different, cheaper item; the claim itself is not invalid
+        with np.errstate(invalid="ignore"):
+            flags["description_mismatch"] = is_mismatch(description_score, best_score) & (best_price < expected - tolerance)
+
+    result = claims.copy()
+    result["expected_price"] = expected
+    result["description_score"] = description_score
+    for name in FLAG_COLUMNS:
+        result[name] = flags[name]
+    # Quotable items and description mismatches only call for review; every other failed check invalidates the claim
+    result["is_valid"] = ~(flags["unknown_code"] | flags["old_pricing"] | flags["price_mismatch"]
+                           | flags["arithmetic_error"] | flags["outside_effective_dates"])
+
+    overcharge = np.where(flags["price_over_cap"], (rate - expected) * np.nan_to_num(quantity, nan=1.0), 0.0)
+    seconds = time.perf_counter() - started
+    summary = {
+        "rows": len(claims),
+        "invalid_rows": int((~result["is_valid"]).sum()),
+        **{name: int(flags[name].sum()) for name in FLAG_COLUMNS},
+        "claimed_amount": float(np.nansum(amount)),
+        "overcharged_amount": float(overcharge.sum()),
+        "seconds": seconds,
+        "rows_per_second": len(claims) / seconds if seconds else float("inf"),
+    }
+    return result, summary
+
+
+def claims_verdict(claims: pd.DataFrame, max_listed: int = 20) -> ProcessResponse:
+    """Validate a claim table in bulk and summarise it as one verdict, where an agent's answer is expected.
+
+    A claim sheet can run to thousands of lines, far more than fit in one prompt, so it is
+    checked against the catalogs directly; the first `max_listed` invalid lines are named.
+    """
+    with use_catalogs() as catalogs:
+        result, summary = validate_claims(claims)
+    invalid = np.flatnonzero(~result["is_valid"].to_numpy())
+    counts = ", ".join(f"{summary[name]} {name.replace('_', ' ')}" for name in FLAG_COLUMNS if summary[name])
+    reason = f"{summary['rows']} claim lines checked in bulk, {summary['invalid_rows']} invalid" + (f" ({counts})." if counts else ".")
+    for position in invalid[:max_listed]:
+        line = result.iloc[position]
+        problems = ", ".join(name.replace("_", " ") for name in FLAG_COLUMNS if line[name])
+        reason += f"\n- Line {position + 1} ({line['item_code']}): {problems}"
+    if len(invalid) > max_listed:
+        reason += f"\n- ... and {len(invalid) - max_listed} more invalid lines"
+    return ProcessResponse(
+        is_valid=summary["invalid_rows"] == 0,
+        reason=reason,
+        is_using_old_pricing=bool(summary["old_pricing"]),
+        confidence=1.0,
+        catalog_version=catalogs.version,
+    )
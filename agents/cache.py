@@ -0,0 +1,184 @@
+"""Persistent cache of agent verdicts keyed on normalized invoice content."""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from agents.models import BaseAgent, ProcessResponse
+from agents.tools import catalog_version, use_catalogs
+from agents.tracing import stage, trace_invoice
+
+DEFAULT_CACHE_PATH = os.getenv("NIDS_CACHE_PATH", ".cache/verdicts.sqlite3")
+
+
+def normalize_invoice_text(text: str) -> str:
+    """Collapse whitespace so re-extracted or re-submitted copies of an invoice hash the same."""
+    return " ".join(str(text).split())
+
+
+def cache_key(agent: BaseAgent, invoice_text: str) -> str:
+    """Hash the invoice together with everything that can change the agent's verdict."""
+    parts = [
+        type(agent).__name__,
+        getattr(agent, "model", ""),
+        getattr(agent, "prompt_version", ""),
+        catalog_version(),
+        normalize_invoice_text(invoice_text),
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """In-memory LRU in front of an on-disk SQLite store, with TTL and size eviction."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_memory_entries: int = 1024,
+                 max_disk_entries: int = 100_000, ttl_seconds: float = 7 * 24 * 3600):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, tuple[float, ProcessResponse]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, key: str) -> ProcessResponse | None:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] < self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            row = self._db.execute(
+                "SELECT response, created FROM verdicts WHERE key = ? AND created > ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+            if row is None:
+                self._memory.pop(key, None)
+                self.misses += 1
+                return None
+
+            self._db.execute("UPDATE verdicts SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            response = ProcessResponse.model_validate_json(row[0])
+            self._remember(key, row[1], response)
+            self.hits += 1
+            return response
+
+    def put(self, key: str, response: ProcessResponse):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO verdicts (key, response, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, response.model_dump_json(), now, now),
+            )
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= 100:
+                self._evict(now)
+            self._db.commit()
+            self._remember(key, now, response)
+
+    def evict(self):
+        """Drop expired entries and trim the store to its size limit."""
+        with self._lock:
+            self._evict(time.time())
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM verdicts")
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            disk_entries = self._db.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": disk_entries,
+        }
+
+    def _remember(self, key: str, created: float, response: ProcessResponse):
+        self._memory[key] = (created, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now: float):
+        self._puts_since_evict = 0
+        self._db.execute("DELETE FROM verdicts WHERE created <= ?", (now - self.ttl_seconds,))
+        self._db.execute(
+            "DELETE FROM verdicts WHERE key IN ("
+            "SELECT key FROM verdicts ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+
+
+_default_cache: ResultCache | None = None
+_default_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Return the process-wide result cache, opening it on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache()
+        return _default_cache
+
+
+class CachedAgent(BaseAgent):
+    """Wraps an agent so repeat submissions of the same invoice return the stored verdict."""
+
+    def __init__(self, agent: BaseAgent, cache: ResultCache | None = None):
+        self.agent = agent
+        self.model = getattr(agent, "model", "")
+        self.prompt_version = getattr(agent, "prompt_version", "")
+        self.cache = cache if cache is not None else get_result_cache()
+
+    def process(self, data: str) -> ProcessResponse:
+        # Pin the catalogs so the key and the verdict refer to the same version
+        with trace_invoice(type(self.agent).__name__), use_catalogs():
+            with stage("cache"):
+                key = cache_key(self.agent, data)
+                cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+            response = self.agent.process(data)
+        # A run cut short by its budget may well finish next time
+        if response.incomplete is None:
+            self.cache.put(key, response)
+        return response
+
+    async def aprocess(self, data: str) -> ProcessResponse:
+        with trace_invoice(type(self.agent).__name__), use_catalogs():
+            with stage("cache"):
+                key = cache_key(self.agent, data)
+                cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+            response = await self.agent.aprocess(data)
+        if response.incomplete is None:
+            self.cache.put(key, response)
+        return response
@@ -0,0 +1,139 @@
+"""Cheap-model-first cascade: answer with IchiAgent, escalate hard cases to StandardAgent.
+
+Tiers, cheapest first:
+- rules: the deterministic rule engine settles clear-cut invoices without a model call
+- cheap: one tool-less IchiAgent call, kept when the model is confident and the rules found nothing it ignored
+- escalated: the tool-using StandardAgent verifies every line item
+
+An Ichi verdict is escalated when its confidence is missing or below the threshold, or when
+it calls an invoice valid although the rule engine left findings on it (a price matching a
+different location's tier, amounts that do not add up, an unreadable line).
+"""
+import threading
+import time
+from typing import Literal
+
+from langchain_core.language_models import BaseChatModel
+
+from agents.budget import Budget, run_deadline
+from agents.ichi import IchiAgent
+from agents.models import BaseAgent, ProcessResponse
+from agents.rules import RuleAssessment, RuleEngine
+from agents.standard import StandardAgent
+from agents.tools import use_catalogs
+from agents.tracing import stage, trace_invoice
+
+Tier = Literal["rules", "cheap", "escalated"]
+TIERS: tuple[Tier, ...] = ("rules", "cheap", "escalated")
+DEFAULT_CONFIDENCE_THRESHOLD = 0.8
+
+
+class CascadeStats:
+    """Thread-safe per-tier counts and latencies, and why invoices were escalated."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {tier: 0 for tier in TIERS}
+        self.seconds = {tier: 0.0 for tier in TIERS}
+        self.escalations: dict[str, int] = {}
+
+    def record(self, tier: Tier, seconds: float, escalation: str | None = None):
+        with self._lock:
+            self.counts[tier] += 1
+            self.seconds[tier] += seconds
+            if escalation is not None:
+                self.escalations[escalation] = self.escalations.get(escalation, 0) + 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def hit_rate(self, tier: Tier) -> float:
+        return self.counts[tier] / self.total if self.total else 0.0
+
+    def rows(self) -> list[dict]:
+        """One row per tier: invoices answered there, their share and mean end-to-end latency."""
+        return [{"tier": tier, "invoices": self.counts[tier], "share": self.hit_rate(tier),
+                 "mean_seconds": self.seconds[tier] / self.counts[tier] if self.counts[tier] else None}
+                for tier in TIERS]
+
+    def summary(self) -> str:
+        tiers = ", ".join(f"{tier} {self.counts[tier]} ({self.hit_rate(tier):.1%})" for tier in TIERS)
+        reasons = ", ".join(f"{reason} {count}" for reason, count in sorted(self.escalations.items()))
+        return f"Cascade answered {self.total} invoices: {tiers}" + (f"; escalated for {reasons}" if reasons else "")
+
+
+cascade_stats = CascadeStats()
+
+
+class CascadeAgent(BaseAgent):
+    prompt_version = "1"
+
+    def __init__(self, model: str, escalation_model: str | None = None,
+                 confidence_threshold: float = DEFAULT_CONFIDENCE_THRESHOLD, fast_path: bool = True,
+                 llm: BaseChatModel | None = None, escalation_llm: BaseChatModel | None = None,
+                 stats: CascadeStats = cascade_stats, budget: Budget | None = None):
+        self.model = model
+        # One deadline covers both tiers; each tier's agent loop gets the step and token limits
+        self.budget = budget if budget is not None else Budget()
+        self.escalation_model = escalation_model or model
+        self.confidence_threshold = confidence_threshold
+        self.rule_engine = RuleEngine() if fast_path else None
+        self.cheap = IchiAgent(model=model, llm=llm, budget=self.budget)
+        # The cascade runs the rules itself, so the escalation tier goes straight to the model
+        self.thorough = StandardAgent(model=self.escalation_model, fast_path=False, llm=escalation_llm, budget=self.budget)
+        self.stats = stats
+        self.prompt_version = "-".join([CascadeAgent.prompt_version, self.cheap.prompt_version, self.thorough.prompt_version,
+                                        self.escalation_model, f"{confidence_threshold:g}", "fast" if fast_path else "llm"])
+
+    def _assess(self, invoice_text: str) -> RuleAssessment | None:
+        if self.rule_engine is None:
+            return None
+        with stage("rules"):
+            assessment = self.rule_engine.assess(invoice_text)
+        self.rule_engine.stats.record(assessment.response is not None)
+        return assessment
+
+    def escalation_reason(self, response: ProcessResponse, assessment: RuleAssessment | None) -> str | None:
+        """Why a cheap verdict cannot be kept, or None when it can."""
+        if response.confidence is None:
+            return "no_confidence"
+        if response.confidence < self.confidence_threshold:
+            return "low_confidence"
+        if response.is_valid and assessment is not None and assessment.concerns:
+            return "rules_disagree"
+        return None
+
+    def process(self, invoice_text: str) -> ProcessResponse:
+        started = time.perf_counter()
+        with trace_invoice(type(self).__name__), use_catalogs() as catalogs, run_deadline(self.budget.deadline_seconds):
+            assessment = self._assess(invoice_text)
+            if assessment is not None and assessment.response is not None:
+                tier, reason, response = "rules", None, assessment.response
+            else:
+                with stage("cheap"):
+                    response = self.cheap.process(invoice_text)
+                tier, reason = "cheap", self.escalation_reason(response, assessment)
+                if reason is not None:
+                    tier = "escalated"
+                    with stage("escalated"):
+                        response = self.thorough.process(invoice_text)
+        self.stats.record(tier, time.perf_counter() - started, reason)
+        return response.model_copy(update={"catalog_version": catalogs.version})
+
+    async def aprocess(self, invoice_text: str) -> ProcessResponse:
+        started = time.perf_counter()
+        with trace_invoice(type(self).__name__), use_catalogs() as catalogs, run_deadline(self.budget.deadline_seconds):
+            assessment = self._assess(invoice_text)
+            if assessment is not None and assessment.response is not None:
+                tier, reason, response = "rules", None, assessment.response
+            else:
+                with stage("cheap"):
+                    response = await self.cheap.aprocess(invoice_text)
+                tier, reason = "cheap", self.escalation_reason(response, assessment)
+                if reason is not None:
+                    tier = "escalated"
+                    with stage("escalated"):
+                        response = await self.thorough.aprocess(invoice_text)
+        self.stats.record(tier, time.perf_counter() - started, reason)
+        return response.model_copy(update={"catalog_version": catalogs.version})
@@ -0,0 +1,234 @@
+"""Record/replay of chat model calls, so agent test suites run offline and deterministically.
+
+`CassetteChatModel` sits where the agent's chat model would be. Each request (model name,
+messages, tool schemas and tool choice) is hashed; in record mode the wrapped model is
+called and its response stored in the cassette under that hash, in replay mode the stored
+response is returned without touching the network. Cassettes are JSON files meant to be
+committed next to the tests.
+
+When a request has no recording, the closest recorded request is found and the parts
+that differ (system prompt, a message, the tool schemas, the model) are reported, which
+is how prompt or tool drift shows up: replay mode raises `CassetteMissError`, while check
+mode replays the closest recording and collects the drift for the caller to report.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Literal
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import BaseModel, ConfigDict
+
+CASSETTE_FORMAT = 1
+CassetteMode = Literal["record", "replay", "auto", "check"]
+# Keyword arguments that shape the tool-calling request and so belong in its key
+_TOOL_KWARGS = ("tool_choice", "parallel_tool_calls", "strict")
+
+
+class CassetteMissError(Exception):
+    """Raised in replay mode when a request was never recorded."""
+
+
+def _digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def _canonical(message: BaseMessage) -> dict:
+    """The parts of a message that reach the model; run ids and metadata are left out."""
+    canonical = {"type": message.type, "content": message.content}
+    if isinstance(message, AIMessage) and message.tool_calls:
+        canonical["tool_calls"] = [{"name": call["name"], "args": call["args"], "id": call.get("id")} for call in message.tool_calls]
+    if getattr(message, "tool_call_id", None):
+        canonical["tool_call_id"] = message.tool_call_id
+    return canonical
+
+
+class Fingerprint(BaseModel):
+    """Digests of each part of a chat request, used as its key and to explain mismatches."""
+    model: str
+    tools: str
+    tool_kwargs: str
+    messages: list[str]
+    message_types: list[str]
+
+    @property
+    def key(self) -> str:
+        return _digest(self.model_dump())
+
+    def differences(self, recorded: "Fingerprint") -> list[str]:
+        """What changed between a recorded request and this one."""
+        changes = []
+        if self.model != recorded.model:
+            changes.append(f"model changed ({recorded.model} -> {self.model})")
+        if self.tools != recorded.tools:
+            changes.append("tool schemas changed")
+        if self.tool_kwargs != recorded.tool_kwargs:
+            changes.append("tool choice settings changed")
+        if len(self.messages) != len(recorded.messages):
+            changes.append(f"{len(recorded.messages)} messages recorded, {len(self.messages)} sent")
+        for i, (sent, then) in enumerate(zip(self.messages, recorded.messages)):
+            if sent != then:
+                kind = "system prompt" if self.message_types[i] == "system" else f"{self.message_types[i]} message"
+                changes.append(f"message {i} ({kind}) changed")
+        return changes
+
+
+def fingerprint(model: str, messages: list[BaseMessage], tools: list[dict] | None, tool_kwargs: dict) -> Fingerprint:
+    return Fingerprint(
+        model=model,
+        tools=_digest(tools or []),
+        tool_kwargs=_digest(tool_kwargs),
+        messages=[_digest(_canonical(m)) for m in messages],
+        message_types=[m.type for m in messages],
+    )
+
+
+class Drift(BaseModel):
+    """A request that only approximately matched a recording."""
+    key: str
+    closest_key: str | None
+    changes: list[str]
+
+
+class Cassette:
+    """Thread-safe store of recorded chat responses, persisted as one JSON file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.metadata: dict = {}
+        self.interactions: dict[str, dict] = {}
+        self.drift: list[Drift] = []
+        self.hits = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("format") == CASSETTE_FORMAT:
+                self.metadata = data.get("metadata", {})
+                self.interactions = data.get("interactions", {})
+
+    def __len__(self) -> int:
+        return len(self.interactions)
+
+    def get(self, key: str) -> AIMessage | None:
+        interaction = self.interactions.get(key)
+        if interaction is None:
+            return None
+        with self._lock:
+            self.hits += 1
+        return messages_from_dict([interaction["response"]])[0]
+
+    def put(self, request: Fingerprint, response: AIMessage, recorded_with: str):
+        # Run ids differ between runs; replayed messages get fresh ones
+        response = response.model_copy(update={"id": None})
+        with self._lock:
+            self.interactions[request.key] = {"request": request.model_dump(), "response": message_to_dict(response)}
+            self.metadata["recorded_with"] = recorded_with
+            self.recorded += 1
+            self._save()
+
+    def closest(self, request: Fingerprint) -> tuple[str | None, list[str]]:
+        """The recorded request sharing the most parts with this one, and what differs."""
+        best_key, best_changes, best_score = None, ["no recordings"], -1
+        for key, interaction in self.interactions.items():
+            recorded = Fingerprint.model_validate(interaction["request"])
+            shared = sum(a == b for a, b in zip(request.messages, recorded.messages))
+            score = shared * 4 + (request.tools == recorded.tools) * 2 + (request.model == recorded.model) \
+                - abs(len(request.messages) - len(recorded.messages))
+            if score > best_score:
+                best_key, best_changes, best_score = key, request.differences(recorded), score
+        return best_key, best_changes
+
+    def note_drift(self, drift: Drift):
+        with self._lock:
+            self.drift.append(drift)
+
+    def _save(self):
+        # Write to a temporary file and rename, so a crash never leaves a truncated cassette
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        data = {"format": CASSETTE_FORMAT, "metadata": self.metadata, "interactions": dict(sorted(self.interactions.items()))}
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, ensure_ascii=False)
+            f.write("\n")
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, self.path)
+
+
+class CassetteChatModel(BaseChatModel):
+    """Chat model that records the responses of `inner` to a cassette, or replays them.
+
+    Modes: "record" always calls `inner` and stores the response; "replay" only uses the
+    cassette and raises CassetteMissError for unknown requests; "auto" replays when it
+    can and records otherwise; "check" replays the closest recording of a changed request
+    and notes the drift on the cassette.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    cassette: Cassette
+    inner: BaseChatModel | None = None
+    mode: CassetteMode = "replay"
+    # The model the recordings belong to; part of every request key
+    model_name: str = "unknown"
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"model_name": self.model_name, "mode": self.mode, "cassette": self.cassette.path}
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        if tool_choice is not None:
+            kwargs["tool_choice"] = tool_choice
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _request(self, messages: list[BaseMessage], kwargs: dict) -> tuple[Fingerprint, list[dict] | None, dict]:
+        tools = kwargs.get("tools")
+        tool_kwargs = {name: kwargs[name] for name in _TOOL_KWARGS if name in kwargs}
+        return fingerprint(self.model_name, messages, tools, tool_kwargs), tools, tool_kwargs
+
+    def _replayed(self, request: Fingerprint) -> AIMessage | None:
+        """The recorded response for a request, or None when it should be recorded."""
+        if self.mode == "record":
+            return None
+        response = self.cassette.get(request.key)
+        if response is not None or self.mode == "auto":
+            return response
+        closest_key, changes = self.cassette.closest(request)
+        if self.mode == "check" and closest_key is not None:
+            self.cassette.note_drift(Drift(key=request.key, closest_key=closest_key, changes=changes))
+            return self.cassette.get(closest_key)
+        raise CassetteMissError(f"No recording for request {request.key} in {self.cassette.path}: {'; '.join(changes)}")
+
+    def _inner(self, tools: list[dict] | None, tool_kwargs: dict):
+        if self.inner is None:
+            raise CassetteMissError(f"Cannot record to {self.cassette.path}: no model to record from")
+        return self.inner.bind_tools(tools, **tool_kwargs) if tools else self.inner
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                  run_manager: CallbackManagerForLLMRun | None = None, **kwargs) -> ChatResult:
+        request, tools, tool_kwargs = self._request(messages, kwargs)
+        response = self._replayed(request)
+        if response is None:
+            response = self._inner(tools, tool_kwargs).invoke(messages, stop=stop)
+            self.cassette.put(request, response, self.inner._llm_type)
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                         run_manager: AsyncCallbackManagerForLLMRun | None = None, **kwargs) -> ChatResult:
+        request, tools, tool_kwargs = self._request(messages, kwargs)
+        response = self._replayed(request)
+        if response is None:
+            response = await self._inner(tools, tool_kwargs).ainvoke(messages, stop=stop)
+            self.cassette.put(request, response, self.inner._llm_type)
+        return ChatResult(generations=[ChatGeneration(message=response)])
@@ -0,0 +1,162 @@
+"""Versioned NIDS prices: which price applied to an item on a given service date."""
+import re
+from bisect import bisect_right
+from datetime import date, datetime
+
+import numpy as np
+
+from agents.models import NIDSSource
+
+_DAY_FIRST_PATTERN = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})")
+_ISO_PATTERN = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})")
+
+
+def to_yyyymmdd(value) -> int | None:
+    """Convert a service date (26/10/2025, 2025-10-26, 20251026, date or datetime) to an int like 20251026."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, np.integer)) and 19000101 <= value <= 99991231:
+        return int(value)
+    if isinstance(value, (date, datetime)):
+        return value.year * 10000 + value.month * 100 + value.day
+    text = str(value).strip()
+    if text.isdigit() and len(text) == 8:
+        return int(text)
+    # The two formats seen on invoices are parsed directly; pandas handles anything else
+    if match := _DAY_FIRST_PATTERN.fullmatch(text):
+        day, month, year = map(int, match.groups())
+    elif match := _ISO_PATTERN.fullmatch(text):
+        year, month, day = map(int, match.groups())
+    else:
+        day = None
+    if day is not None:
+        try:
+            date(year, month, day)
+        except ValueError:
+            return None
+        return year * 10000 + month * 100 + day
+
+    import pandas as pd
+
+    # ISO dates are year first; everything else on Australian invoices is day first
+    parsed = pd.to_datetime(text, errors="coerce", dayfirst=not text[:4].isdigit())
+    if pd.isna(parsed):
+        return None
+    return parsed.year * 10000 + parsed.month * 100 + parsed.day
+
+
+def format_yyyymmdd(value: int) -> str:
+    return f"{value // 10000:04d}-{value // 100 % 100:02d}-{value % 100:02d}"
+
+
+class PriceVersion:
+    """One effective-dated row of a catalog."""
+    __slots__ = ("source", "row", "start", "end")
+
+    def __init__(self, source: NIDSSource, row: int):
+        self.source = source
+        self.row = row
+        self.start = int(source.start_dates[row])
+        self.end = int(source.end_dates[row])
+
+    def price(self, column: str) -> float | None:
+        price = self.source.prices[column][self.row]
+        return None if np.isnan(price) else float(price)
+
+    @property
+    def period(self) -> str:
+        end = "onwards" if self.end >= 99991231 else f"to {format_yyyymmdd(self.end)}"
+        return f"{format_yyyymmdd(self.start)} {end}"
+
+
+class PriceHistory:
+    """Merges catalogs into per-item effective-date intervals sorted by start date.
+
+    Sources are given newest first; when intervals overlap, the newer catalog wins.
+    """
+
+    def __init__(self, sources: list[NIDSSource]):
+        self.sources = sources
+        self._versions: dict[str, list[PriceVersion]] = {}
+        for rank, source in enumerate(sources):
+            for code, row in source.index.items():
+                self._versions.setdefault(code, []).append((rank, PriceVersion(source, row)))
+        self._starts: dict[str, list[int]] = {}
+        ranks: dict[str, list[int]] = {}
+        for code, ranked in self._versions.items():
+            # Sort by start date; among equal starts newer catalogs go last so lookups reach them first
+            ranked.sort(key=lambda item: (item[1].start, -item[0]))
+            self._versions[code] = [version for _, version in ranked]
+            self._starts[code] = [version.start for version in self._versions[code]]
+            ranks[code] = [rank for rank, _ in ranked]
+
+        # The same versions as flat arrays ordered by item, then start, for vectorized lookups
+        self._code_ids = {code: i for i, code in enumerate(self._versions)}
+        flat = [(i, rank, version) for i, code in enumerate(self._versions)
+                for rank, version in zip(ranks[code], self._versions[code])]
+        self._flat_codes = np.fromiter((i for i, _, _ in flat), dtype=np.int64, count=len(flat))
+        self._flat_keys = self._flat_codes * 100_000_000 + np.fromiter((v.start for _, _, v in flat), dtype=np.int64, count=len(flat))
+        self._flat_ends = np.fromiter((v.end for _, _, v in flat), dtype=np.int64, count=len(flat))
+        self._flat_sources = np.fromiter((rank for _, rank, _ in flat), dtype=np.int64, count=len(flat))
+        self._flat_rows = np.fromiter((v.row for _, _, v in flat), dtype=np.int64, count=len(flat))
+
+    def versions(self, item_code: str) -> list[PriceVersion]:
+        return self._versions.get(item_code, [])
+
+    def lookup(self, item_code: str, service_date) -> PriceVersion | None:
+        """Return the version of an item in effect on the service date, or None."""
+        day = to_yyyymmdd(service_date)
+        starts = self._starts.get(item_code)
+        if day is None or not starts:
+            return None
+        # Walk back from the latest version starting on or before the date
+        for i in range(bisect_right(starts, day) - 1, -1, -1):
+            version = self._versions[item_code][i]
+            if version.end >= day:
+                return version
+        return None
+
+    def lookup_many(self, item_codes, days: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Vectorized lookup for many claims, with service dates as yyyymmdd numbers (NaN for none).
+
+        Returns the index into `sources` of the version in effect and its row there, both -1
+        where no version applies.
+        """
+        import pandas as pd
+
+        categorical = pd.Categorical(item_codes)
+        category_ids = np.fromiter((self._code_ids.get(code, -1) for code in categorical.categories),
+                                   dtype=np.int64, count=len(categorical.categories))
+        code_ids = np.append(category_ids, -1)[categorical.codes]
+        days = np.asarray(days, dtype=np.float64)
+        pending = (code_ids >= 0) & ~np.isnan(days)
+        day = np.where(pending, days, 0).astype(np.int64)
+
+        sources = np.full(len(code_ids), -1, dtype=np.int64)
+        rows = np.full(len(code_ids), -1, dtype=np.int64)
+        # Start at the latest version starting on or before the date and walk back, as lookup does
+        candidate = np.searchsorted(self._flat_keys, code_ids * 100_000_000 + day, side="right") - 1
+        while pending.any():
+            safe = np.maximum(candidate, 0)
+            pending &= (candidate >= 0) & (self._flat_codes[safe] == code_ids)
+            hit = pending & (self._flat_ends[safe] >= day)
+            sources[hit] = self._flat_sources[safe[hit]]
+            rows[hit] = self._flat_rows[safe[hit]]
+            pending &= ~hit
+            candidate -= 1
+        return sources, rows
+
+
+class Catalogs:
+    """The active and inactive NIDS catalogs, loaded together, with their merged price history."""
+    __slots__ = ("active", "inactive", "history")
+
+    def __init__(self, active: NIDSSource, inactive: NIDSSource):
+        self.active = active
+        self.inactive = inactive
+        self.history = PriceHistory([active, inactive])
+
+    @property
+    def version(self) -> str:
+        """Identify the loaded catalogs, so results computed against other data can be told apart."""
+        return f"{self.active.version}-{self.inactive.version}"
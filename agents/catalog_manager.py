@@ -0,0 +1,140 @@
+"""Hot reloading of the NIDS catalogs while the service keeps running.
+
+The manager holds the current `Catalogs` behind a single reference. A watcher thread polls
+the CSVs; when they change (and have stopped changing for one poll), new catalogs are
+loaded in the background and swapped in by replacing that reference, so lookups never
+wait on a reload. A request pins the catalogs it started with, so every check of one
+invoice is made against the same version even if a swap happens mid-way.
+"""
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from agents.catalog import Catalogs
+from agents.snapshot import DEFAULT_SNAPSHOT_DIR, load_catalog
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_SECONDS = float(os.getenv("NIDS_CATALOG_POLL_SECONDS", 30))
+
+
+class CatalogManager:
+    """Owns the loaded catalogs and swaps in new ones when the CSVs on disk change."""
+
+    def __init__(self, active_csv: str, inactive_csv: str, snapshot_dir: str = DEFAULT_SNAPSHOT_DIR):
+        self.active_csv = active_csv
+        self.inactive_csv = inactive_csv
+        self.snapshot_dir = snapshot_dir
+        self.generation = 0
+        self.reloads = 0
+        self.reload_errors = 0
+        self._current: Catalogs | None = None
+        self._fingerprint = None
+        self._pending_fingerprint = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: threading.Thread | None = None
+
+    @property
+    def current(self) -> Catalogs:
+        """The catalogs in effect; loaded on first use, afterwards a plain reference read."""
+        catalogs = self._current
+        if catalogs is None:
+            with self._reload_lock:
+                if self._current is None:
+                    self._swap(self._fingerprint_now())
+                catalogs = self._current
+        return catalogs
+
+    def _fingerprint_now(self) -> tuple:
+        stats = [os.stat(path) for path in (self.active_csv, self.inactive_csv)]
+        return tuple((stat.st_mtime_ns, stat.st_size) for stat in stats)
+
+    def _swap(self, fingerprint: tuple):
+        catalogs = Catalogs(load_catalog(self.active_csv, self.snapshot_dir),
+                            load_catalog(self.inactive_csv, self.snapshot_dir))
+        self._current = catalogs
+        self._fingerprint = fingerprint
+        self._pending_fingerprint = None
+        self.generation += 1
+
+    def reload(self) -> Catalogs:
+        """Load the CSVs now and swap them in."""
+        with self._reload_lock:
+            self._swap(self._fingerprint_now())
+            self.reloads += 1
+            return self._current
+
+    def check(self) -> bool:
+        """Reload if the CSVs changed and have been stable since the previous check.
+
+        Waiting for one unchanged poll avoids loading a file that is still being copied.
+        Returns True when new catalogs were swapped in.
+        """
+        try:
+            fingerprint = self._fingerprint_now()
+        except OSError:
+            return False  # a file is being replaced; look again next poll
+        if fingerprint == self._fingerprint:
+            self._pending_fingerprint = None
+            return False
+        if fingerprint != self._pending_fingerprint:
+            self._pending_fingerprint = fingerprint
+            return False
+        with self._reload_lock:
+            try:
+                self._swap(fingerprint)
+            except Exception:
+                # Keep serving the previous catalogs; a later poll tries again
+                self.reload_errors += 1
+                self._pending_fingerprint = None
+                logger.exception("Reloading the NIDS catalogs failed; keeping version %s", self.current.version)
+                return False
+            self.reloads += 1
+        logger.info("Reloaded the NIDS catalogs: version %s (generation %d)", self._current.version, self.generation)
+        return True
+
+    def start_watching(self, poll_seconds: float = DEFAULT_POLL_SECONDS):
+        """Poll the CSVs from a daemon thread (no-op if already watching or poll_seconds <= 0)."""
+        if poll_seconds <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        self.current  # load before the first poll so it has something to compare with
+        self._stop.clear()
+
+        def watch():
+            while not self._stop.wait(poll_seconds):
+                self.check()
+
+        self._watcher = threading.Thread(target=watch, name="catalog-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+
+_pinned: ContextVar[Catalogs | None] = ContextVar("pinned_catalogs", default=None)
+
+
+def pinned() -> Catalogs | None:
+    """The catalogs pinned by the enclosing request, if any."""
+    return _pinned.get()
+
+
+@contextmanager
+def pin_catalogs(manager: CatalogManager) -> Iterator[Catalogs]:
+    """Use one version of the catalogs for everything inside the block (nested pins reuse it)."""
+    catalogs = _pinned.get()
+    if catalogs is not None:
+        yield catalogs
+        return
+    token = _pinned.set(manager.current)
+    try:
+        yield _pinned.get()
+    finally:
+        _pinned.reset(token)
@@ -0,0 +1,162 @@
+"""Repairing and fuzzy matching of item codes mangled by PDF extraction or OCR.
+
+PDF text often splits a code with spaces ("01_011_01 07_1_1"), swaps digits for look-alike
+letters ("O1_O11_0107_1_1") or uses other separators. `normalize_item_code` undoes those
+artifacts, and a symmetric-delete index over every active and inactive code returns the
+nearest valid codes by edit distance without scanning the catalog.
+"""
+import re
+from functools import lru_cache
+
+from pydantic import BaseModel
+
+from agents.catalog import Catalogs
+
+ITEM_CODE_SHAPE = re.compile(r"\d{2}_\d{3,9}_\d{4}_\d_\d{1,2}")
+# Letters that PDF text and OCR commonly produce in place of digits
+_LOOKALIKE_DIGITS = str.maketrans({"O": "0", "o": "0", "D": "0", "Q": "0", "I": "1", "l": "1", "|": "1",
+                                   "Z": "2", "S": "5", "s": "5", "B": "8", "G": "6"})
+_DIGIT = r"[0-9OoDQIl|ZSsBG]"
+_SEPARATOR = r"\s*[_\-.]\s*"
+# A code with look-alike letters, other separators or spaces inside its digit groups
+LOOSE_CODE_PATTERN = re.compile(
+    rf"(?<![\w.])({_DIGIT}{{2}}{_SEPARATOR}{_DIGIT}(?:\s?{_DIGIT}){{2,8}}{_SEPARATOR}"
+    rf"{_DIGIT}(?:\s?{_DIGIT}){{3}}{_SEPARATOR}{_DIGIT}{_SEPARATOR}{_DIGIT}{{1,2}})(?![\w])"
+)
+
+
+def normalize_item_code(raw: str) -> str:
+    """Undo common extraction artifacts: spaces, other separators and look-alike letters."""
+    code = re.sub(r"\s+", "", raw.strip())
+    code = re.sub(r"[\-.]", "_", code)
+    return code.translate(_LOOKALIKE_DIGITS)
+
+
+def edit_distance(a: str, b: str, limit: int | None = None) -> int:
+    """Levenshtein distance between two strings.
+
+    With a limit, limit + 1 is returned as soon as the distance is known to exceed it.
+    """
+    # Codes share long prefixes and suffixes; only the differing middle needs the table
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a) if limit is None else min(len(a), limit + 1)
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _deletions(word: str, depth: int) -> set[str]:
+    """The word and every string made by deleting up to `depth` of its characters."""
+    variants = {word}
+    frontier = {word}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        variants |= frontier
+    return variants
+
+
+class DeletionIndex:
+    """Symmetric-delete index for nearest-neighbour search under edit distance.
+
+    Every word is stored under each string obtained by deleting up to `max_distance` of its
+    characters. Two words within edit distance k share such a deletion, so a query only
+    looks up its own deletions and verifies the few words found, instead of comparing
+    against the whole catalog.
+    """
+
+    def __init__(self, words=(), max_distance: int = 2):
+        self.max_distance = max_distance
+        self._words: set[str] = set()
+        self._index: dict[str, list[str]] = {}
+        for word in words:
+            self.add(word)
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def add(self, word: str):
+        if word in self._words:
+            return
+        self._words.add(word)
+        for variant in _deletions(word, self.max_distance):
+            self._index.setdefault(variant, []).append(word)
+
+    def search(self, word: str, max_distance: int) -> list[tuple[int, str]]:
+        """All words within max_distance of `word`, closest first."""
+        max_distance = min(max_distance, self.max_distance)
+        candidates = set()
+        for variant in _deletions(word, max_distance):
+            candidates.update(self._index.get(variant, ()))
+        found = []
+        for candidate in candidates:
+            distance = edit_distance(word, candidate, max_distance)
+            if distance <= max_distance:
+                found.append((distance, candidate))
+        return sorted(found)
+
+
+class CodeSuggestion(BaseModel):
+    """A catalog code close to a queried code."""
+    item_code: str
+    distance: int
+    active: bool
+    name: str
+
+
+class CodeIndex:
+    """Fuzzy index over the active and inactive codes of one version of the catalogs."""
+
+    def __init__(self, catalogs: Catalogs):
+        self.catalogs = catalogs
+        self._index = DeletionIndex([*catalogs.active.codes, *catalogs.inactive.codes])
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _suggestion(self, code: str, distance: int) -> CodeSuggestion:
+        active = code in self.catalogs.active
+        source = self.catalogs.active if active else self.catalogs.inactive
+        return CodeSuggestion(item_code=code, distance=distance, active=active, name=source.names[source.row_id(code)])
+
+    def suggest(self, raw_code: str, max_distance: int = 2, limit: int = 5) -> list[CodeSuggestion]:
+        """Rank the catalog codes nearest to a (possibly mangled) code; active codes first on ties."""
+        code = normalize_item_code(raw_code)
+        if code in self.catalogs.active or code in self.catalogs.inactive:
+            return [self._suggestion(code, 0)]
+        matches = [self._suggestion(match, distance) for distance, match in self._index.search(code, max_distance)]
+        matches.sort(key=lambda s: (s.distance, not s.active, s.item_code))
+        return matches[:limit]
+
+
+@lru_cache(maxsize=4)
+def code_index(catalogs: Catalogs) -> CodeIndex:
+    """The fuzzy index for a version of the catalogs, built on first use and kept across reloads."""
+    return CodeIndex(catalogs)
+
+
+def repair_item_code(line: str) -> tuple[str, str, re.Match] | None:
+    """Find a mangled item code in a line: (normalized code, text as printed, match), or None."""
+    match = LOOSE_CODE_PATTERN.search(line)
+    if match is None:
+        return None
+    code = normalize_item_code(match.group(1))
+    if not ITEM_CODE_SHAPE.fullmatch(code):
+        return None
+    return code, match.group(1), match
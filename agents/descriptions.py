@@ -0,0 +1,214 @@
+"""Offline similarity index between invoice line descriptions and NIDS support item names.
+
+A common fraud pattern is billing a pricier code for a cheaper service ("house cleaning"
+billed as a high-intensity support). Every support item name is turned into a character
+n-gram TF-IDF vector; n-grams are robust to abbreviations, plurals and PDF spacing.
+The vectors are kept as a sparse term -> postings matrix (hand-rolled CSC in NumPy, so
+there is no SciPy dependency), which lets a batch of descriptions be scored against their
+claimed codes, or against every item, with a few array operations.
+"""
+import re
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+from pydantic import BaseModel
+
+from agents.catalog import Catalogs
+
+NGRAM_SIZES = (3, 4)
+# Below this cosine similarity a description is considered unrelated to the claimed item...
+MISMATCH_SCORE = 0.1
+# ...when another item's name matches it at least this well
+CONFIDENT_MATCH_SCORE = 0.4
+_CHUNK_ROWS = 2048
+
+
+def _expand(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenate the index ranges [start, start + length) without a Python loop."""
+    if len(lengths) == 0:
+        return np.array([], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+
+def _distinct(values) -> tuple[list, np.ndarray]:
+    """The distinct values, in first-seen order, and the position of each value among them."""
+    positions: dict = {}
+    inverse = np.fromiter((positions.setdefault(value, len(positions)) for value in values), dtype=np.int64)
+    return list(positions), inverse
+
+
+def char_ngrams(text: str) -> list[str]:
+    """Character n-grams of each word (padded with spaces), after lowercasing and dropping punctuation."""
+    grams = []
+    for word in re.sub(r"[^a-z0-9]+", " ", str(text).lower()).split():
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            grams.extend(padded[i:i + n] for i in range(max(len(padded) - n + 1, 1)))
+    return grams
+
+
+class DescriptionMatch(BaseModel):
+    """How well a line description matches a catalog item name."""
+    item_code: str
+    name: str
+    score: float
+    active: bool
+
+
+class DescriptionIndex:
+    """TF-IDF (sublinear tf, smoothed idf, l2-normalized) over the item names of one catalog version."""
+
+    def __init__(self, catalogs: Catalogs):
+        self.catalogs = catalogs
+        codes, names, active = [], [], []
+        for source, is_active in ((catalogs.active, True), (catalogs.inactive, False)):
+            for code, row in source.index.items():
+                if code not in catalogs.active or is_active:
+                    codes.append(code)
+                    names.append(source.names[row])
+                    active.append(is_active)
+        self.codes = codes
+        self.names = names
+        self.active = np.array(active, dtype=bool)
+        self.row_of = {code: i for i, code in enumerate(codes)}
+
+        self.vocabulary: dict[str, int] = {}
+        rows, terms, counts = [], [], []
+        for row, name in enumerate(names):
+            grams, gram_counts = np.unique(char_ngrams(name), return_counts=True)
+            for gram, count in zip(grams, gram_counts):
+                rows.append(row)
+                terms.append(self.vocabulary.setdefault(gram, len(self.vocabulary)))
+                counts.append(count)
+        rows = np.array(rows, dtype=np.int64)
+        terms = np.array(terms, dtype=np.int64)
+        document_frequency = np.bincount(terms, minlength=len(self.vocabulary))
+        self.idf = np.log((1 + len(names)) / (1 + document_frequency)) + 1
+        weights = (1 + np.log(np.array(counts, dtype=np.float64))) * self.idf[terms]
+        norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=len(names)))
+        weights /= norms[rows]
+
+        # Column-major (term -> postings) layout, plus sorted (term, row) keys for point lookups
+        order = np.lexsort((rows, terms))
+        self._rows = rows[order]
+        self._weights = weights[order]
+        self._keys = terms[order] * len(names) + self._rows
+        self._term_ptr = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(self.vocabulary)))])
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _vector(self, text: str) -> tuple[np.ndarray, np.ndarray]:
+        """Sparse TF-IDF vector of one description as (term ids, weights); unknown n-grams are dropped."""
+        counts = Counter(self.vocabulary[g] for g in char_ngrams(text) if g in self.vocabulary)
+        if not counts:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+        terms = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        w = (1 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))) * self.idf[terms]
+        return terms, w / np.linalg.norm(w)
+
+    def _vectorize(self, descriptions) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Sparse query vectors as (query id, term id, weight) triples.
+
+        Bulk claims repeat the same few descriptions, so each distinct text is vectorized once.
+        """
+        distinct, inverse = _distinct(descriptions)
+        vectors = [self._vector(text) for text in distinct]
+        lengths = np.array([len(terms) for terms, _ in vectors], dtype=np.int64)
+        all_terms = np.concatenate([terms for terms, _ in vectors] + [np.array([], dtype=np.int64)])
+        all_weights = np.concatenate([w for _, w in vectors] + [np.array([], dtype=np.float64)])
+        positions = _expand(np.concatenate([[0], np.cumsum(lengths)[:-1]])[inverse], lengths[inverse])
+        query_ids = np.repeat(np.arange(len(inverse)), lengths[inverse])
+        return query_ids, all_terms[positions], all_weights[positions]
+
+    def score(self, descriptions, item_codes) -> np.ndarray:
+        """Cosine similarity of each description with its claimed item's name (NaN for unknown codes)."""
+        pairs, inverse = _distinct(zip(descriptions, item_codes))
+        if not pairs:
+            return np.array([], dtype=np.float64)
+        descriptions, item_codes = zip(*pairs)
+        rows = np.array([self.row_of.get(code, -1) for code in item_codes], dtype=np.int64)
+        query_ids, term_ids, weights = self._vectorize(descriptions)
+        keys = term_ids * len(self.codes) + rows[query_ids]
+        positions = np.searchsorted(self._keys, keys).clip(max=len(self._keys) - 1)
+        found = (self._keys[positions] == keys) & (rows[query_ids] >= 0)
+        scores = np.bincount(query_ids[found], weights=weights[found] * self._weights[positions[found]],
+                             minlength=len(descriptions))
+        return np.where(rows >= 0, scores, np.nan)[inverse]
+
+    def _score_all(self, query_ids: np.ndarray, term_ids: np.ndarray, weights: np.ndarray, n_queries: int) -> np.ndarray:
+        """Dense (queries x items) similarities, accumulated from the postings of each query term."""
+        starts = self._term_ptr[term_ids]
+        lengths = self._term_ptr[term_ids + 1] - starts
+        # Expand every (query, term) pair into that term's postings
+        posting = _expand(starts, lengths)
+        flat = np.repeat(query_ids, lengths) * len(self.codes) + self._rows[posting]
+        scores = np.bincount(flat, weights=np.repeat(weights, lengths) * self._weights[posting],
+                             minlength=n_queries * len(self.codes))
+        return scores.reshape(n_queries, len(self.codes))
+
+    def best_matches(self, descriptions, k: int = 3) -> list[list[DescriptionMatch]]:
+        """The k item names most similar to each description, best first."""
+        descriptions = list(descriptions)
+        results = []
+        for chunk_start in range(0, len(descriptions), _CHUNK_ROWS):
+            chunk = descriptions[chunk_start:chunk_start + _CHUNK_ROWS]
+            scores = self._score_all(*self._vectorize(chunk), len(chunk))
+            top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+            for query, rows in enumerate(top):
+                results.append([DescriptionMatch(item_code=self.codes[r], name=self.names[r],
+                                                 score=round(float(scores[query, r]), 4), active=bool(self.active[r]))
+                                for r in rows if scores[query, r] > 0])
+        return results
+
+    def best_scores(self, descriptions) -> tuple[np.ndarray, np.ndarray]:
+        """The best similarity of each description to any active item, and that item's code ("" if none)."""
+        distinct, inverse = _distinct(descriptions)
+        best = np.zeros(len(distinct))
+        rows = np.full(len(distinct), -1, dtype=np.int64)
+        for chunk_start in range(0, len(distinct), _CHUNK_ROWS):
+            chunk = distinct[chunk_start:chunk_start + _CHUNK_ROWS]
+            scores = self._score_all(*self._vectorize(chunk), len(chunk))
+            scores[:, ~self.active] = 0
+            chunk_rows = scores.argmax(axis=1)
+            chunk_best = scores[np.arange(len(chunk)), chunk_rows]
+            best[chunk_start:chunk_start + len(chunk)] = chunk_best
+            rows[chunk_start:chunk_start + len(chunk)] = np.where(chunk_best > 0, chunk_rows, -1)
+        codes = np.array(self.codes + [""], dtype=object)[rows]
+        return best[inverse], codes[inverse]
+
+
+@lru_cache(maxsize=4)
+def description_index(catalogs: Catalogs) -> DescriptionIndex:
+    """The description index for a version of the catalogs, built on first use."""
+    return DescriptionIndex(catalogs)
+
+
+def is_mismatch(score, best_score) -> np.ndarray:
+    """Whether a description is unrelated to its claimed item while clearly matching another one."""
+    with np.errstate(invalid="ignore"):
+        return (np.asarray(score) < MISMATCH_SCORE) & (np.asarray(best_score) >= CONFIDENT_MATCH_SCORE)
+
+
+class DescriptionCheck(BaseModel):
+    """A line description scored against its claimed item, with the best-matching items."""
+    item_code: str
+    description: str
+    score: float | None
+    matches: list[DescriptionMatch]
+
+    @property
+    def mismatch(self) -> bool:
+        if self.score is None or not self.matches or self.matches[0].item_code == self.item_code:
+            return False
+        return bool(is_mismatch(self.score, self.matches[0].score))
+
+
+def check_description(catalogs: Catalogs, item_code: str, description: str, k: int = 3) -> DescriptionCheck:
+    index = description_index(catalogs)
+    score = index.score([description], [item_code])[0]
+    return DescriptionCheck(item_code=item_code, description=description,
+                            score=None if np.isnan(score) else round(float(score), 4),
+                            matches=index.best_matches([description], k)[0])
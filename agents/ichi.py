@@ -1,37 +1,66 @@
-import os
-
 from langchain.agents import create_agent
 from langchain.agents.structured_output import ToolStrategy
-from langchain_openai import ChatOpenAI
-from langchain.tools import tool
+from langchain_core.language_models import BaseChatModel
+from agents.budget import Budget, BudgetExceededError, BudgetMiddleware, partial_response, run_deadline
 from agents.models import ProcessResponse, BaseAgent
+from agents.preprocess import prepare_invoice
+from agents.registry import make_llm
+from agents.tools import use_catalogs
+from agents.tracing import stage, trace_invoice, tracing_config
 
 system_prompt = """
 You're an expert at fraud detection for NIDS invoices. Given the content of an invoice, determine if it is potentially fraudulent. If the invoice appears legitimate, respond with is_valid set to true and provide a brief reason. If the invoice seems suspicious or fraudulent, respond with is_valid set to false and provide a detailed reason explaining the indicators of fraud.
+Always set confidence between 0 and 1: how sure you are of the verdict. You cannot look up NIDS prices or item codes, so only give a high confidence when the invoice is clearly legitimate or clearly fraudulent from its content alone.
 """
 
 class IchiAgent(BaseAgent):
-    def __init__(self, model: str):
-        self.model = model
+    prompt_version = "3"
 
-    def process(self, data: str) -> ProcessResponse:
-        api_key = os.getenv("OPENAI_API_KEY")
-        llm = ChatOpenAI(model=self.model, api_key=api_key)
-        agent = create_agent(
-            llm,
+    def __init__(self, model: str, compact_prompt: bool = True,
+                 llm: BaseChatModel | None = None, budget: Budget | None = None):
+        self.model = model
+        # Deadline for each analysis, and hedging of slow model calls
+        self.budget = budget if budget is not None else Budget()
+        # Send the extracted facts and line-item table instead of the raw invoice text
+        self.compact_prompt = compact_prompt
+        self.prompt_version = "-".join([IchiAgent.prompt_version, "compact" if compact_prompt else "raw"])
+        # A chat model can be injected, e.g. a scripted one for offline benchmarks and tests
+        self.llm = llm if llm is not None else make_llm(self.model)
+        self.agent = create_agent(
+            self.llm,
             response_format=ToolStrategy(ProcessResponse),
             system_prompt=system_prompt,
+            middleware=[BudgetMiddleware(self.budget)],
         )
 
-        result = agent.invoke(
-            {
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": f"Analyze the following invoice content parsed from the invoice pdf for fraud detection:\n\n{data}",
-                    }
-                ]
-            }
-        )
+    def _messages(self, data: str) -> dict:
+        if self.compact_prompt:
+            with stage("prompt"):
+                prepared = prepare_invoice(data, self.model)
+            if prepared.compact:
+                data = prepared.text
+        return {
+            "messages": [
+                {
+                    "role": "user",
+                    "content": f"Analyze the following invoice content parsed from the invoice pdf for fraud detection:\n\n{data}",
+                }
+            ]
+        }
+
+    def process(self, data: str) -> ProcessResponse:
+        # Ichi checks nothing against the catalogs itself, but its verdict is still tied to the version in use
+        with trace_invoice(type(self).__name__), use_catalogs() as catalogs, run_deadline(self.budget.deadline_seconds):
+            try:
+                response = self.agent.invoke(self._messages(data), config=tracing_config())["structured_response"]
+            except BudgetExceededError as e:
+                response = partial_response(e.messages, e.reason)
+        return response.model_copy(update={"catalog_version": catalogs.version})
 
-        return result["structured_response"]
+    async def aprocess(self, data: str) -> ProcessResponse:
+        with trace_invoice(type(self).__name__), use_catalogs() as catalogs, run_deadline(self.budget.deadline_seconds):
+            try:
+                response = (await self.agent.ainvoke(self._messages(data), config=tracing_config()))["structured_response"]
+            except BudgetExceededError as e:
+                response = partial_response(e.messages, e.reason)
+        return response.model_copy(update={"catalog_version": catalogs.version})
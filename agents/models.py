@@ -1,25 +1,135 @@
 from abc import ABC, abstractmethod
-from pydantic import BaseModel
-import pandas as pd
+import asyncio
+import hashlib
+from pydantic import BaseModel, Field
+from pydantic.json_schema import SkipJsonSchema
+import numpy as np
+
+# Price columns in the NIDS catalogs, in the order they appear in the CSVs.
+PRICE_COLUMNS = ("ACT", "NSW", "NT", "QLD", "SA", "TAS", "VIC", "WA", "Remote", "Very Remote")
+
+_KEPT_COLUMNS = {"Support Item Number", "Support Item Name", "Unit", "Quote", "Start date", "End Date", *PRICE_COLUMNS}
+
+
+def file_version(path: str) -> str:
+    """Content hash identifying a catalog file (the first 16 hex digits of its sha256)."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def _parse_prices(values) -> np.ndarray:
+    """Parse price strings like ' 1,046.03 ' or '$65.09' into floats (NaN when empty)."""
+    import pandas as pd
+
+    cleaned = values.astype(str).str.replace(r"[\s,$]", "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce").to_numpy(dtype=np.float64)
+
 
 class NIDSSource:
+    """Compact, read-only view of a NIDS price catalog.
+
+    The CSV is parsed once: item codes go into a dict mapping code -> row id and every
+    price column becomes a column of one items x regions float64 matrix (NaN where the item
+    has no fixed price), so lookups are O(1) and no DataFrame is kept around after loading.
+    """
+
     def __init__(self, csv_path: str):
-        self.df = pd.read_csv(csv_path)
+        # pandas is only needed to parse the CSV; snapshots (agents/snapshot.py) load without it
+        import pandas as pd
+
+        self.version = file_version(csv_path)
+        df = pd.read_csv(csv_path, dtype=str, keep_default_na=False,
+                         usecols=lambda c: c.strip().lstrip("\ufeff") in _KEPT_COLUMNS)
         # normalize for lookups
-        self.df.columns = [c.strip() for c in self.df.columns]
-        self.df['Support Item Number'] = self.df['Support Item Number'].astype(str).str.strip()
+        df.columns = [c.strip().lstrip("\ufeff") for c in df.columns]
+
+        self.codes: list[str] = df["Support Item Number"].str.strip().tolist()
+        # A few codes appear twice in the published CSVs; the first row wins, as before.
+        self.index: dict[str, int] = {}
+        for i, code in enumerate(self.codes):
+            self.index.setdefault(code, i)
+        self.names: list[str] = df["Support Item Name"].str.strip().tolist()
+        self.units: list[str] = df["Unit"].str.strip().tolist()
+        self.quotable = (df["Quote"].str.strip().str.lower() == "yes").to_numpy()
+        self.start_dates = pd.to_numeric(df["Start date"], errors="coerce").fillna(0).to_numpy(dtype=np.int32)
+        self.end_dates = pd.to_numeric(df["End Date"], errors="coerce").fillna(99991231).to_numpy(dtype=np.int32)
+        # items x regions, columns in PRICE_COLUMNS order; `prices` holds per-column views of it
+        self.price_matrix = np.column_stack([_parse_prices(df[col]) for col in PRICE_COLUMNS])
+        self.prices: dict[str, np.ndarray] = {col: self.price_matrix[:, i] for i, col in enumerate(PRICE_COLUMNS)}
+
+    @classmethod
+    def from_arrays(cls, version: str, codes: list[str], names: list[str], units: list[str], quotable: np.ndarray,
+                    start_dates: np.ndarray, end_dates: np.ndarray, price_matrix: np.ndarray) -> "NIDSSource":
+        """Build a catalog from already parsed columns, e.g. memory-mapped snapshot arrays."""
+        source = cls.__new__(cls)
+        source.version = version
+        source.codes = codes
+        source.index = {}
+        for i, code in enumerate(codes):
+            source.index.setdefault(code, i)
+        source.names = names
+        source.units = units
+        source.quotable = quotable
+        source.start_dates = start_dates
+        source.end_dates = end_dates
+        source.price_matrix = price_matrix
+        source.prices = {col: price_matrix[:, i] for i, col in enumerate(PRICE_COLUMNS)}
+        return source
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __contains__(self, item_code: str) -> bool:
+        return item_code in self.index
 
     def validate_item(self, item_code: str):
         """Check if an item code exists in the NIDS source."""
-        return item_code in self.df['Support Item Number'].values
+        return item_code in self.index
+
+    def row_id(self, item_code: str) -> int | None:
+        """Return the row id of an item code, or None if it is not in the catalog."""
+        return self.index.get(item_code)
+
+    def row_ids(self, item_codes) -> np.ndarray:
+        """Vectorized row_id: map many item codes to row ids, with -1 for unknown codes."""
+        import pandas as pd
+
+        categorical = pd.Categorical(item_codes)
+        category_rows = np.fromiter((self.index.get(code, -1) for code in categorical.categories),
+                                    dtype=np.int64, count=len(categorical.categories))
+        # Missing values have category code -1; route them to an appended -1 row
+        return np.append(category_rows, -1)[categorical.codes]
+
+    def get_price(self, item_code: str, column: str) -> float | None:
+        """Return the price cap of an item for a price column, or None if it has no fixed price."""
+        row = self.index.get(item_code)
+        if row is None:
+            return None
+        price = self.prices[column][row]
+        return None if np.isnan(price) else float(price)
+
+    def is_quotable(self, item_code: str) -> bool:
+        """Check if an item is explicitly marked as quotable in the catalog."""
+        row = self.index.get(item_code)
+        return row is not None and bool(self.quotable[row])
 
 class ProcessResponse(BaseModel):
     is_valid: bool
     reason: str
     is_using_old_pricing: bool = False
+    # Filled by the model; the cascade escalates answers it is not sure of (missing counts as unsure)
+    confidence: float | None = Field(default=None, ge=0, le=1, description=(
+        "How sure you are of the verdict, from 0 (a guess) to 1 (every line item was verified)"))
+    # Set by the agent, not the model: which catalogs (see Catalogs.version) the verdict was checked against
+    catalog_version: SkipJsonSchema[str | None] = None
+    # Set by the agent when the run stopped early (deadline, step or token budget): why, and the verdict is best-effort
+    incomplete: SkipJsonSchema[str | None] = None
 
 
 class BaseAgent(ABC):
+    # Bump when an agent's prompts change so cached verdicts are not reused
+    prompt_version: str = "1"
+
     @abstractmethod
     def __init__(self, model: str):
         pass
@@ -27,3 +137,25 @@ class BaseAgent(ABC):
     @abstractmethod
     def process(self, data: str) -> ProcessResponse:
         pass
+
+    async def aprocess(self, data: str) -> ProcessResponse:
+        """Async variant of process; agents with an async client override this."""
+        return await asyncio.to_thread(self.process, data)
+
+
+async def process_many(agent: BaseAgent, invoices: list[str], concurrency: int = 8,
+                       return_exceptions: bool = False) -> list[ProcessResponse | BaseException]:
+    """Process invoices concurrently, at most `concurrency` at a time, returning results in input order."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(invoice: str) -> ProcessResponse:
+        async with semaphore:
+            return await agent.aprocess(invoice)
+
+    return await asyncio.gather(*(run(invoice) for invoice in invoices), return_exceptions=return_exceptions)
+
+
+def run_many(agent: BaseAgent, invoices: list[str], concurrency: int = 8,
+             return_exceptions: bool = False) -> list[ProcessResponse | BaseException]:
+    """Synchronous entry point for process_many."""
+    return asyncio.run(process_many(agent, invoices, concurrency, return_exceptions))
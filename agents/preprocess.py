@@ -0,0 +1,169 @@
+"""Compact, structured prompts: the invoice facts and line items the agents need, nothing else.
+
+Raw invoice text is mostly addresses, bank details and boilerplate, and the model spends
+input tokens re-reading it and turns re-extracting the line items. The pre-pass reuses the
+rule engine's extraction to render short header facts plus a line-item table; lines that
+look like line items but could not be parsed are passed through verbatim so nothing is lost.
+"""
+import re
+import threading
+from functools import lru_cache
+
+from pydantic import BaseModel
+
+from agents.regions import resolve_state
+from agents.rules import ExtractedLineItem, detect_location_type, extract_invoice_totals, extract_line_items
+
+DEFAULT_TOKENIZER_MODEL = "gpt-4o-mini"
+
+_INVOICE_NUMBER_PATTERN = re.compile(r"invoice\s*(?:no\.?|number|#)\s*[:.]?\s*([A-Z0-9][\w/-]*)", re.IGNORECASE)
+_INVOICE_DATE_PATTERN = re.compile(r"^\s*(?:invoice\s+)?date\s*:\s*(.+?)\s*$", re.IGNORECASE | re.MULTILINE)
+_SERVICE_LOCATION_PATTERN = re.compile(r"^\s*(?:service\s+)?location\s*:\s*(.+?)\s*$", re.IGNORECASE | re.MULTILINE)
+# Rough stand-in for a BPE tokenizer: words, numbers and single punctuation marks
+_APPROXIMATE_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # tiktoken missing, or its encoding files can't be downloaded (offline)
+        return None
+
+
+def count_tokens(text: str, model: str = DEFAULT_TOKENIZER_MODEL) -> int:
+    """Count input tokens with the model's tokenizer, or approximate them when it is unavailable."""
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(_APPROXIMATE_TOKEN_PATTERN.findall(text))
+
+
+class InvoiceFacts(BaseModel):
+    """Header facts of an invoice that matter for validation."""
+    invoice_number: str | None = None
+    invoice_date: str | None = None
+    service_location: str | None = None
+    location_type: str = "standard"
+    state: str | None = None
+    totals: list[float] = []
+
+
+class CompactInvoice(BaseModel):
+    """An invoice reduced to its facts and line items."""
+    facts: InvoiceFacts
+    items: list[ExtractedLineItem]
+    unparsed_lines: list[str] = []
+
+    def render(self) -> str:
+        facts = self.facts
+        lines = ["Invoice facts:"]
+        for label, value in (("Invoice number", facts.invoice_number), ("Invoice date", facts.invoice_date),
+                             ("Service location", facts.service_location)):
+            if value:
+                lines.append(f"- {label}: {value}")
+        lines.append(f"- Location type: {facts.location_type}")
+        lines.append(f"- State: {facts.state or 'unknown'}")
+        if facts.totals:
+            lines.append("- Invoice total(s): " + ", ".join(f"${total:.2f}" for total in facts.totals))
+
+        lines.append("")
+        lines.append("Line items (service date | item code | description | quantity | rate | amount):")
+        for number, item in enumerate(self.items, 1):
+            if item.is_complete:
+                values = f"{item.quantity:g} | {item.rate:.2f} | {item.amount:.2f}"
+            else:
+                # Keep the original line when the numbers could not be read
+                values = f"? | ? | ? (original line: {item.line})"
+            code = item.item_code if item.printed_code is None else f"{item.item_code} (printed as '{item.printed_code}')"
+            lines.append(f"{number}. {item.service_date or '-'} | {code} | {item.description} | {values}")
+
+        if self.unparsed_lines:
+            lines.append("")
+            lines.append("Lines that look like line items but could not be parsed (verbatim):")
+            lines.extend(f"- {line}" for line in self.unparsed_lines)
+        return "\n".join(lines)
+
+
+def _first(pattern: re.Pattern, text: str) -> str | None:
+    match = pattern.search(text)
+    return match.group(1).strip() if match else None
+
+
+def compact_invoice(text: str) -> CompactInvoice | None:
+    """Extract the facts and line items of an invoice, or None when no line items were found."""
+    items, malformed = extract_line_items(text)
+    if not items:
+        return None
+    facts = InvoiceFacts(
+        invoice_number=_first(_INVOICE_NUMBER_PATTERN, text),
+        invoice_date=_first(_INVOICE_DATE_PATTERN, text),
+        service_location=_first(_SERVICE_LOCATION_PATTERN, text),
+        location_type=detect_location_type(text),
+        state=resolve_state(text),
+        totals=list(dict.fromkeys(extract_invoice_totals(text))),
+    )
+    return CompactInvoice(facts=facts, items=items, unparsed_lines=malformed)
+
+
+class PreparedPrompt(BaseModel):
+    """The invoice text sent to the model, with token counts before and after compaction."""
+    text: str
+    compact: bool
+    raw_tokens: int
+    prompt_tokens: int
+
+    @property
+    def reduction(self) -> float:
+        return 1 - self.prompt_tokens / self.raw_tokens if self.raw_tokens else 0.0
+
+
+class PromptStats:
+    """Thread-safe running totals of input tokens saved by compact prompts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.invoices = 0
+        self.compacted = 0
+        self.raw_tokens = 0
+        self.prompt_tokens = 0
+
+    def record(self, prepared: PreparedPrompt):
+        with self._lock:
+            self.invoices += 1
+            self.compacted += int(prepared.compact)
+            self.raw_tokens += prepared.raw_tokens
+            self.prompt_tokens += prepared.prompt_tokens
+
+    @property
+    def reduction(self) -> float:
+        return 1 - self.prompt_tokens / self.raw_tokens if self.raw_tokens else 0.0
+
+    def summary(self) -> str:
+        return (f"Compact prompts: {self.compacted}/{self.invoices} invoices, {self.prompt_tokens} of "
+                f"{self.raw_tokens} raw input tokens ({self.reduction:.1%} reduction)")
+
+
+prompt_stats = PromptStats()
+
+
+def prepare_invoice(text: str, model: str = DEFAULT_TOKENIZER_MODEL, stats: PromptStats | None = prompt_stats) -> PreparedPrompt:
+    """Compact an invoice for the model, falling back to the raw text when no line items are found."""
+    compact = compact_invoice(text)
+    prompt = compact.render() if compact is not None else text
+    raw_tokens = count_tokens(text, model)
+    prepared = PreparedPrompt(
+        text=prompt,
+        compact=compact is not None,
+        raw_tokens=raw_tokens,
+        prompt_tokens=count_tokens(prompt, model) if compact is not None else raw_tokens,
+    )
+    if stats is not None:
+        stats.record(prepared)
+    return prepared
@@ -0,0 +1,308 @@
+"""Rate-limit-aware scheduling of model calls, shared by every worker process on the host.
+
+OpenAI limits requests and tokens per minute per model. Each model gets two token buckets
+(requests and estimated tokens) stored in a SQLite file, so gunicorn workers, batch runs
+and the web UI all draw from the same budget instead of each retrying into 429s.
+
+Callers wait in priority lanes: an interactive request (the web UI, the API) is served
+before any batch request, and requests are first-come first-served within a lane. A
+waiter that stops polling (its process died) drops out of the queue after a few seconds.
+Token costs are estimated before the call and corrected with the reported usage after it.
+
+Limits come from NIDS_OPENAI_RPM and NIDS_OPENAI_TPM (0 turns a limit off); the store is
+NIDS_RATELIMIT_PATH. The lane is picked per request with `use_lane("batch")`, and
+`before_send` lets a caller see when a request leaves the queue, or abandon it there.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Literal
+
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+from langchain_openai import ChatOpenAI
+
+from agents.preprocess import count_tokens
+from agents.tracing import stage
+
+DEFAULT_RATELIMIT_PATH = os.getenv("NIDS_RATELIMIT_PATH", ".cache/ratelimit.sqlite3")
+DEFAULT_REQUESTS_PER_MINUTE = float(os.getenv("NIDS_OPENAI_RPM", 500))
+DEFAULT_TOKENS_PER_MINUTE = float(os.getenv("NIDS_OPENAI_TPM", 200_000))
+# Output tokens reserved per call when the request sets no max_tokens
+DEFAULT_OUTPUT_ALLOWANCE = 500
+
+Lane = Literal["interactive", "batch"]
+LANE_PRIORITY = {"interactive": 0, "batch": 1}
+
+_lane: contextvars.ContextVar[Lane] = contextvars.ContextVar("rate_limit_lane", default="interactive")
+_before_send: contextvars.ContextVar[Callable[[], None] | None] = contextvars.ContextVar("before_send", default=None)
+
+
+@contextmanager
+def use_lane(lane: Lane):
+    """Schedule the model calls made inside the block in `lane`."""
+    if lane not in LANE_PRIORITY:
+        raise ValueError(f"Unknown lane {lane!r}, expected one of {', '.join(LANE_PRIORITY)}")
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane() -> Lane:
+    return _lane.get()
+
+
+@contextmanager
+def before_send(callback: Callable[[], None]):
+    """Call `callback` once a request made in the block has its rate-limit slot, just before it is sent.
+
+    The callback may raise to abandon the request; its slot is given back.
+    """
+    token = _before_send.set(callback)
+    try:
+        yield
+    finally:
+        _before_send.reset(token)
+
+
+class RateLimitScheduler:
+    """Token buckets for requests and tokens per model, with prioritised waiting, in one SQLite file.
+
+    A bucket holds at most one minute of its limit and refills continuously. A request
+    larger than a whole bucket is charged the full bucket, so it waits for an empty
+    minute instead of forever.
+    """
+
+    def __init__(self, path: str = DEFAULT_RATELIMIT_PATH, requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE, poll_seconds: float = 0.05,
+                 waiter_timeout: float = 5.0):
+        self.path = path
+        self.limits = {"requests": requests_per_minute, "tokens": tokens_per_minute}
+        self.poll_seconds = poll_seconds
+        self.waiter_timeout = waiter_timeout
+        # Seconds callers in this process spent waiting, per lane
+        self.waited = {lane: 0.0 for lane in LANE_PRIORITY}
+        self.acquired = {lane: 0 for lane in LANE_PRIORITY}
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Transactions are managed explicitly: BEGIN IMMEDIATE serialises writers across processes
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS waiters (id TEXT PRIMARY KEY, model TEXT NOT NULL, priority INTEGER NOT NULL, "
+                         "enqueued REAL NOT NULL, heartbeat REAL NOT NULL)")
+
+    @property
+    def enabled(self) -> bool:
+        return any(self.limits.values())
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _levels(self, db: sqlite3.Connection, model: str, now: float) -> dict[str, float]:
+        """Current bucket levels for a model, refilled up to now (not yet written back)."""
+        levels = {}
+        for kind, limit in self.limits.items():
+            if not limit:
+                continue
+            row = db.execute("SELECT level, updated FROM buckets WHERE name = ?", (f"{model}:{kind}",)).fetchone()
+            level, updated = row if row is not None else (limit, now)
+            levels[kind] = min(limit, level + (now - updated) * limit / 60)
+        return levels
+
+    def _store(self, db: sqlite3.Connection, model: str, levels: dict[str, float], now: float):
+        db.executemany("INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+                       [(f"{model}:{kind}", level, now) for kind, level in levels.items()])
+
+    def _try_acquire(self, waiter: str, model: str, priority: int, enqueued: float, costs: dict[str, float]) -> float:
+        """Take the costs from the buckets if this waiter is at the head of the queue.
+
+        Returns 0 when acquired, otherwise how long to wait before trying again.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("DELETE FROM waiters WHERE heartbeat < ?", (now - self.waiter_timeout,))
+            db.execute("INSERT OR REPLACE INTO waiters (id, model, priority, enqueued, heartbeat) VALUES (?, ?, ?, ?, ?)",
+                       (waiter, model, priority, enqueued, now))
+            head = db.execute("SELECT id FROM waiters WHERE model = ? ORDER BY priority, enqueued, id LIMIT 1", (model,)).fetchone()
+            if head[0] != waiter:
+                return self.poll_seconds
+            levels = self._levels(db, model, now)
+            shortfall = {kind: min(costs[kind], self.limits[kind]) - level for kind, level in levels.items()}
+            if any(missing > 0 for missing in shortfall.values()):
+                return max(missing * 60 / self.limits[kind] for kind, missing in shortfall.items() if missing > 0)
+            self._store(db, model, {kind: level - min(costs[kind], self.limits[kind]) for kind, level in levels.items()}, now)
+            db.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+            return 0.0
+
+    def _leave(self, waiter: str):
+        with self._transaction() as db:
+            db.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+
+    def _record(self, lane: Lane, waited: float):
+        with self._lock:
+            self.waited[lane] += waited
+            self.acquired[lane] += 1
+
+    def acquire(self, model: str, tokens: float, lane: Lane | None = None):
+        """Block until one request of `tokens` estimated tokens may be sent to `model`."""
+        if not self.enabled:
+            return
+        lane = lane or current_lane()
+        waiter, started = uuid.uuid4().hex, time.time()
+        costs = {"requests": 1, "tokens": tokens}
+        with stage("rate_limit"):
+            try:
+                while (wait := self._try_acquire(waiter, model, LANE_PRIORITY[lane], started, costs)) > 0:
+                    time.sleep(min(wait, self.poll_seconds))
+            except BaseException:
+                self._leave(waiter)
+                raise
+        self._record(lane, time.time() - started)
+
+    async def aacquire(self, model: str, tokens: float, lane: Lane | None = None):
+        """Async variant of acquire; waits without blocking the event loop.
+
+        Each poll is a SQLite write that may wait on other processes, so it runs in a
+        worker thread rather than on the loop.
+        """
+        if not self.enabled:
+            return
+        lane = lane or current_lane()
+        waiter, started = uuid.uuid4().hex, time.time()
+        costs = {"requests": 1, "tokens": tokens}
+        with stage("rate_limit"):
+            while True:
+                poll = asyncio.ensure_future(asyncio.to_thread(self._try_acquire, waiter, model, LANE_PRIORITY[lane], started, costs))
+                try:
+                    wait = await asyncio.shield(poll)
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(min(wait, self.poll_seconds))
+                except BaseException:
+                    # A poll still running when the caller gives up may yet take a slot; give it back
+                    poll.add_done_callback(lambda done: self._abandon(done, waiter, model, tokens))
+                    raise
+        self._record(lane, time.time() - started)
+
+    def _abandon(self, poll: asyncio.Future, waiter: str, model: str, tokens: float):
+        if not poll.cancelled() and poll.exception() is None and poll.result() <= 0:
+            self.release(model, tokens)
+        else:
+            self._leave(waiter)
+
+    def settle(self, model: str, estimated: float, actual: float):
+        """Correct the token bucket once a call reports its real usage."""
+        if not self.limits["tokens"] or actual == estimated:
+            return
+        now = time.time()
+        with self._transaction() as db:
+            levels = self._levels(db, model, now)
+            # May go negative: the next callers pay back what this call overspent
+            levels["tokens"] = min(self.limits["tokens"], levels["tokens"] + estimated - actual)
+            self._store(db, model, levels, now)
+
+    def release(self, model: str, tokens: float):
+        """Give back the request and tokens acquired for a request that was never sent."""
+        if not self.enabled:
+            return
+        now = time.time()
+        refund = {"requests": 1, "tokens": tokens}
+        with self._transaction() as db:
+            levels = self._levels(db, model, now)
+            self._store(db, model, {kind: min(self.limits[kind], level + min(refund[kind], self.limits[kind]))
+                                    for kind, level in levels.items()}, now)
+
+    def levels(self, model: str) -> dict[str, float]:
+        """Current bucket levels for a model."""
+        with self._transaction() as db:
+            return self._levels(db, model, time.time())
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {lane: {"requests": self.acquired[lane], "waited_seconds": round(self.waited[lane], 3)} for lane in LANE_PRIORITY}
+
+
+_scheduler: RateLimitScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RateLimitScheduler:
+    """The process-wide scheduler, backed by the shared store."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RateLimitScheduler()
+        return _scheduler
+
+
+def estimate_tokens(messages: list[BaseMessage], kwargs: dict, max_tokens: int | None) -> int:
+    """Input tokens of a request (messages and tool schemas) plus the output it may produce."""
+    text = "\n".join(str(message.content) for message in messages)
+    if kwargs.get("tools"):
+        text += json.dumps(kwargs["tools"], default=str)
+    return count_tokens(text) + (max_tokens or DEFAULT_OUTPUT_ALLOWANCE)
+
+
+def _total_tokens(result: ChatResult) -> int | None:
+    usage = getattr(result.generations[0].message, "usage_metadata", None) if result.generations else None
+    if usage:
+        return usage.get("total_tokens")
+    token_usage = (result.llm_output or {}).get("token_usage") or {}
+    return token_usage.get("total_tokens")
+
+
+class ScheduledChatOpenAI(ChatOpenAI):
+    """ChatOpenAI that waits for the shared rate-limit scheduler before every request."""
+
+    scheduler: Any = None
+
+    def _scheduler(self) -> RateLimitScheduler:
+        return self.scheduler if self.scheduler is not None else get_scheduler()
+
+    def _sending(self, scheduler: RateLimitScheduler, estimated: float):
+        callback = _before_send.get()
+        if callback is None:
+            return
+        try:
+            callback()
+        except BaseException:
+            scheduler.release(self.model_name, estimated)
+            raise
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None, run_manager=None, **kwargs) -> ChatResult:
+        scheduler = self._scheduler()
+        estimated = estimate_tokens(messages, kwargs, self.max_tokens)
+        scheduler.acquire(self.model_name, estimated)
+        self._sending(scheduler, estimated)
+        result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        scheduler.settle(self.model_name, estimated, _total_tokens(result) or estimated)
+        return result
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: list[str] | None = None, run_manager=None,
+                         **kwargs) -> ChatResult:
+        scheduler = self._scheduler()
+        estimated = estimate_tokens(messages, kwargs, self.max_tokens)
+        await scheduler.aacquire(self.model_name, estimated)
+        self._sending(scheduler, estimated)
+        result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        scheduler.settle(self.model_name, estimated, _total_tokens(result) or estimated)
+        return result
@@ -0,0 +1,105 @@
+"""States, location types and how they map onto catalog price columns."""
+import re
+
+from agents.models import PRICE_COLUMNS
+
+STATE_COLUMNS = PRICE_COLUMNS[:8]
+DEFAULT_STATE = "ACT"
+REGION_INDEX = {column: i for i, column in enumerate(PRICE_COLUMNS)}
+
+STATE_ALIASES = {
+    "australian capital territory": "ACT",
+    "new south wales": "NSW",
+    "northern territory": "NT",
+    "queensland": "QLD",
+    "south australia": "SA",
+    "tasmania": "TAS",
+    "victoria": "VIC",
+    "western australia": "WA",
+}
+
+# Australia Post postcode ranges per state
+POSTCODE_RANGES = [
+    (200, 299, "ACT"), (2600, 2618, "ACT"), (2900, 2920, "ACT"),
+    (1000, 2599, "NSW"), (2619, 2899, "NSW"), (2921, 2999, "NSW"),
+    (800, 999, "NT"),
+    (4000, 4999, "QLD"), (9000, 9999, "QLD"),
+    (5000, 5999, "SA"),
+    (7000, 7999, "TAS"),
+    (3000, 3999, "VIC"), (8000, 8999, "VIC"),
+    (6000, 6999, "WA"),
+]
+
+_STATE_NAME_PATTERN = re.compile(r"\b(" + "|".join(STATE_ALIASES) + r")\b", re.IGNORECASE)
+# Abbreviations like "act" or "sa" are ordinary words too, so they must be upper case
+# unless a postcode follows ("Melbourne Vic 3030")
+_STATE_CODE_PATTERN = re.compile(r"\b(" + "|".join(STATE_COLUMNS) + r")\b")
+_STATE_CODE_POSTCODE_PATTERN = re.compile(r"\b(" + "|".join(STATE_COLUMNS) + r")\s*,?\s*\d{4}\b", re.IGNORECASE)
+# A town followed by a postcode at the end of an address line
+_POSTCODE_PATTERN = re.compile(r"\b([A-Za-z]{3,})[,\s]+(\d{4})\s*$")
+_MONTHS = {"jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"}
+# Lines that are about the NDIA or a plan manager rather than where the participant lives
+_IGNORED_LINE_PATTERN = re.compile(r"national disability insurance|ndia|gpo box|plan manag|plan partners", re.IGNORECASE)
+_LOCATION_LINE_PATTERN = re.compile(r"service location|location|participant address|service address", re.IGNORECASE)
+
+
+def normalize_state(value) -> str | None:
+    """Turn 'vic', 'Victoria' or ' VIC ' into 'VIC'; None when not a state."""
+    if value is None:
+        return None
+    text = str(value).strip().lower()
+    if text in STATE_ALIASES:
+        return STATE_ALIASES[text]
+    return text.upper() if text.upper() in STATE_COLUMNS else None
+
+
+def state_for_postcode(postcode) -> str | None:
+    try:
+        number = int(postcode)
+    except (TypeError, ValueError):
+        return None
+    for low, high, state in POSTCODE_RANGES:
+        if low <= number <= high:
+            return state
+    return None
+
+
+def _state_in_line(line: str) -> str | None:
+    matches = [m for pattern in (_STATE_NAME_PATTERN, _STATE_CODE_PATTERN, _STATE_CODE_POSTCODE_PATTERN)
+               if (m := pattern.search(line))]
+    if not matches:
+        return None
+    return normalize_state(min(matches, key=lambda m: m.start()).group(1))
+
+
+def resolve_state(text: str, explicit: str | None = None) -> str | None:
+    """Work out which state's prices apply to an invoice.
+
+    An explicit state wins; then a labelled service location line; then the first state
+    named in an address (ignoring NDIA and plan manager addresses); then a postcode.
+    """
+    state = normalize_state(explicit)
+    if state:
+        return state
+
+    lines = [line for line in text.splitlines() if not _IGNORED_LINE_PATTERN.search(line)]
+    for line in lines:
+        if _LOCATION_LINE_PATTERN.search(line) and (state := _state_in_line(line)):
+            return state
+    for line in lines:
+        if state := _state_in_line(line):
+            return state
+    for line in lines:
+        match = _POSTCODE_PATTERN.search(line.strip())
+        if match and match.group(1)[:3].lower() not in _MONTHS and (state := state_for_postcode(match.group(2))):
+            return state
+    return None
+
+
+def price_column_for(location_type: str, state: str | None = None) -> str:
+    """Map a location type (and the state for standard locations) to the catalog price column."""
+    if location_type.lower() == "remote":
+        return "Remote"
+    elif location_type.lower() == "very_remote":
+        return "Very Remote"
+    return normalize_state(state) or DEFAULT_STATE
@@ -0,0 +1,117 @@
+"""Process-wide registry of warm agents sharing pooled HTTP clients."""
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from agents.cache import CachedAgent
+from agents.models import BaseAgent
+from agents.ratelimit import ScheduledChatOpenAI
+
+DEFAULT_MODEL = os.getenv("NIDS_DEFAULT_MODEL", "gpt-4o-mini")
+
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=16, keepalive_expiry=60)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+_http_client: httpx.Client | None = None
+_http_async_client: httpx.AsyncClient | None = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """Return the keep-alive HTTP client shared by every model client in this process."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+        return _http_client
+
+
+class _PerLoopTransport(httpx.AsyncBaseTransport):
+    """Async connection pool per event loop.
+
+    Pooled async connections belong to the loop that opened them, and asyncio.run starts
+    a new loop on every call, so each loop gets its own pool (dropped along with the loop).
+    """
+
+    def __init__(self):
+        self._pools: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport] = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _pool(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pool = self._pools.get(loop)
+            if pool is None:
+                pool = self._pools[loop] = httpx.AsyncHTTPTransport(limits=HTTP_LIMITS)
+            return pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._pool().handle_async_request(request)
+
+    async def aclose(self):
+        with self._lock:
+            pool = self._pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool.aclose()
+
+
+def get_http_async_client() -> httpx.AsyncClient:
+    """Return the async counterpart of get_http_client, used by aprocess and ainvoke."""
+    global _http_async_client
+    with _http_client_lock:
+        if _http_async_client is None:
+            _http_async_client = httpx.AsyncClient(transport=_PerLoopTransport(), timeout=HTTP_TIMEOUT)
+        return _http_async_client
+
+
+def make_llm(model: str) -> ChatOpenAI:
+    """Build a chat model that reuses the shared connection pools and waits for the shared rate limits."""
+    return ScheduledChatOpenAI(model=model, api_key=os.getenv("OPENAI_API_KEY"), http_client=get_http_client(),
+                               http_async_client=get_http_async_client())
+
+
+class AgentRegistry:
+    """Builds each (agent class, model, options) combination once and hands out the same instance.
+
+    Agents hold a compiled graph and a model client, both of which are safe to share
+    between requests, so there is no need to rebuild them per analysis.
+    """
+
+    def __init__(self):
+        self._agents: dict[tuple, BaseAgent] = {}
+        self._lock = threading.Lock()
+
+    def get(self, agent_cls: type[BaseAgent], model: str = DEFAULT_MODEL, cached: bool = True, **options) -> BaseAgent:
+        key = (agent_cls, model, cached, tuple(sorted(options.items())))
+        agent = self._agents.get(key)
+        if agent is not None:
+            return agent
+        with self._lock:
+            agent = self._agents.get(key)
+            if agent is None:
+                agent = agent_cls(model=model, **options)
+                if cached:
+                    agent = CachedAgent(agent)
+                self._agents[key] = agent
+            return agent
+
+    def warm(self, agent_classes: list[type[BaseAgent]], model: str = DEFAULT_MODEL):
+        """Build agents ahead of the first request."""
+        for agent_cls in agent_classes:
+            self.get(agent_cls, model)
+
+    def clear(self):
+        with self._lock:
+            self._agents.clear()
+
+
+agent_registry = AgentRegistry()
+
+
+def get_agent(agent_cls: type[BaseAgent], model: str = DEFAULT_MODEL, cached: bool = True, **options) -> BaseAgent:
+    """Return a ready-to-use agent from the process-wide registry."""
+    return agent_registry.get(agent_cls, model, cached=cached, **options)
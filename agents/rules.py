@@ -0,0 +1,347 @@
+"""Deterministic rule engine that resolves clear-cut invoices without calling the LLM."""
+import re
+import threading
+from typing import Callable, Literal
+
+from pydantic import BaseModel
+
+from agents.models import ProcessResponse
+from agents.catalog import PriceVersion, to_yyyymmdd
+from agents.codes import code_index, repair_item_code
+from agents.descriptions import check_description
+from agents.regions import price_column_for, resolve_state
+from agents.tools import get_catalogs
+
+ITEM_CODE_PATTERN = re.compile(r"\b\d{2}_\d{3,9}_\d{4}_\d_\d{1,2}\b")
+# Something that starts like an item code but did not match in full (e.g. split by PDF extraction)
+PARTIAL_CODE_PATTERN = re.compile(r"\b\d{2}_\d{3,9}_")
+DATE_PATTERN = re.compile(r"\b(\d{1,2}/\d{1,2}/\d{4}|\d{4}-\d{2}-\d{2})\b")
+NUMBER_PATTERN = re.compile(r"\$?\s?(\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)(?![\d/_-])")
+
+
+class ExtractedLineItem(BaseModel):
+    """A line item pulled out of the invoice text."""
+    item_code: str
+    description: str = ""
+    service_date: str | None = None
+    quantity: float | None = None
+    rate: float | None = None
+    amount: float | None = None
+    line: str = ""
+    # The code as printed, when extraction artifacts had to be repaired to read it
+    printed_code: str | None = None
+
+    @property
+    def is_complete(self) -> bool:
+        return None not in (self.quantity, self.rate, self.amount)
+
+
+class RuleResult(BaseModel):
+    """Outcome of a rule that fired on a line item."""
+    rule: str
+    verdict: Literal["fail", "ambiguous"]
+    message: str
+    old_pricing: bool = False
+
+
+class RuleAssessment(BaseModel):
+    """What the rule engine made of an invoice: a verdict, or the findings that left it undecided."""
+    response: ProcessResponse | None = None
+    lines: int = 0
+    # Ambiguous findings; they do not fail the invoice but a verdict of "valid" should account for them
+    concerns: list[str] = []
+
+
+# A rule gets a line item, the invoice's location type and its state (None when unknown)
+Rule = Callable[[ExtractedLineItem, str, str | None], RuleResult | None]
+
+
+def _to_float(value: str) -> float:
+    return float(value.replace(",", ""))
+
+
+def detect_location_type(text: str) -> str:
+    """Guess the location type of an invoice from its text."""
+    lowered = text.lower()
+    if "very remote" in lowered or "very_remote" in lowered:
+        return "very_remote"
+    if "remote" in lowered:
+        return "remote"
+    return "standard"
+
+
+def extract_line_items(text: str) -> tuple[list[ExtractedLineItem], list[str]]:
+    """Extract line items from invoice text.
+
+    Returns the extracted items and the lines that look like line items but could not be
+    parsed (e.g. a split or partial item code), which make the invoice ambiguous.
+    """
+    items = []
+    malformed = []
+    # A dated line without a code is usually a description wrapped onto the next line
+    wrapped = ""
+    for line in text.splitlines():
+        match = ITEM_CODE_PATTERN.search(line)
+        code, printed_code = (match.group(0), None) if match else (None, None)
+        if match is None and (repaired := repair_item_code(line)):
+            # e.g. "01_011_01 07_1_1" or "O1_011_0107_1_1" from PDF extraction
+            code, printed_code, match = repaired
+        if match is None:
+            if PARTIAL_CODE_PATTERN.search(line):
+                malformed.append(line.strip())
+            wrapped = line if DATE_PATTERN.match(line.strip()) else ""
+            continue
+
+        before, after = wrapped + " " + line[:match.start()], line[match.end():]
+        wrapped = ""
+        date = DATE_PATTERN.search(before)
+        numbers = [m for m in NUMBER_PATTERN.finditer(after)]
+        item = ExtractedLineItem(
+            item_code=code,
+            service_date=date.group(0) if date else None,
+            line=line.strip(),
+            printed_code=printed_code,
+        )
+        if len(numbers) >= 3:
+            item.quantity, item.rate, item.amount = (_to_float(m.group(1)) for m in numbers[-3:])
+            description = after[:numbers[-3].start()]
+        else:
+            description = after
+        item.description = " ".join((DATE_PATTERN.sub("", before) + " " + description).split())
+        items.append(item)
+    return items, malformed
+
+
+def extract_invoice_totals(text: str) -> list[float]:
+    """Collect the amounts printed on 'total' lines (sub totals and GST lines excluded)."""
+    totals = []
+    for line in text.splitlines():
+        lowered = line.lower().replace(" ", "")
+        if "total" not in lowered or "subtotal" in lowered or "gst" in lowered:
+            continue
+        totals.extend(_to_float(m.group(1)) for m in NUMBER_PATTERN.finditer(line))
+    return totals
+
+
+# --- Rules -----------------------------------------------------------------
+
+def unknown_code_rule(item: ExtractedLineItem, location_type: str, state: str | None = None) -> RuleResult | None:
+    catalogs = get_catalogs()
+    if catalogs.active.validate_item(item.item_code) or catalogs.inactive.validate_item(item.item_code):
+        return None
+    nearest = code_index(catalogs).suggest(item.item_code, max_distance=1)
+    # A code that had to be repaired, or one digit off a real code charged at that code's exact
+    # price, is more likely an extraction error than an invented code
+    if nearest and (item.printed_code is not None or _charged_at_price_of(item, nearest[0].item_code)):
+        return RuleResult(rule="unknown_code", verdict="ambiguous",
+                          message=f"Item code {item.item_code} is not in the NIDS database but is close to {nearest[0].item_code}.")
+    return RuleResult(rule="unknown_code", verdict="fail",
+                      message=f"Item code {item.item_code} is not found in the NIDS database.")
+
+
+def _charged_at_price_of(item: ExtractedLineItem, item_code: str) -> bool:
+    if item.rate is None:
+        return False
+    catalogs = get_catalogs()
+    source = catalogs.active if item_code in catalogs.active else catalogs.inactive
+    return bool((abs(item.rate - source.price_matrix[source.row_id(item_code)]) < 0.01).any())
+
+
+def repaired_code_rule(item: ExtractedLineItem, location_type: str, state: str | None = None) -> RuleResult | None:
+    # The repair is a best guess; let the agent confirm it against the printed code
+    if item.printed_code is not None:
+        return RuleResult(rule="repaired_code", verdict="ambiguous",
+                          message=f"Item code printed as '{item.printed_code}' was read as {item.item_code}.")
+    return None
+
+
+def old_pricing_rule(item: ExtractedLineItem, location_type: str, state: str | None = None) -> RuleResult | None:
+    catalogs = get_catalogs()
+    if not catalogs.inactive.validate_item(item.item_code):
+        return None
+    version = catalogs.history.lookup(item.item_code, item.service_date)
+    if version is not None and version.source is catalogs.inactive:
+        # Backdated service delivered while the superseded price list was in effect
+        return None
+    day = to_yyyymmdd(item.service_date)
+    if day is not None and day < catalogs.history.versions(item.item_code)[0].start:
+        return RuleResult(rule="old_pricing", verdict="ambiguous",
+                          message=f"Item {item.item_code} was billed for {item.service_date}, before any known NIDS price list.")
+    if catalogs.active.validate_item(item.item_code):
+        message = f"Item {item.item_code} also exists in the inactive pricing database; old pricing may be in use."
+    else:
+        message = f"Item {item.item_code} only exists in the inactive pricing database and is no longer valid."
+    return RuleResult(rule="old_pricing", verdict="fail", message=message, old_pricing=True)
+
+
+def malformed_line_rule(item: ExtractedLineItem, location_type: str, state: str | None = None) -> RuleResult | None:
+    if not item.is_complete:
+        return RuleResult(rule="malformed_line", verdict="ambiguous",
+                          message=f"Could not read quantity, rate and amount for item {item.item_code}.")
+    return None
+
+
+def quotable_item_rule(item: ExtractedLineItem, location_type: str, state: str | None = None) -> RuleResult | None:
+    active = get_catalogs().active
+    if active.validate_item(item.item_code) and active.get_price(item.item_code, price_column_for(location_type, state)) is None:
+        return RuleResult(rule="quotable_item", verdict="ambiguous",
+                          message=f"Item {item.item_code} is a quotable item with no fixed price.")
+    return None
+
+
+def price_mismatch_rule(item: ExtractedLineItem, location_type: str, state: str | None = None) -> RuleResult | None:
+    if item.rate is None:
+        return None
+    catalogs = get_catalogs()
+    if item.service_date is None:
+        # Undated lines are held to the current price list
+        row = catalogs.active.row_id(item.item_code)
+        version = PriceVersion(catalogs.active, row) if row is not None else None
+    else:
+        version = catalogs.history.lookup(item.item_code, item.service_date)
+        if version is None and catalogs.history.versions(item.item_code):
+            return RuleResult(rule="price_mismatch", verdict="ambiguous",
+                              message=f"No NIDS price for item {item.item_code} was in effect on {item.service_date}.")
+    if version is None:
+        return None
+
+    column = price_column_for(location_type, state)
+    expected = version.price(column)
+    if expected is None:
+        return None
+    if abs(item.rate - expected) >= 0.01:
+        # Matching another state's or location's price usually means the location was misread
+        if (abs(item.rate - version.source.price_matrix[version.row]) < 0.01).any():
+            return RuleResult(rule="price_mismatch", verdict="ambiguous",
+                              message=f"Item {item.item_code} matches the NIDS price of a different state or location type.")
+        return RuleResult(rule="price_mismatch", verdict="fail",
+                          message=f"Item {item.item_code} is charged at ${item.rate:.2f} but the NIDS price is "
+                                  f"${expected:.2f} ({column} pricing, price list valid {version.period}).")
+    return None
+
+
+def arithmetic_rule(item: ExtractedLineItem, location_type: str, state: str | None = None) -> RuleResult | None:
+    if not item.is_complete:
+        return None
+    if abs(item.quantity * item.rate - item.amount) > 0.011:
+        return RuleResult(rule="arithmetic", verdict="ambiguous",
+                          message=f"Item {item.item_code}: {item.quantity:g} x ${item.rate:.2f} does not equal ${item.amount:.2f}.")
+    return None
+
+
+def description_rule(item: ExtractedLineItem, location_type: str, state: str | None = None) -> RuleResult | None:
+    catalogs = get_catalogs()
+    if not item.description or not catalogs.active.validate_item(item.item_code):
+        return None
+    check = check_description(catalogs, item.item_code, item.description, k=1)
+    if not check.mismatch:
+        return None
+    column = price_column_for(location_type, state)
+    claimed_price = catalogs.active.get_price(item.item_code, column)
+    best = check.matches[0]
+    best_price = catalogs.active.get_price(best.item_code, column) if best.active else None
+    # Only a description that fits a cheaper item suggests upcoding
+    if claimed_price is None or best_price is None or best_price >= claimed_price - 0.01:
+        return None
+    return RuleResult(rule="description", verdict="ambiguous",
+                      message=f"Item {item.item_code} is described as '{item.description}', which matches "
+                              f"{best.item_code} ({best.name}, ${best_price:.2f}) rather than the billed item.")
+
+
+DEFAULT_RULES: list[Rule] = [
+    unknown_code_rule,
+    repaired_code_rule,
+    old_pricing_rule,
+    malformed_line_rule,
+    quotable_item_rule,
+    price_mismatch_rule,
+    description_rule,
+    arithmetic_rule,
+]
+
+
+# --- Engine ----------------------------------------------------------------
+
+class FastPathStats:
+    """Thread-safe counters for how much traffic the rule engine resolved on its own."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.hits = 0
+
+    def record(self, hit: bool):
+        with self._lock:
+            self.total += 1
+            self.hits += int(hit)
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.total if self.total else 0.0
+
+    def summary(self) -> str:
+        return f"Fast path resolved {self.hits}/{self.total} invoices ({self.hit_rate:.1%})"
+
+
+fast_path_stats = FastPathStats()
+
+
+class RuleEngine:
+    """Evaluates extracted line items against the NIDS catalogs with a configurable set of rules."""
+
+    def __init__(self, rules: list[Rule] | None = None, stats: FastPathStats = fast_path_stats):
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        self.stats = stats
+
+    def evaluate(self, invoice_text: str) -> ProcessResponse | None:
+        """Return a verdict when it is unambiguous, or None to defer to the LLM agent."""
+        response = self.assess(invoice_text).response
+        self.stats.record(response is not None)
+        return response
+
+    def assess(self, invoice_text: str) -> RuleAssessment:
+        """The verdict when it is unambiguous, and otherwise the findings that kept the rules from deciding."""
+        items, malformed = extract_line_items(invoice_text)
+        if not items:
+            return RuleAssessment(concerns=["No line items could be read from the invoice."])
+
+        location_type = detect_location_type(invoice_text)
+        state = resolve_state(invoice_text)
+        failures: list[RuleResult] = []
+        concerns = [f"Line could not be read in full: {line}" for line in malformed]
+        for item in items:
+            for rule in self.rules:
+                result = rule(item, location_type, state)
+                if result is None:
+                    continue
+                if result.verdict == "fail":
+                    failures.append(result)
+                else:
+                    concerns.append(result.message)
+
+        if failures:
+            reason = "Deterministic checks found problems: " + " ".join(f.message for f in failures)
+            return RuleAssessment(lines=len(items), concerns=concerns, response=ProcessResponse(
+                is_valid=False,
+                reason=reason,
+                is_using_old_pricing=any(f.old_pricing for f in failures),
+                confidence=1.0,
+            ))
+        if concerns:
+            return RuleAssessment(lines=len(items), concerns=concerns)
+
+        # Every line checked out; make sure no line item was missed by comparing against the invoice total
+        totals = extract_invoice_totals(invoice_text)
+        line_sum = sum(item.amount for item in items)
+        if totals and not any(abs(total - line_sum) < 0.05 for total in totals):
+            return RuleAssessment(lines=len(items), concerns=[
+                f"The line items add up to ${line_sum:.2f}, which matches none of the invoice totals."])
+
+        codes = ", ".join(item.item_code for item in items)
+        return RuleAssessment(lines=len(items), response=ProcessResponse(
+            is_valid=True,
+            reason=f"All {len(items)} line items ({codes}) exist in the active NIDS database, "
+                   f"match the NIDS {price_column_for(location_type, state)} pricing and use current pricing.",
+            is_using_old_pricing=False,
+            confidence=1.0,
+        ))
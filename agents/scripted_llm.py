@@ -0,0 +1,128 @@
+"""A deterministic, offline stand-in for ChatOpenAI that drives the agents' tool-calling loop.
+
+The scripted model behaves like a well-behaved model would: it reads the line items out of
+the prompt with the rule engine's extractor, calls the verification tools the agent bound
+(one batched verify_line_items call, or the single-item tools), then answers through the
+ProcessResponse tool based on what the tools reported. Latency and token usage are
+configurable, so agent and framework overhead can be measured without network access.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from agents.budget import FAILURE_MARKERS, OLD_PRICING_MARKERS
+from agents.preprocess import count_tokens
+from agents.regions import resolve_state
+from agents.rules import detect_location_type, extract_line_items
+
+RESPONSE_TOOL = "ProcessResponse"
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Tool-calling chat model with a fixed script and configurable latency and token usage."""
+
+    model_name: str = "scripted"
+    # Seconds per call, plus up to `jitter` x latency derived from the request (deterministic)
+    latency: float = 0.0
+    jitter: float = 0.0
+    # Reported input tokens per call; counted from the request when None
+    input_tokens: int | None = None
+    output_tokens: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-chat"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"model_name": self.model_name, "latency": self.latency, "jitter": self.jitter}
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _delay(self, messages: list[BaseMessage]) -> float:
+        if not self.jitter:
+            return self.latency
+        digest = hashlib.sha256("".join(str(m.content) for m in messages).encode()).digest()
+        return self.latency * (1 + self.jitter * digest[0] / 255)
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                  run_manager: CallbackManagerForLLMRun | None = None, **kwargs) -> ChatResult:
+        delay = self._delay(messages)
+        if delay:
+            time.sleep(delay)
+        return self._result(messages, kwargs.get("tools") or [])
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                         run_manager: AsyncCallbackManagerForLLMRun | None = None, **kwargs) -> ChatResult:
+        delay = self._delay(messages)
+        if delay:
+            await asyncio.sleep(delay)
+        return self._result(messages, kwargs.get("tools") or [])
+
+    def _result(self, messages: list[BaseMessage], tools: list[dict]) -> ChatResult:
+        message = respond(messages, [tool["function"]["name"] for tool in tools])
+        input_tokens = self.input_tokens
+        if input_tokens is None:
+            input_tokens = count_tokens("\n".join(str(m.content) for m in messages) + json.dumps(tools))
+        message.usage_metadata = {"input_tokens": input_tokens, "output_tokens": self.output_tokens,
+                                  "total_tokens": input_tokens + self.output_tokens}
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _tool_call(name: str, args: dict, number: int) -> dict:
+    return {"name": name, "args": args, "id": f"call_{number}", "type": "tool_call"}
+
+
+def _answer(tool_names: list[str], tool_outputs: list[str], number: int) -> AIMessage:
+    report = "\n".join(tool_outputs)
+    failures = [line.strip(" -") for line in report.splitlines() if any(marker in line for marker in FAILURE_MARKERS)]
+    verdict = {
+        "is_valid": not failures,
+        "reason": "; ".join(failures[:5]) if failures else "All line items passed the NIDS checks.",
+        "is_using_old_pricing": any(marker in report for marker in OLD_PRICING_MARKERS),
+        # Without tool results there is nothing to base the verdict on
+        "confidence": 0.9 if tool_outputs else 0.4,
+    }
+    if RESPONSE_TOOL in tool_names:
+        return AIMessage(content="", tool_calls=[_tool_call(RESPONSE_TOOL, verdict, number)])
+    return AIMessage(content=json.dumps(verdict))
+
+
+def respond(messages: list[BaseMessage], tool_names: list[str]) -> AIMessage:
+    """The scripted reply to a conversation, given the names of the tools bound to the model."""
+    tool_outputs = [str(m.content) for m in messages if isinstance(m, ToolMessage)]
+    check_tools = [name for name in tool_names if name != RESPONSE_TOOL]
+    if tool_outputs or not check_tools:
+        return _answer(tool_names, tool_outputs, len(messages))
+
+    prompt = next((str(m.content) for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+    # The instructions mention every location type; only the invoice itself counts
+    prompt = prompt.rsplit("Invoice content:", 1)[-1]
+    items, _ = extract_line_items(prompt)
+    if not items:
+        return _answer(tool_names, ["✗ No line items could be read from the invoice."], len(messages))
+    location_type, state = detect_location_type(prompt), resolve_state(prompt)
+    lines = [{"item_code": item.item_code, "price": item.rate, "service_date": item.service_date,
+              "location_type": location_type, "state": state,
+              "description": " ".join(item.description.replace("|", " ").split()).lstrip("0123456789. ") or None}
+             for item in items]
+
+    if "verify_line_items" in check_tools:
+        calls = [("verify_line_items", {"items": lines})]
+    else:
+        calls = []
+        for line in lines:
+            if "check_nids_item_pricing" in check_tools and line["price"] is not None:
+                calls.append(("check_nids_item_pricing", {key: line[key] for key in ("item_code", "price", "location_type", "state")}))
+            if "check_if_using_old_pricing" in check_tools:
+                calls.append(("check_if_using_old_pricing", {"item_code": line["item_code"]}))
+    return AIMessage(content="", tool_calls=[_tool_call(name, args, len(messages) + i) for i, (name, args) in enumerate(calls)])
@@ -0,0 +1,126 @@
+"""Compiled, memory-mapped snapshots of the NIDS catalogs.
+
+Parsing the price CSVs needs pandas and costs every process that loads the catalogs.
+`python -m agents.snapshot build` compiles each CSV once into NumPy arrays plus a JSON
+index. Loading a snapshot memory-maps the arrays read-only, so forked workers share the
+same pages and pandas is never imported for it. A snapshot is keyed by the content hash
+of its CSV; when the CSV changes the snapshot is ignored and the CSV is parsed instead.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from agents.models import NIDSSource, PRICE_COLUMNS, file_version
+
+DEFAULT_SNAPSHOT_DIR = os.getenv("NIDS_SNAPSHOT_DIR", ".cache/catalog")
+# Bump when the layout below changes so old snapshots are rebuilt rather than misread
+SNAPSHOT_FORMAT = 1
+_ARRAYS = ("price_matrix", "quotable", "start_dates", "end_dates")
+
+
+def snapshot_path(csv_path: str, version: str, snapshot_dir: str = DEFAULT_SNAPSHOT_DIR) -> Path:
+    return Path(snapshot_dir) / f"{Path(csv_path).stem}-{version}-v{SNAPSHOT_FORMAT}"
+
+
+def write_snapshot(source: NIDSSource, csv_path: str, snapshot_dir: str = DEFAULT_SNAPSHOT_DIR) -> Path:
+    """Write a catalog's arrays and index; built in a temporary directory and renamed into place."""
+    target = snapshot_path(csv_path, source.version, snapshot_dir)
+    if target.exists():
+        return target
+    Path(snapshot_dir).mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(dir=snapshot_dir, prefix=".build-"))
+    try:
+        for name in _ARRAYS:
+            np.save(tmp / f"{name}.npy", np.ascontiguousarray(getattr(source, name)))
+        index = {
+            "format": SNAPSHOT_FORMAT,
+            "version": source.version,
+            "source": str(csv_path),
+            "price_columns": list(PRICE_COLUMNS),
+            "codes": source.codes,
+            "names": source.names,
+            "units": source.units,
+        }
+        (tmp / "index.json").write_text(json.dumps(index), encoding="utf-8")
+        os.rename(tmp, target)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        # Another process finishing the same snapshot first is fine
+        if not target.exists():
+            raise
+    return target
+
+
+def read_snapshot(path: Path) -> NIDSSource:
+    """Load a snapshot with its arrays memory-mapped read-only."""
+    index = json.loads((path / "index.json").read_text(encoding="utf-8"))
+    if index["format"] != SNAPSHOT_FORMAT or index["price_columns"] != list(PRICE_COLUMNS):
+        raise ValueError(f"Snapshot {path} has an unsupported layout")
+    arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in _ARRAYS}
+    return NIDSSource.from_arrays(index["version"], index["codes"], index["names"], index["units"], **arrays)
+
+
+def load_catalog(csv_path: str, snapshot_dir: str = DEFAULT_SNAPSHOT_DIR, write: bool = True) -> NIDSSource:
+    """Load a catalog from its snapshot when one matches the CSV, otherwise parse the CSV.
+
+    After a CSV parse the snapshot is written for next time, unless `write` is False or
+    the snapshot directory is not writable.
+    """
+    path = snapshot_path(csv_path, file_version(csv_path), snapshot_dir)
+    if path.exists():
+        try:
+            return read_snapshot(path)
+        except (OSError, ValueError, KeyError):
+            pass  # Damaged snapshot: fall back to the CSV
+    source = NIDSSource(csv_path)
+    if write:
+        try:
+            write_snapshot(source, csv_path, snapshot_dir)
+        except OSError:
+            pass  # e.g. a read-only filesystem; the CSV still works, just slower
+    return source
+
+
+def prune_snapshots(csv_path: str, snapshot_dir: str = DEFAULT_SNAPSHOT_DIR) -> list[Path]:
+    """Remove snapshots of a CSV other than the one matching its current contents."""
+    current = snapshot_path(csv_path, file_version(csv_path), snapshot_dir)
+    removed = []
+    for path in Path(snapshot_dir).glob(f"{Path(csv_path).stem}-*"):
+        if path != current and path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path)
+    return removed
+
+
+def build(data_dir: str = "data", snapshot_dir: str = DEFAULT_SNAPSHOT_DIR) -> list[Path]:
+    """Compile every CSV in the data directory, dropping snapshots of older versions."""
+    built = []
+    for csv_path in sorted(Path(data_dir).glob("*.csv")):
+        start = time.perf_counter()
+        source = NIDSSource(str(csv_path))
+        path = write_snapshot(source, str(csv_path), snapshot_dir)
+        prune_snapshots(str(csv_path), snapshot_dir)
+        print(f"{csv_path} -> {path} ({len(source)} items, {time.perf_counter() - start:.3f}s)")
+        built.append(path)
+    return built
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Compile the NIDS price CSVs into memory-mapped snapshots.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build_parser = subcommands.add_parser("build", help="Compile every CSV in the data directory")
+    build_parser.add_argument("--data-dir", default="data")
+    build_parser.add_argument("--snapshot-dir", default=DEFAULT_SNAPSHOT_DIR)
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        build(args.data_dir, args.snapshot_dir)
+
+
+if __name__ == "__main__":
+    main()
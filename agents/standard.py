@@ -1,11 +1,14 @@
-import os
-
 from langchain.agents import create_agent
 from langchain.agents.structured_output import ToolStrategy
-from langchain_openai import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
 
+from agents.budget import Budget, BudgetExceededError, BudgetMiddleware, partial_response, run_deadline
 from agents.models import BaseAgent, ProcessResponse
-from agents.tools import check_nids_item_exists, check_nids_item_pricing, check_if_using_old_pricing
+from agents.preprocess import prepare_invoice
+from agents.registry import make_llm
+from agents.rules import RuleEngine
+from agents.tracing import stage, trace_invoice, tracing_config
+from agents.tools import use_catalogs, check_nids_item_exists, check_nids_item_pricing, check_nids_item_pricing_on_date, check_if_using_old_pricing, check_description_matches_code, suggest_item_codes, verify_line_items
 
 system_prompt = """
 You are an expert NDIS (National Disability Insurance Scheme) fraud detection agent.
@@ -15,14 +18,19 @@ Your role is to analyze invoice text line-by-line, focusing on each item in the
 For each invoice, perform the following checks:
 1. **Item Code Validation**: Identify all line items, including their *item names* and *line item codes* (e.g., 01_020_0120_1_1).
    - Use the check_nids_item_exists tool to verify each code exists in the active NIDS database.
+   - If a code is not found or looks mangled by PDF extraction (spaces inside it, letters like O or l in place of digits), use suggest_item_codes to find the code that was meant before treating it as fraudulent.
    
 2. **Pricing Validation**: For each line item with a price, verify the pricing is correct.
    - Extract the price per unit/hour from the invoice
    - Determine the location type: "standard" (default), "remote", or "very_remote" based on invoice context
+   - Determine the participant's state (ACT, NSW, NT, QLD, SA, TAS, VIC, WA) from the service location or participant address, not the NDIA or plan manager address; standard prices differ by state
    - Use the check_nids_item_pricing tool to validate the price matches NIDS pricing
+   - If the line item shows a service date, use check_nids_item_pricing_on_date instead so the price is compared with the price list in effect on that date
    
 3. **Old Pricing Detection**: Check if the invoice is using outdated pricing.
    - Use the check_if_using_old_pricing tool to verify items are not using inactive/outdated pricing
+
+   **Description Check**: Use check_description_matches_code to confirm each line's description fits its item code; a pricier code billed for a different service is fraudulent.
    
 4. **Final Assessment**: Based on all checks, determine if the invoice is valid.
    - If all items exist, prices match, and pricing is current → mark as valid
@@ -32,41 +40,129 @@ Return your final answer as a structured JSON:
 {
   "is_valid": true or false,
   "reason": "A detailed explanation referencing specific item codes, pricing discrepancies, and old pricing issues found.",
-  "is_using_old_pricing": true or false (set to true if any item uses old/inactive pricing)
+  "is_using_old_pricing": true or false (set to true if any item uses old/inactive pricing),
+  "confidence": a number from 0 to 1 for how sure you are of the verdict (1 when every line item was verified by the tools)
 }
 
 Be thorough in your analysis. Check ALL items before making a final determination.
 """
 
+batch_system_prompt = """
+You are an expert NDIS (National Disability Insurance Scheme) fraud detection agent.
+
+Your role is to analyze invoice text, extract every line item, and verify its legitimacy using the official NIDS source data.
+
+For each invoice:
+1. **Extract Line Items**: Identify all line items, including their *line item codes* (e.g., 01_020_0120_1_1), the price per unit/hour and the service date if shown.
+   - Determine the location type: "standard" (default), "remote", or "very_remote" based on invoice context
+   - Determine the participant's state (ACT, NSW, NT, QLD, SA, TAS, VIC, WA) from the service location or participant address, not the NDIA or plan manager address
+
+2. **Verify in One Call**: Call the verify_line_items tool ONCE with ALL line items.
+   - It checks that each code exists in the active NIDS database, that the price matches NIDS pricing, whether old/inactive pricing is used, and that the description fits the code
+   - Pass each item's description so a pricier code billed for a different service is caught
+   - If a code is not found or looks mangled by PDF extraction, call suggest_item_codes to find the code that was meant before treating it as fraudulent
+   - Pass each item's state so standard prices are checked against that state's price column
+   - Pass each item's service_date so backdated services are compared with the price list in effect on that date
+
+3. **Final Assessment**: Based on the verdicts, determine if the invoice is valid.
+   - If all items exist, prices match, and pricing is current → mark as valid
+   - If any item code is missing, invalid, prices don't match, or old pricing is used → mark as fraudulent
+
+Return your final answer as a structured JSON:
+{
+  "is_valid": true or false,
+  "reason": "A detailed explanation referencing specific item codes, pricing discrepancies, and old pricing issues found.",
+  "is_using_old_pricing": true or false (set to true if any item uses old/inactive pricing),
+  "confidence": a number from 0 to 1 for how sure you are of the verdict (1 when every line item was verified by the tools)
+}
+
+Be thorough in your analysis. Include ALL items in the verify_line_items call before making a final determination.
+"""
+
 class StandardAgent(BaseAgent):
-    def __init__(self, model: str):
+    prompt_version = "7"
+
+    def __init__(self, model: str, batch_tools: bool = True, fast_path: bool = True, compact_prompt: bool = True,
+                 llm: BaseChatModel | None = None, budget: Budget | None = None):
         self.model = model
-        self.llm = ChatOpenAI(model=self.model, api_key=os.getenv("OPENAI_API_KEY"))
-        self.tools = [check_nids_item_exists, check_nids_item_pricing, check_if_using_old_pricing]
+        self.batch_tools = batch_tools
+        # Deadline, model turn and token limits for each analysis, and hedging of slow model calls
+        self.budget = budget if budget is not None else Budget()
+        # Send the extracted facts and line-item table instead of the raw invoice text
+        self.compact_prompt = compact_prompt
+        # Clear-cut invoices are resolved by deterministic rules before the LLM is involved
+        self.rule_engine = RuleEngine() if fast_path else None
+        self.prompt_version = "-".join([StandardAgent.prompt_version, "batch" if batch_tools else "single", "fast" if fast_path else "llm",
+                                        "compact" if compact_prompt else "raw"])
+        # A chat model can be injected, e.g. a scripted one for offline benchmarks and tests
+        self.llm = llm if llm is not None else make_llm(self.model)
+        if batch_tools:
+            self.tools = [verify_line_items, suggest_item_codes]
+        else:
+            self.tools = [check_nids_item_exists, check_nids_item_pricing, check_nids_item_pricing_on_date, check_if_using_old_pricing,
+                          check_description_matches_code, suggest_item_codes]
 
         self.agent = create_agent(
             self.llm,
             tools=self.tools,
             response_format=ToolStrategy(ProcessResponse),
-            system_prompt=system_prompt
+            system_prompt=batch_system_prompt if batch_tools else system_prompt,
+            middleware=[BudgetMiddleware(self.budget)],
         )
 
-    def process(self, invoice_text: str) -> ProcessResponse:
-        """Process the invoice by validating each line item, its pricing, and checking for old pricing."""
-        result = self.agent.invoke({
-            "messages": [
-                {
-                    "role": "user",
-                    "content": f"""
+    def _instructions(self) -> str:
+        if self.batch_tools:
+            return """
+                    Analyze this invoice thoroughly:
+                    1. Extract every line item with its item code, price per unit/hour, service_date, location_type (standard, remote or very_remote), state and description
+                    2. Verify all of them at once with a single verify_line_items call
+                    """
+        return """
                     Analyze this invoice thoroughly. For each item:
                     1. Check if the item code exists in NIDS using check_nids_item_exists
                     2. Validate the pricing using check_nids_item_pricing (specify location_type if remote/very_remote)
                     3. Check if old pricing is being used with check_if_using_old_pricing
-                    
+                    """
+
+    def _messages(self, invoice_text: str) -> dict:
+        if self.compact_prompt:
+            with stage("prompt"):
+                prepared = prepare_invoice(invoice_text, self.model)
+            if prepared.compact:
+                invoice_text = f"(Parsed from the invoice; use these values as given.)\n{prepared.text}"
+        return {
+            "messages": [
+                {
+                    "role": "user",
+                    "content": f"""{self._instructions()}
                     Invoice content:
                     {invoice_text}
                     """,
                 }
             ]
-        })
-        return result["structured_response"]
\ No newline at end of file
+        }
+
+    def process(self, invoice_text: str) -> ProcessResponse:
+        """Process the invoice by validating each line item, its pricing, and checking for old pricing."""
+        # Every check of this invoice uses the same catalogs, even if they are reloaded meanwhile
+        with trace_invoice(type(self).__name__), use_catalogs() as catalogs, run_deadline(self.budget.deadline_seconds):
+            with stage("rules"):
+                response = self.rule_engine.evaluate(invoice_text) if self.rule_engine is not None else None
+            if response is None:
+                try:
+                    response = self.agent.invoke(self._messages(invoice_text), config=tracing_config())["structured_response"]
+                except BudgetExceededError as e:
+                    response = partial_response(e.messages, e.reason)
+        return response.model_copy(update={"catalog_version": catalogs.version})
+
+    async def aprocess(self, invoice_text: str) -> ProcessResponse:
+        """Async variant of process, using the agent's async client."""
+        with trace_invoice(type(self).__name__), use_catalogs() as catalogs, run_deadline(self.budget.deadline_seconds):
+            with stage("rules"):
+                response = self.rule_engine.evaluate(invoice_text) if self.rule_engine is not None else None
+            if response is None:
+                try:
+                    response = (await self.agent.ainvoke(self._messages(invoice_text), config=tracing_config()))["structured_response"]
+                except BudgetExceededError as e:
+                    response = partial_response(e.messages, e.reason)
+        return response.model_copy(update={"catalog_version": catalogs.version})
@@ -0,0 +1,294 @@
+"""Synthetic NDIS invoices with labelled fraud, for load and accuracy testing at scale.
+
+Invoices are built from items sampled out of the NIDS catalogs and priced for the
+participant's state and location type, in the same layout as the hand-written test
+invoices. A share of them get one or two injected fraud patterns:
+
+- unknown_code: a line bills a code that is in neither catalog (and not one typo away from one)
+- inflated_rate: a line is charged above the NIDS price
+- inactive_item: a line bills an item whose price list ended before the service date
+- arithmetic_error: a line amount is not quantity x rate
+- wrong_location_tier: a standard-location invoice is charged remote or very remote rates
+
+Invoice i only depends on (seed, i), so corpora are reproducible and can be generated in
+pieces. `write_corpus` streams invoices to disk (text, optionally PDF) together with a
+labels manifest, and a plain path manifest that batch.py accepts:
+    python -m agents.synthetic generate --count 5000 --out data/synthetic --pdf
+"""
+import argparse
+import json
+import random
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+from pydantic import BaseModel
+
+from agents.catalog import Catalogs
+from agents.codes import code_index
+from agents.models import PRICE_COLUMNS
+from agents.regions import price_column_for
+from agents.tools import get_catalogs
+
+FRAUD_PATTERNS = ("unknown_code", "inflated_rate", "inactive_item", "arithmetic_error", "wrong_location_tier")
+LOCATION_TYPES = ("standard", "remote", "very_remote")
+# Standard-location suburbs, and remote / very remote towns, with their postcodes
+SUBURBS = {"ACT": ("Belconnen", "2617"), "NSW": ("Parramatta", "2150"), "NT": ("Darwin", "0800"),
+           "QLD": ("Toowoomba", "4350"), "SA": ("Adelaide", "5000"), "TAS": ("Hobart", "7000"),
+           "VIC": ("Geelong", "3220"), "WA": ("Fremantle", "6160")}
+REMOTE_TOWNS = {"NSW": ("Bourke", "2840"), "NT": ("Katherine", "0850"), "QLD": ("Longreach", "4730"),
+                "SA": ("Port Augusta", "5700"), "TAS": ("Queenstown", "7467"), "WA": ("Broome", "6725")}
+VERY_REMOTE_TOWNS = {"NT": ("Yuendumu", "0872"), "QLD": ("Birdsville", "4482"), "SA": ("Oodnadatta", "5734"),
+                     "WA": ("Halls Creek", "6770")}
+PROVIDERS = ("Caring Hands Support Services", "Outback Care Services Pty Ltd", "Bright Path Disability Care",
+             "Harbour Community Supports", "Evergreen Allied Health", "Sparkling Home Services")
+FIRST_NAMES = ("Sarah", "James", "Priya", "Liam", "Mei", "Noah", "Aisha", "Oliver", "Grace", "Ethan")
+LAST_NAMES = ("Mitchell", "Cooper", "Nguyen", "Singh", "Walker", "Brown", "Kelly", "Wilson", "Taylor", "Lee")
+DEFAULT_PERIOD = (date(2025, 10, 1), date(2025, 12, 31))
+
+
+class SyntheticLine(BaseModel):
+    """One line item as printed on a synthetic invoice."""
+    service_date: str
+    item_code: str
+    description: str
+    quantity: float
+    rate: float
+    amount: float
+    fraud: str | None = None
+
+
+class SyntheticInvoice(BaseModel):
+    """A generated invoice with its labels."""
+    invoice_id: str
+    text: str
+    is_valid: bool
+    fraud_patterns: list[str]
+    state: str
+    location_type: str
+    lines: list[SyntheticLine]
+    total: float
+
+    def label(self) -> dict:
+        return {
+            "invoice_id": self.invoice_id,
+            "is_valid": self.is_valid,
+            "fraud_patterns": self.fraud_patterns,
+            "fraud_lines": [i for i, line in enumerate(self.lines) if line.fraud],
+            "state": self.state,
+            "location_type": self.location_type,
+            "lines": len(self.lines),
+            "total": self.total,
+        }
+
+
+def _yyyymmdd(day: date) -> int:
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+class InvoiceGenerator:
+    """Samples realistic invoices from the catalogs and injects labelled fraud."""
+
+    def __init__(self, catalogs: Catalogs | None = None, seed: int = 0, fraud_rate: float = 0.3,
+                 patterns: tuple[str, ...] = FRAUD_PATTERNS, period: tuple[date, date] = DEFAULT_PERIOD,
+                 max_lines: int = 8):
+        unknown = set(patterns) - set(FRAUD_PATTERNS)
+        if unknown:
+            raise ValueError(f"Unknown fraud patterns: {', '.join(sorted(unknown))}")
+        self.catalogs = catalogs if catalogs is not None else get_catalogs()
+        self.seed = seed
+        self.fraud_rate = fraud_rate
+        self.patterns = tuple(patterns)
+        self.period = period
+        self.max_lines = max_lines
+
+        active = self.catalogs.active
+        start, end = _yyyymmdd(period[0]), _yyyymmdd(period[1])
+        in_effect = (active.start_dates <= start) & (active.end_dates >= end)
+        standard = active.price_matrix[:, PRICE_COLUMNS.index("ACT")]
+        # Billed per hour or per unit with a price in every column, so any state and location can be priced;
+        # $1 "per dollar" consumables are left out as they make for implausible invoices
+        with np.errstate(invalid="ignore"):
+            billable = in_effect & ~active.quotable & ~np.isnan(active.price_matrix).any(axis=1) \
+                & np.isin(np.array(active.units, dtype=object), ["H", "E"]) & (standard >= 10)
+        self._rows = np.flatnonzero(billable)
+        self._remote_rows = np.flatnonzero(billable & (active.price_matrix[:, PRICE_COLUMNS.index("Remote")] > standard))
+        inactive = self.catalogs.inactive
+        self._expired_inactive = [code for row, code in enumerate(inactive.codes)
+                                  if code not in active and inactive.end_dates[row] < start]
+        if len(self._rows) == 0:
+            raise ValueError("No billable catalog items are in effect for the whole period")
+
+    def _unknown_code(self, rng: random.Random) -> str:
+        index = code_index(self.catalogs)
+        while True:
+            code = f"{rng.randint(20, 98):02d}_{rng.randint(100, 999)}_{rng.randint(1000, 9999)}_{rng.randint(1, 9)}_{rng.randint(1, 9)}"
+            if code not in self.catalogs.active and code not in self.catalogs.inactive and not index.suggest(code, max_distance=1):
+                return code
+
+    def _line(self, rng: random.Random, row: int, column: str, service_date: date) -> SyntheticLine:
+        active = self.catalogs.active
+        rate = float(active.price_matrix[row, PRICE_COLUMNS.index(column)])
+        quantity = rng.choice([1.0, 1.5, 2.0, 2.5, 3.0, 4.0, 6.0, 8.0]) if active.units[row] == "H" else float(rng.randint(1, 3))
+        return SyntheticLine(service_date=service_date.strftime("%d/%m/%Y"), item_code=active.codes[row],
+                             description=active.names[row], quantity=quantity, rate=rate, amount=round(quantity * rate, 2))
+
+    def _inject(self, rng: random.Random, pattern: str, lines: list[SyntheticLine], location_type: str, state: str) -> bool:
+        """Apply a fraud pattern to one line; False when it cannot apply to this invoice."""
+        clean = [i for i, line in enumerate(lines) if line.fraud is None]
+        if not clean:
+            return False
+        i = rng.choice(clean)
+        line = lines[i]
+        if pattern == "unknown_code":
+            line.item_code = self._unknown_code(rng)
+        elif pattern == "inflated_rate":
+            line.rate = round(line.rate * rng.uniform(1.08, 1.6), 2)
+            line.amount = round(line.quantity * line.rate, 2)
+        elif pattern == "inactive_item":
+            if not self._expired_inactive:
+                return False
+            inactive = self.catalogs.inactive
+            line.item_code = rng.choice(self._expired_inactive)
+            line.description = inactive.names[inactive.row_id(line.item_code)]
+            line.rate = round(rng.uniform(40, 400), 2)
+            line.amount = round(line.quantity * line.rate, 2)
+        elif pattern == "arithmetic_error":
+            line.amount = round(line.amount + rng.choice([line.rate, 10.0, 25.5, 100.0]), 2)
+        elif pattern == "wrong_location_tier":
+            if location_type != "standard" or len(self._remote_rows) == 0:
+                return False
+            row = int(rng.choice(self._remote_rows))
+            column = rng.choice(["Remote", "Very Remote"])
+            replacement = self._line(rng, row, column, date.fromisoformat("-".join(reversed(line.service_date.split("/")))))
+            line.item_code, line.description, line.rate, line.amount = (replacement.item_code, replacement.description,
+                                                                        replacement.rate, replacement.amount)
+        line.fraud = pattern
+        return True
+
+    def invoice(self, number: int) -> SyntheticInvoice:
+        """Invoice `number` of this generator's corpus."""
+        rng = random.Random(f"{self.seed}-{number}")
+        fraudulent = rng.random() < self.fraud_rate
+        wanted = []
+        if fraudulent and self.patterns:
+            wanted = [rng.choice(self.patterns)]
+            others = [pattern for pattern in self.patterns if pattern != wanted[0]]
+            if others and rng.random() < 0.2:
+                wanted.append(rng.choice(others))
+        if "wrong_location_tier" in wanted:
+            location_type = "standard"
+        else:
+            location_type = rng.choices(LOCATION_TYPES, weights=[0.8, 0.12, 0.08])[0]
+        towns = {"standard": SUBURBS, "remote": REMOTE_TOWNS, "very_remote": VERY_REMOTE_TOWNS}[location_type]
+        state = rng.choice(sorted(towns))
+        town, postcode = towns[state]
+        column = price_column_for(location_type, state)
+
+        days = (self.period[1] - self.period[0]).days
+        first = self.period[0] + timedelta(days=rng.randint(0, max(days - 14, 0)))
+        lines = [self._line(rng, int(rng.choice(self._rows)), column, first + timedelta(days=rng.randint(0, min(days, 14))))
+                 for _ in range(rng.randint(1, self.max_lines))]
+        lines.sort(key=lambda line: line.service_date[6:] + line.service_date[3:5] + line.service_date[:2])
+        applied = [pattern for pattern in wanted if self._inject(rng, pattern, lines, location_type, state)]
+
+        invoice_id = f"SYN-{self.seed}-{number:07d}"
+        total = round(sum(line.amount for line in lines), 2)
+        participant = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        issued = max(date.fromisoformat("-".join(reversed(line.service_date.split("/")))) for line in lines) + timedelta(days=rng.randint(1, 5))
+        header = [
+            "NDIS Service Provider Invoice",
+            f"Invoice Number: {invoice_id}",
+            f"Date: {issued.day} {issued.strftime('%B %Y')}",
+            f"Provider: {rng.choice(PROVIDERS)}",
+            f"ABN: {rng.randint(10, 99)} {rng.randint(100, 999)} {rng.randint(100, 999)} {rng.randint(100, 999)}",
+            "",
+            f"Participant Name: {participant}",
+            f"NDIS Number: 43{rng.randint(1000000, 9999999)}",
+            f"Participant Address: {rng.randint(1, 200)} Main Street, {town} {state} {postcode}",
+        ]
+        if location_type != "standard":
+            area = "Very Remote Area" if location_type == "very_remote" else "Remote Area"
+            header += ["", f"Service Location: {area} ({town}, {state})"]
+        body = ["", "Service Details:",
+                f"{'Date':<12}{'Item Code':<24}{'Description':<52}{'Hours':<8}{'Rate':<11}Amount"]
+        for line in lines:
+            body.append(f"{line.service_date:<12}{line.item_code:<24}{line.description[:50]:<52}"
+                        f"{line.quantity:<8.1f}{'$' + format(line.rate, '.2f'):<11}${line.amount:.2f}")
+        footer = ["", f"Total: ${total:.2f}", "GST: $0.00 (GST Free)", f"Total Amount Due: ${total:.2f}"]
+        return SyntheticInvoice(invoice_id=invoice_id, text="\n".join(header + body + footer) + "\n", is_valid=not applied,
+                                fraud_patterns=applied, state=state, location_type=location_type, lines=lines, total=total)
+
+    def generate(self, count: int, start: int = 0):
+        """Yield invoices start .. start + count - 1."""
+        for number in range(start, start + count):
+            yield self.invoice(number)
+
+
+def write_corpus(out_dir: str, count: int, seed: int = 0, fraud_rate: float = 0.3, pdf: bool = False,
+                 patterns: tuple[str, ...] = FRAUD_PATTERNS, start: int = 0, per_directory: int = 1000) -> dict:
+    """Stream invoices to `out_dir`/invoices/<shard>/, appending labels.jsonl and manifest.txt as they are written.
+
+    Returns a summary with the number of invoices and how many carry each fraud pattern.
+    """
+    from helpers.pdf_writer import text_to_pdf
+
+    root = Path(out_dir)
+    generator = InvoiceGenerator(seed=seed, fraud_rate=fraud_rate, patterns=patterns)
+    counts = {pattern: 0 for pattern in FRAUD_PATTERNS}
+    fraudulent = 0
+    started = time.perf_counter()
+    mode = "a" if start else "w"
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / "labels.jsonl", mode, encoding="utf-8") as labels, open(root / "manifest.txt", mode, encoding="utf-8") as manifest:
+        for invoice in generator.generate(count, start):
+            number = int(invoice.invoice_id.rsplit("-", 1)[1])
+            shard = root / "invoices" / f"{number // per_directory:04d}"
+            shard.mkdir(parents=True, exist_ok=True)
+            path = shard / f"{invoice.invoice_id}.{'pdf' if pdf else 'txt'}"
+            if pdf:
+                path.write_bytes(text_to_pdf(invoice.text))
+            else:
+                path.write_text(invoice.text, encoding="utf-8")
+            relative = str(path.relative_to(root))
+            labels.write(json.dumps({"file": relative, **invoice.label()}) + "\n")
+            manifest.write(relative + "\n")
+            fraudulent += not invoice.is_valid
+            for pattern in set(invoice.fraud_patterns):
+                counts[pattern] += 1
+    seconds = time.perf_counter() - started
+    return {"invoices": count, "fraudulent": fraudulent, "patterns": counts, "seconds": seconds,
+            "invoices_per_second": count / seconds if seconds else float("inf")}
+
+
+def read_labels(out_dir: str) -> list[dict]:
+    """The labels manifest of a corpus, with absolute file paths."""
+    root = Path(out_dir)
+    with open(root / "labels.jsonl", encoding="utf-8") as f:
+        return [{**record, "file": str(root / record["file"])} for record in map(json.loads, f)]
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Generate synthetic NDIS invoices with labelled fraud.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    generate_parser = subcommands.add_parser("generate", help="Write a corpus of invoices and its labels")
+    generate_parser.add_argument("--count", type=int, default=1000)
+    generate_parser.add_argument("--out", default="data/synthetic")
+    generate_parser.add_argument("--seed", type=int, default=0)
+    generate_parser.add_argument("--fraud-rate", type=float, default=0.3)
+    generate_parser.add_argument("--patterns", default=",".join(FRAUD_PATTERNS), help="Comma-separated fraud patterns to inject")
+    generate_parser.add_argument("--start", type=int, default=0, help="First invoice number; appends to an existing corpus when > 0")
+    generate_parser.add_argument("--pdf", action="store_true", help="Write PDFs instead of text files")
+    args = parser.parse_args(argv)
+    if args.command == "generate":
+        summary = write_corpus(args.out, args.count, args.seed, args.fraud_rate, args.pdf,
+                               tuple(p for p in args.patterns.split(",") if p), args.start)
+        print(f"{summary['invoices']} invoices ({summary['fraudulent']} fraudulent) written to {args.out} "
+              f"in {summary['seconds']:.1f}s ({summary['invoices_per_second']:,.0f}/s)")
+        for pattern, count in summary["patterns"].items():
+            print(f"  {pattern}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,74 +1,118 @@
 from langchain.tools import tool
-from .models import NIDSSource
-import pandas as pd
+from pydantic import BaseModel, Field
+from .catalog import Catalogs, format_yyyymmdd, to_yyyymmdd
+from .catalog_manager import CatalogManager, pin_catalogs, pinned
+from .codes import code_index, normalize_item_code
+from .descriptions import check_description
+from .regions import price_column_for
 
-nids_source = NIDSSource("data/nids_source_active.csv")
-nids_inactive_source = NIDSSource("data/nids_source_inactive.csv")
+ACTIVE_CSV = "data/nids_source_active.csv"
+INACTIVE_CSV = "data/nids_source_inactive.csv"
 
-@tool
-def check_nids_item_exists(item_code: str) -> str:
-    """Check if the given item code exists in the NIDS database."""
-    if nids_source.validate_item(item_code):
+catalog_manager = CatalogManager(ACTIVE_CSV, INACTIVE_CSV)
+
+
+def get_catalogs() -> Catalogs:
+    """Return the NIDS catalogs pinned by the current request, else the latest loaded ones."""
+    return pinned() or catalog_manager.current
+
+
+def use_catalogs():
+    """Pin the current catalogs for one request (a context manager yielding them)."""
+    return pin_catalogs(catalog_manager)
+
+
+def __getattr__(name: str):
+    # The catalogs used to be loaded into these module globals at import time
+    if name == "nids_source":
+        return get_catalogs().active
+    if name == "nids_inactive_source":
+        return get_catalogs().inactive
+    if name == "price_history":
+        return get_catalogs().history
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def catalog_version() -> str:
+    """Identify the loaded catalogs, so results computed against other data can be told apart."""
+    return get_catalogs().version
+
+
+def _superseded_version_in_effect(catalogs: Catalogs, item_code: str, service_date: str | None):
+    """The inactive price version in effect on the service date, or None."""
+    if not service_date or not catalogs.inactive.validate_item(item_code):
+        return None
+    version = catalogs.history.lookup(item_code, service_date)
+    return version if version is not None and version.source is catalogs.inactive else None
+
+
+def item_exists_result(item_code: str, service_date: str | None = None) -> str:
+    """Describe whether an item code exists in the active NIDS database."""
+    catalogs = get_catalogs()
+    if catalogs.active.validate_item(item_code):
         return f"Item code {item_code} is valid according to NIDS."
-    else:
-        return f"Item code {item_code} is NOT found in the NIDS database and may be fraudulent."
+    # The code may only be mangled by PDF extraction (spaces, look-alike letters)
+    normalized = normalize_item_code(item_code)
+    if normalized != item_code and catalogs.active.validate_item(normalized):
+        return f"Item code {item_code} reads as {normalized} once extraction artifacts are removed, which is valid according to NIDS."
+    if _superseded_version_in_effect(catalogs, item_code, service_date) is not None:
+        return f"Item code {item_code} has since been retired, but was valid according to NIDS on {service_date}."
+    if catalogs.inactive.validate_item(item_code) or catalogs.inactive.validate_item(normalized):
+        return (f"Item code {item_code} is NOT found in the active NIDS database. It is a retired code that only exists "
+                f"in the inactive database, so it is billed at OUTDATED pricing.")
+    # An exact match is the code itself, not a misreading of another one
+    suggestions = [s for s in code_index(catalogs).suggest(item_code, max_distance=1, limit=3) if s.distance > 0]
+    if suggestions:
+        closest = ", ".join(s.item_code for s in suggestions)
+        return (f"Item code {item_code} is NOT found in the NIDS database. It is one character away from {closest}; "
+                f"check whether the invoice shows a mis-read code before treating it as fraudulent.")
+    return f"Item code {item_code} is NOT found in the NIDS database and may be fraudulent."
 
-@tool
-def check_nids_item_pricing(item_code: str, price: float, location_type: str = "standard") -> str:
-    """
-    Check if the given item code has a valid pricing in the NIDS database.
 
-    Args:
-        item_code: The NIDS item code to validate
-        price: The price to validate (per hour or per unit)
-        location_type: Type of location - "standard" (uses state pricing), "remote", or "very_remote"
+def suggest_item_codes_result(item_code: str, limit: int = 5) -> str:
+    """Describe the catalog codes closest to a possibly mangled item code."""
+    suggestions = code_index(get_catalogs()).suggest(item_code, max_distance=2, limit=limit)
+    if not suggestions:
+        return f"No NIDS item codes are within two characters of {item_code}."
+    if suggestions[0].distance == 0:
+        s = suggestions[0]
+        return f"{item_code} reads as {s.item_code} ({s.name}, {'active' if s.active else 'inactive only'})."
+    lines = [f"Closest NIDS item codes to {item_code}:"]
+    for s in suggestions:
+        lines.append(f"  - {s.item_code} ({s.name}; {'active' if s.active else 'inactive only'}; "
+                     f"{s.distance} character{'s' if s.distance > 1 else ''} different)")
+    return "\n".join(lines)
 
-    Returns:
-        String describing if the pricing matches, and if old pricing is being used
-    """
-    # Check if item exists in active source
-    if not nids_source.validate_item(item_code):
-        return f"Item code {item_code} not found in active NIDS database. Cannot validate pricing."
 
-    # Get the item row from active source
-    item_row = nids_source.df[nids_source.df['Support Item Number'] == item_code].iloc[0]
+def _location_label(location_type: str, state: str | None) -> str:
+    column = price_column_for(location_type, state)
+    return f"{location_type} location, {column} pricing" if column not in ("Remote", "Very Remote") else f"{location_type} location"
 
-    # Determine which price column to check
-    if location_type.lower() == "remote":
-        price_column = "Remote"
-    elif location_type.lower() == "very_remote":
-        price_column = "Very Remote"
-    else:
-        # For standard, we'll check any state column (they're typically the same)
-        # Using ACT as default state column
-        price_column = "ACT"
 
-    # Get the expected price
-    expected_price_str = str(item_row[price_column]).strip()
+def item_pricing_result(item_code: str, price: float, location_type: str = "standard", state: str | None = None) -> str:
+    """Describe whether a price matches the NIDS price of an item for a location type and state."""
+    catalogs = get_catalogs()
+    # Check if item exists in active source
+    if not catalogs.active.validate_item(item_code):
+        return f"Item code {item_code} not found in active NIDS database. Cannot validate pricing."
 
-    # Handle empty or NA prices (quotable items)
-    if expected_price_str == '' or expected_price_str == 'nan' or pd.isna(item_row[price_column]):
+    # Get the expected price (None for quotable items with no fixed price)
+    expected_price = catalogs.active.get_price(item_code, price_column_for(location_type, state))
+    if expected_price is None:
         return f"Item code {item_code} is a quotable item (no fixed price). Cannot validate specific pricing."
 
-    # Clean the price string (remove commas and spaces)
-    expected_price_str = expected_price_str.replace(',', '').replace(' ', '')
-    try:
-        expected_price = float(expected_price_str)
-    except ValueError:
-        return f"Unable to parse expected price for item {item_code}."
-
     # Compare prices (allow small floating point differences)
     price_matches = abs(price - expected_price) < 0.01
 
     # Check if this item exists in inactive source (old pricing)
-    using_old_pricing = nids_inactive_source.validate_item(item_code)
+    using_old_pricing = catalogs.inactive.validate_item(item_code)
 
     result_parts = []
 
     if price_matches:
-        result_parts.append(f"✓ Price ${price:.2f} MATCHES the NIDS price ${expected_price:.2f} for item {item_code} ({location_type} location).")
+        result_parts.append(f"✓ Price ${price:.2f} MATCHES the NIDS price ${expected_price:.2f} for item {item_code} ({_location_label(location_type, state)}).")
     else:
-        result_parts.append(f"✗ Price ${price:.2f} DOES NOT MATCH the NIDS price ${expected_price:.2f} for item {item_code} ({location_type} location). Discrepancy: ${abs(price - expected_price):.2f}")
+        result_parts.append(f"✗ Price ${price:.2f} DOES NOT MATCH the NIDS price ${expected_price:.2f} for item {item_code} ({_location_label(location_type, state)}). Discrepancy: ${abs(price - expected_price):.2f}")
 
     if using_old_pricing:
         result_parts.append(f"⚠️ WARNING: Item {item_code} also exists in the INACTIVE pricing database, indicating OLD/OUTDATED pricing may be in use.")
@@ -77,20 +121,51 @@ def check_nids_item_pricing(item_code: str, price: float, location_type: str = "
 
     return " ".join(result_parts)
 
-@tool
-def check_if_using_old_pricing(item_code: str) -> str:
-    """
-    Check if an item code exists in the inactive (old) NIDS pricing database.
 
-    Args:
-        item_code: The NIDS item code to check
+def item_pricing_on_date_result(item_code: str, price: float, service_date: str, location_type: str = "standard",
+                                state: str | None = None) -> str:
+    """Describe whether a price matches the NIDS price that applied on the service date."""
+    catalogs = get_catalogs()
+    day = to_yyyymmdd(service_date)
+    if day is None:
+        return f"Could not read service date '{service_date}'. " + item_pricing_result(item_code, price, location_type, state)
 
-    Returns:
-        String indicating if the item is using old pricing
+    versions = catalogs.history.versions(item_code)
+    if not versions:
+        return f"✗ Item code {item_code} not found in either active or inactive NIDS databases."
+
+    version = catalogs.history.lookup(item_code, day)
+    if version is None:
+        periods = ", ".join(v.period for v in versions)
+        return (f"⚠️ No NIDS price for item {item_code} was in effect on {format_yyyymmdd(day)} "
+                f"(known price periods: {periods}). Cannot validate pricing for this date.")
+
+    expected_price = version.price(price_column_for(location_type, state))
+    catalog = "current" if version.source is catalogs.active else "superseded (inactive)"
+    if expected_price is None:
+        return f"Item code {item_code} is a quotable item (no fixed price) on {format_yyyymmdd(day)}. Cannot validate specific pricing."
+
+    if abs(price - expected_price) < 0.01:
+        verdict = f"✓ Price ${price:.2f} MATCHES the NIDS price ${expected_price:.2f}"
+    else:
+        verdict = f"✗ Price ${price:.2f} DOES NOT MATCH the NIDS price ${expected_price:.2f}"
+    return (f"{verdict} for item {item_code} ({_location_label(location_type, state)}) on {format_yyyymmdd(day)}, "
+            f"from the {catalog} price list valid {version.period}.")
+
+
+def old_pricing_result(item_code: str, service_date: str | None = None) -> str:
+    """Describe whether an item code is only, also or never in the inactive NIDS database.
+
+    A line dated while the superseded price list was in effect is entitled to its old price.
     """
-    is_in_inactive = nids_inactive_source.validate_item(item_code)
-    is_in_active = nids_source.validate_item(item_code)
+    catalogs = get_catalogs()
+    is_in_inactive = catalogs.inactive.validate_item(item_code)
+    is_in_active = catalogs.active.validate_item(item_code)
 
+    version = _superseded_version_in_effect(catalogs, item_code, service_date)
+    if version is not None:
+        return (f"✓ Item {item_code} was delivered on {service_date}, while the superseded (inactive) price list "
+                f"valid {version.period} was in effect, so its old price applies.")
     if is_in_inactive and is_in_active:
         return f"⚠️ WARNING: Item {item_code} exists in BOTH active and inactive databases. This item has updated pricing and old pricing should NOT be used."
     elif is_in_inactive and not is_in_active:
@@ -99,3 +174,161 @@ def check_if_using_old_pricing(item_code: str) -> str:
         return f"✓ Item {item_code} is using current pricing (only in active database)."
     else:
         return f"✗ Item {item_code} not found in either active or inactive NIDS databases."
+
+
+@tool
+def check_nids_item_exists(item_code: str) -> str:
+    """Check if the given item code exists in the NIDS database."""
+    return item_exists_result(item_code)
+
+def description_match_result(item_code: str, description: str) -> str:
+    """Describe how well a line description matches the name of its claimed item."""
+    check = check_description(get_catalogs(), item_code, description)
+    if check.score is None:
+        return f"Item code {item_code} is not in the NIDS database, so its description cannot be compared."
+    catalogs = get_catalogs()
+    source = catalogs.active if item_code in catalogs.active else catalogs.inactive
+    claimed = f"'{description}' vs '{source.names[source.row_id(item_code)]}' (similarity {check.score:.2f})"
+    alternatives = ", ".join(f"{m.item_code} '{m.name}' ({m.score:.2f})" for m in check.matches if m.item_code != item_code)
+    if check.mismatch:
+        return (f"⚠️ The description does not match item {item_code}: {claimed}. It matches other items much better: "
+                f"{alternatives}. A pricier code may have been billed for a different service.")
+    result = f"✓ The description is consistent with item {item_code}: {claimed}."
+    return result + (f" Closest other items: {alternatives}." if alternatives else "")
+
+
+@tool
+def check_description_matches_code(item_code: str, description: str) -> str:
+    """
+    Check that an invoice line's description matches the NIDS name of the item code it bills.
+
+    Billing a pricier code for a cheaper service (e.g. "house cleaning" under a high-intensity
+    support code) shows up as a description that matches other items better than its own.
+
+    Args:
+        item_code: The NIDS item code billed on the line
+        description: The service description printed on the same line
+
+    Returns:
+        The similarity to the claimed item's name and the best-matching items
+    """
+    return description_match_result(item_code, description)
+
+@tool
+def suggest_item_codes(item_code: str) -> str:
+    """
+    Find the valid NIDS item codes closest to a code that looks mangled or is not found.
+
+    PDF extraction can split codes with spaces or turn digits into look-alike letters
+    (e.g. "O1_011_01 07_1_1"); use this before concluding that an unknown code is fraudulent.
+
+    Args:
+        item_code: The item code as it appears on the invoice
+
+    Returns:
+        The ranked closest active and inactive item codes with their names
+    """
+    return suggest_item_codes_result(item_code)
+
+@tool
+def check_nids_item_pricing(item_code: str, price: float, location_type: str = "standard", state: str | None = None) -> str:
+    """
+    Check if the given item code has a valid pricing in the NIDS database.
+
+    Args:
+        item_code: The NIDS item code to validate
+        price: The price to validate (per hour or per unit)
+        location_type: Type of location - "standard" (uses state pricing), "remote", or "very_remote"
+        state: The participant's state or territory (ACT, NSW, NT, QLD, SA, TAS, VIC, WA); ACT if unknown
+
+    Returns:
+        String describing if the pricing matches, and if old pricing is being used
+    """
+    return item_pricing_result(item_code, price, location_type, state)
+
+@tool
+def check_nids_item_pricing_on_date(item_code: str, price: float, service_date: str, location_type: str = "standard",
+                                    state: str | None = None) -> str:
+    """
+    Check a price against the NIDS price that was in effect on the date the service was delivered.
+
+    Use this for backdated invoices: the price is compared with the active or superseded
+    price list covering the service date, not just today's price.
+
+    Args:
+        item_code: The NIDS item code to validate
+        price: The price to validate (per hour or per unit)
+        service_date: The date the service was delivered, e.g. 26/10/2025 or 2025-10-26
+        location_type: Type of location - "standard" (uses state pricing), "remote", or "very_remote"
+        state: The participant's state or territory (ACT, NSW, NT, QLD, SA, TAS, VIC, WA); ACT if unknown
+
+    Returns:
+        String describing if the pricing matches the price in effect on that date
+    """
+    return item_pricing_on_date_result(item_code, price, service_date, location_type, state)
+
+@tool
+def check_if_using_old_pricing(item_code: str) -> str:
+    """
+    Check if an item code exists in the inactive (old) NIDS pricing database.
+
+    Args:
+        item_code: The NIDS item code to check
+
+    Returns:
+        String indicating if the item is using old pricing
+    """
+    return old_pricing_result(item_code)
+
+
+class LineItemCheck(BaseModel):
+    """A single invoice line item to verify."""
+    item_code: str = Field(description="The NIDS item code, e.g. 01_011_0107_1_1")
+    price: float | None = Field(default=None, description="The price per hour or per unit charged on the invoice")
+    location_type: str = Field(default="standard", description='"standard", "remote" or "very_remote"')
+    service_date: str | None = Field(default=None, description="The date the service was delivered, if shown on the invoice")
+    state: str | None = Field(default=None, description="The participant's state or territory, e.g. VIC; ACT if unknown")
+    description: str | None = Field(default=None, description="The service description printed on the line")
+
+
+def verify_line_items_result(items: list[LineItemCheck]) -> str:
+    """Run the existence, pricing and old pricing checks for every line item."""
+    if not items:
+        return "No line items were provided to verify."
+
+    report = []
+    catalogs = get_catalogs()
+    for number, item in enumerate(items, 1):
+        report.append(f"Line {number} - {item.item_code}:")
+        report.append(f"  - Exists: {item_exists_result(item.item_code, item.service_date)}")
+        # Check prices against the repaired code when the printed one only has extraction artifacts
+        normalized = normalize_item_code(item.item_code)
+        if item.item_code not in catalogs.active and item.item_code not in catalogs.inactive and normalized != item.item_code:
+            item = item.model_copy(update={"item_code": normalized})
+        if item.price is None:
+            report.append("  - Pricing: No price provided. Cannot validate pricing.")
+        elif item.service_date:
+            report.append(f"  - Pricing: {item_pricing_on_date_result(item.item_code, item.price, item.service_date, item.location_type, item.state)}")
+        else:
+            report.append(f"  - Pricing: {item_pricing_result(item.item_code, item.price, item.location_type, item.state)}")
+        report.append(f"  - Old pricing: {old_pricing_result(item.item_code, item.service_date)}")
+        if item.description:
+            report.append(f"  - Description: {description_match_result(item.item_code, item.description)}")
+    return "\n".join(report)
+
+@tool
+def verify_line_items(items: list[LineItemCheck]) -> str:
+    """
+    Verify all line items of an invoice in a single call.
+
+    For each line item this checks that the item code exists in the NIDS database,
+    that the price matches the NIDS price for the location type and state, whether the
+    item is using old (inactive) pricing, and that the description matches the item.
+
+    Args:
+        items: Every line item on the invoice, each with its item_code, price, location_type, state and description
+
+    Returns:
+        One verdict block per line item, in the order given
+    """
+    return verify_line_items_result(items)
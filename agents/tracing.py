@@ -0,0 +1,358 @@
+"""Per-invoice tracing of the analysis pipeline, aggregated into Prometheus metrics.
+
+`trace_invoice` opens a trace for one analysis; `stage` times pipeline steps inside it
+(file parsing, cache lookup, rules, prompt preparation) and `TracingCallbackHandler`
+records every model call (latency, input/output tokens) and tool call the agent makes.
+When the trace closes its spans are folded into the process-wide `metrics` histograms,
+which `/metrics` serves in the Prometheus text format. The format is written by hand so
+there is no client library dependency; each worker process reports its own metrics.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Literal
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from pydantic import BaseModel
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+STEP_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0.0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(v)}"
+                for key, v in sorted(values.items())]
+
+
+class Histogram:
+    """Bucketed observations per label set, with Prometheus-style quantile estimates."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...], labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        bucket = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            series[0][bucket] += 1
+            series[1] += value
+
+    def series(self) -> dict[tuple, tuple[list[int], float]]:
+        """Per label set: cumulative bucket counts (ending with the total count) and the sum."""
+        with self._lock:
+            snapshot = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        result = {}
+        for key, (counts, total) in snapshot.items():
+            cumulative, running = [], 0
+            for count in counts:
+                running += count
+                cumulative.append(running)
+            result[key] = (cumulative, total)
+        return result
+
+    def quantile(self, q: float, cumulative: list[int]) -> float | None:
+        """Estimate a quantile by interpolating within its bucket, as histogram_quantile does."""
+        total = cumulative[-1]
+        if total == 0:
+            return None
+        rank = q * total
+        for i, count in enumerate(cumulative):
+            if count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                below = cumulative[i - 1] if i > 0 else 0
+                in_bucket = count - below
+                return lower + (self.buckets[i] - lower) * ((rank - below) / in_bucket if in_bucket else 1.0)
+        return self.buckets[-1]
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, (cumulative, total) in sorted(self.series().items()):
+            labels = dict(zip(self.labelnames, key))
+            for bound, count in zip([*self.buckets, "+Inf"], cumulative):
+                le = "+Inf" if bound == "+Inf" else _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': le})} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative[-1]}")
+        return lines
+
+
+class PipelineMetrics:
+    """Process-wide metrics for invoice analyses, fed by finished traces."""
+
+    def __init__(self):
+        self.invoices = Counter("nids_invoices_total", "Invoices analysed, by agent and outcome", ("agent", "outcome"))
+        self.invoice_seconds = Histogram("nids_invoice_seconds", "End-to-end analysis time per invoice",
+                                         LATENCY_BUCKETS, ("agent",))
+        self.stage_seconds = Histogram("nids_stage_seconds", "Time spent in each pipeline stage",
+                                       LATENCY_BUCKETS, ("stage",))
+        self.model_call_seconds = Histogram("nids_model_call_seconds", "Latency of each chat model call",
+                                            LATENCY_BUCKETS, ("model",))
+        self.model_call_tokens = Histogram("nids_model_call_tokens", "Tokens per chat model call",
+                                           TOKEN_BUCKETS, ("model", "direction"))
+        self.tool_call_seconds = Histogram("nids_tool_call_seconds", "Latency of each tool call",
+                                           LATENCY_BUCKETS, ("tool",))
+        self.tool_errors = Counter("nids_tool_errors_total", "Tool calls that raised", ("tool",))
+        self.agent_steps = Histogram("nids_agent_steps", "Model calls (agent loop steps) per invoice",
+                                     STEP_BUCKETS, ("agent",))
+
+    @property
+    def families(self) -> list[Counter | Histogram]:
+        return [self.invoices, self.invoice_seconds, self.stage_seconds, self.model_call_seconds,
+                self.model_call_tokens, self.tool_call_seconds, self.tool_errors, self.agent_steps]
+
+    def record(self, trace: "InvoiceTrace"):
+        """Fold a finished trace into the aggregates."""
+        self.invoices.inc(agent=trace.agent, outcome="error" if trace.error else "ok")
+        self.invoice_seconds.observe(trace.seconds, agent=trace.agent)
+        self.agent_steps.observe(trace.steps, agent=trace.agent)
+        for span in trace.spans:
+            if span.kind == "stage":
+                self.stage_seconds.observe(span.seconds, stage=span.name)
+            elif span.kind == "model":
+                self.model_call_seconds.observe(span.seconds, model=span.name)
+                if span.input_tokens is not None:
+                    self.model_call_tokens.observe(span.input_tokens, model=span.name, direction="input")
+                if span.output_tokens is not None:
+                    self.model_call_tokens.observe(span.output_tokens, model=span.name, direction="output")
+            else:
+                self.tool_call_seconds.observe(span.seconds, tool=span.name)
+                if span.error:
+                    self.tool_errors.inc(tool=span.name)
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for family in self.families:
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            lines.extend(family.samples())
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> list[dict]:
+        """One row per histogram series: count, mean and estimated p50/p95."""
+        rows = []
+        for family in self.families:
+            if not isinstance(family, Histogram):
+                continue
+            for key, (cumulative, total) in sorted(family.series().items()):
+                count = cumulative[-1]
+                rows.append({
+                    "metric": family.name.removeprefix("nids_"),
+                    "labels": ", ".join(f"{k}={v}" for k, v in zip(family.labelnames, key) if v),
+                    "count": count,
+                    "mean": total / count if count else None,
+                    "p50": family.quantile(0.5, cumulative),
+                    "p95": family.quantile(0.95, cumulative),
+                })
+        return rows
+
+
+metrics = PipelineMetrics()
+
+
+class Span(BaseModel):
+    """One timed step of an analysis; `start` is seconds since the trace began."""
+    kind: Literal["stage", "model", "tool"]
+    name: str
+    start: float
+    seconds: float
+    input_tokens: int | None = None
+    output_tokens: int | None = None
+    error: bool = False
+
+
+class InvoiceTrace:
+    """The spans recorded while analysing one invoice."""
+
+    def __init__(self, agent: str):
+        self.agent = agent
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+        self.spans: list[Span] = []
+        self.error = False
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, name: str, started: float, **fields) -> Span:
+        span = Span(kind=kind, name=name, start=started - self.started, seconds=time.perf_counter() - started, **fields)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    @property
+    def steps(self) -> int:
+        return sum(1 for span in self.spans if span.kind == "model")
+
+    @property
+    def tool_calls(self) -> int:
+        return sum(1 for span in self.spans if span.kind == "tool")
+
+    @property
+    def input_tokens(self) -> int:
+        return sum(span.input_tokens or 0 for span in self.spans if span.kind == "model")
+
+    @property
+    def output_tokens(self) -> int:
+        return sum(span.output_tokens or 0 for span in self.spans if span.kind == "model")
+
+    def to_dict(self) -> dict:
+        return {
+            "agent": self.agent,
+            "seconds": self.seconds,
+            "steps": self.steps,
+            "tool_calls": self.tool_calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "spans": [span.model_dump() for span in sorted(self.spans, key=lambda s: s.start)],
+        }
+
+    def summary(self) -> str:
+        by_kind: dict[str, float] = {}
+        for span in self.spans:
+            key = span.name if span.kind == "stage" else span.kind
+            by_kind[key] = by_kind.get(key, 0.0) + span.seconds
+        parts = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in by_kind.items())
+        return (f"{self.seconds:.2f}s total ({parts or 'no spans'}); {self.steps} model calls, {self.tool_calls} tool calls, "
+                f"{self.input_tokens} input / {self.output_tokens} output tokens")
+
+
+_current: contextvars.ContextVar[InvoiceTrace | None] = contextvars.ContextVar("nids_trace", default=None)
+
+
+def current_trace() -> InvoiceTrace | None:
+    return _current.get()
+
+
+@contextmanager
+def trace_invoice(agent: str, registry: PipelineMetrics | None = metrics):
+    """Trace one invoice analysis; nested calls (e.g. a cached agent wrapping another) share the outer trace."""
+    trace = _current.get()
+    if trace is not None:
+        yield trace
+        return
+    trace = InvoiceTrace(agent)
+    token = _current.set(trace)
+    try:
+        yield trace
+    except BaseException:
+        trace.error = True
+        raise
+    finally:
+        _current.reset(token)
+        trace.seconds = time.perf_counter() - trace.started
+        if registry is not None:
+            registry.record(trace)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage into the current trace (a no-op outside of one)."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add("stage", name, started)
+
+
+def _usage(response) -> tuple[int | None, int | None]:
+    """Input and output tokens of a model response, from the message usage or the provider payload."""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens"), usage.get("output_tokens")
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens"), usage.get("completion_tokens")
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Records model and tool calls of an agent run as spans of a trace."""
+
+    def __init__(self, trace: InvoiceTrace):
+        self.trace = trace
+        self._open: dict[UUID, tuple[str, float]] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata: dict | None = None, **kwargs):
+        model = (metadata or {}).get("ls_model_name") or (serialized or {}).get("kwargs", {}).get("model_name") or "unknown"
+        self._open[run_id] = (model, time.perf_counter())
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, metadata: dict | None = None, **kwargs):
+        self.on_chat_model_start(serialized, prompts, run_id=run_id, metadata=metadata, **kwargs)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        opened = self._open.pop(run_id, None)
+        if opened is not None:
+            input_tokens, output_tokens = _usage(response)
+            self.trace.add("model", opened[0], opened[1], input_tokens=input_tokens, output_tokens=output_tokens)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        opened = self._open.pop(run_id, None)
+        if opened is not None:
+            self.trace.add("model", opened[0], opened[1], error=True)
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, **kwargs):
+        self._open[run_id] = ((serialized or {}).get("name") or kwargs.get("name") or "unknown", time.perf_counter())
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs):
+        opened = self._open.pop(run_id, None)
+        if opened is not None:
+            self.trace.add("tool", opened[0], opened[1])
+
+    def on_tool_error(self, error, *, run_id: UUID, **kwargs):
+        opened = self._open.pop(run_id, None)
+        if opened is not None:
+            self.trace.add("tool", opened[0], opened[1], error=True)
+
+
+def tracing_config() -> dict:
+    """Run config that records the agent's model and tool calls into the current trace."""
+    trace = _current.get()
+    return {"callbacks": [TracingCallbackHandler(trace)]} if trace is not None else {}
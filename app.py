@@ -1,8 +1,14 @@
 import streamlit as st
 import random
 
+from agents.bulk import validate_claims
+from agents.cascade import CascadeAgent, cascade_stats
+from agents.ratelimit import use_lane
+from agents.registry import get_agent
 from agents.standard import StandardAgent
-from helpers.file_helper import parse_file
+from agents.tools import catalog_manager
+from agents.tracing import metrics, trace_invoice
+from helpers.file_helper import analysis_text, is_claim_sheet, parse_file
 from dotenv import load_dotenv
 
 from helpers.steamlist_helper import NIDSAgent
@@ -11,6 +17,9 @@ from agents.ichi import IchiAgent
 # Load environment variables
 load_dotenv()
 
+# Pick up price guide updates without restarting (a no-op on reruns once the watcher is running)
+catalog_manager.start_watching()
+
 # Page configuration
 st.set_page_config(page_title="Plan Management", page_icon="📁", layout="centered")
 
@@ -27,7 +36,8 @@ uploaded_file = st.file_uploader(
 
 agent_list: list[NIDSAgent] = [
     NIDSAgent(name="Standard Agent", description="Agent that will check line by line", agent=StandardAgent),
-    NIDSAgent(name="Ichi Agent", description="Basic Fraud for NIDS invoices", agent=IchiAgent)
+    NIDSAgent(name="Ichi Agent", description="Basic Fraud for NIDS invoices", agent=IchiAgent),
+    NIDSAgent(name="Cascade Agent", description="Fast answer first, full line-by-line check when unsure", agent=CascadeAgent),
 ]
 
 selected_agents = []
@@ -78,59 +88,96 @@ if uploaded_file is not None:
     )
 
     if st.button("Process File"):
-        # Step 1 — File Parsing
-        with st.spinner("📂 Parsing the uploaded file..."):
-            import time
-
-            time.sleep(1.5)
-            result = parse_file(uploaded_file)
-
-        st.divider()
-        st.subheader("📊 Parsed Information")
-
-        if result["type"] in ["csv", "excel"]:
-            st.dataframe(result["data"])
-        elif result["type"] == "json":
-            st.json(result["data"])
-        elif result["type"] in ["pdf", "text"]:
-            st.text(result["data"])
-        else:
-            st.warning(
-                "⚠️ Unsupported file type. Please upload CSV, Excel, JSON, PDF, or TXT."
-            )
-
-        # Step 2 — Simulated AI Agent Analysis
-        st.divider()
-        if not selected_agents:
-            st.warning("Select at least one agent")
-        else:
-            for meta in selected_agents:
-                with st.spinner(f"Running {meta.name}..."):
-                    try:
-                        agent_instance = meta.agent(model="gpt-4o-mini")
-                        analysis = agent_instance.process(result["data"])
-                        st.subheader(f"🤖 Analysis by {meta.name}")
-
-                        # Display validation status with color coding
-                        if analysis.is_valid:
-                            st.success(f"✅ **Status:** Valid Invoice")
-                        else:
-                            st.error(f"❌ **Status:** Fraudulent Invoice")
-
-                        # Display old pricing warning if applicable
-                        if hasattr(analysis, 'is_using_old_pricing') and analysis.is_using_old_pricing:
-                            st.warning("⚠️ **Old Pricing Detected:** This invoice may be using outdated NIDS pricing")
-
-                        # Display detailed reason
-                        st.write(f"**Analysis Details:**")
-                        st.info(analysis.reason)
-
-                    except Exception as e:
-                        st.error(f"Error running {meta.name}: {e}")
+        # One trace covers parsing and every analysis of this upload
+        with trace_invoice("upload") as trace:
+            # Step 1 — File Parsing
+            with st.spinner("📂 Parsing the uploaded file..."):
+                result = parse_file(uploaded_file)
+
+            st.divider()
+            st.subheader("📊 Parsed Information")
+
+            if result["type"] in ["csv", "excel"]:
+                st.dataframe(result["preview"])
+                st.caption(f"{result['rows']} claim lines read")
+            elif result["type"] == "json":
+                st.json(result["preview"])
+            elif result["type"] in ["pdf", "text"]:
+                st.text(result["preview"])
+                if result["type"] == "pdf":
+                    extraction_seconds = sum(page["seconds"] for page in result["page_timings"])
+                    st.caption(f"Extracted {result['pages']} pages ({len(result['data'])} characters) in {extraction_seconds:.2f}s")
+            else:
+                st.warning(
+                    "⚠️ Unsupported file type. Please upload CSV, Excel, JSON, PDF, or TXT."
+                )
+
+            # Step 2 — Simulated AI Agent Analysis
+            st.divider()
+            if is_claim_sheet(result):
+                # Claim spreadsheets are validated in bulk against the catalogs instead of line by line by an agent
+                claims, summary = validate_claims(result["data"])
+                st.subheader("🧾 Bulk Claim Validation")
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Claim lines", summary["rows"])
+                col2.metric("Invalid lines", summary["invalid_rows"])
+                col3.metric("Overcharged", f"${summary['overcharged_amount']:,.2f}")
+                st.write(
+                    f"Unknown codes: {summary['unknown_code']} · Price mismatches: {summary['price_mismatch']} · "
+                    f"Old pricing: {summary['old_pricing']} · Quotable: {summary['quotable']} · "
+                    f"Arithmetic errors: {summary['arithmetic_error']}"
+                )
+                st.dataframe(claims[~claims["is_valid"]].head(500))
+                st.caption(f"Validated in {summary['seconds'] * 1000:.1f} ms")
+            elif not selected_agents:
+                st.warning("Select at least one agent")
+            else:
+                for meta in selected_agents:
+                    with st.spinner(f"Running {meta.name}..."):
+                        try:
+                            agent_instance = get_agent(meta.agent, model="gpt-4o-mini")
+                            # Interactive model calls are scheduled ahead of batch jobs sharing the rate limits
+                            with use_lane("interactive"):
+                                analysis = agent_instance.process(analysis_text(result))
+                            st.subheader(f"🤖 Analysis by {meta.name}")
+
+                            # Display validation status with color coding
+                            if analysis.is_valid:
+                                st.success(f"✅ **Status:** Valid Invoice")
+                            else:
+                                st.error(f"❌ **Status:** Fraudulent Invoice")
+
+                            # Display old pricing warning if applicable
+                            if hasattr(analysis, 'is_using_old_pricing') and analysis.is_using_old_pricing:
+                                st.warning("⚠️ **Old Pricing Detected:** This invoice may be using outdated NIDS pricing")
+
+                            # Display detailed reason
+                            st.write(f"**Analysis Details:**")
+                            st.info(analysis.reason)
+                            if analysis.confidence is not None:
+                                st.caption(f"Confidence: {analysis.confidence:.0%}")
+
+
+                        except Exception as e:
+                            st.error(f"Error running {meta.name}: {e}")
+
+        with st.expander("⏱️ Where the time went"):
+            st.caption(trace.summary())
+            st.dataframe(trace.to_dict()["spans"])
 
 else:
     st.info("👆 Please upload a file to get started.")
 
+# Aggregated over every analysis run by this app process
+pipeline_summary = metrics.summary()
+if pipeline_summary:
+    with st.expander("📈 Pipeline metrics"):
+        st.dataframe(pipeline_summary)
+if cascade_stats.total:
+    with st.expander("🪜 Cascade tiers"):
+        st.caption(cascade_stats.summary())
+        st.dataframe(cascade_stats.rows())
+
 # Footer
 st.divider()
 st.caption("Plan Management v1.0")
@@ -0,0 +1,177 @@
+"""Bulk invoice analysis with resumable checkpoints.
+
+Usage:
+    python batch.py invoices/ --output results.jsonl
+    python batch.py manifest.txt --output results.jsonl --agent ichi --concurrency 32
+
+The input is a directory (searched recursively) or a manifest file listing one invoice
+path per line. Results are appended to the output JSONL as they finish; re-running the
+same command skips every invoice that already has a successful result, so a crashed run
+resumes where it stopped. Claim spreadsheets listed in a manifest are validated in bulk
+against the catalogs rather than sent to the agent.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from agents.bulk import claims_verdict
+from agents.cascade import CascadeAgent, cascade_stats
+from agents.ichi import IchiAgent
+from agents.models import ProcessResponse
+from agents.ratelimit import use_lane
+from agents.registry import get_agent
+from agents.standard import StandardAgent
+from helpers.file_helper import analysis_text, is_claim_sheet, parse_file
+
+INVOICE_SUFFIXES = {".pdf", ".txt", ".json"}
+
+AGENTS = {
+    "standard": StandardAgent,
+    "ichi": IchiAgent,
+    "cascade": CascadeAgent,
+}
+
+
+def log_with_timestamp(message, level="INFO"):
+    """Log a message with timestamp."""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}", flush=True)
+
+
+def list_invoices(source: str) -> list[str]:
+    """List invoice paths from a directory or a manifest file."""
+    path = Path(source)
+    if path.is_dir():
+        return sorted(str(p) for p in path.rglob("*") if p.suffix.lower() in INVOICE_SUFFIXES)
+    base = path.parent
+    with open(path, encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return [line if os.path.isabs(line) else str(base / line) for line in lines]
+
+
+def load_checkpoint(output_path: str) -> set[str]:
+    """Return the invoices that already have a successful result in the output file.
+
+    Errors and partial verdicts (a run stopped by its deadline or budget) are not done, so
+    they are retried. A run killed mid-write can leave a partial last line; it is cut off
+    so new results start on a clean line.
+    """
+    if not os.path.exists(output_path):
+        return set()
+
+    with open(output_path, "rb+") as f:
+        content = f.read()
+        if content and not content.endswith(b"\n"):
+            f.truncate(content.rfind(b"\n") + 1)
+            content = content[:content.rfind(b"\n") + 1]
+
+    done = set()
+    for line in content.decode("utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if "error" not in record and not record.get("incomplete"):
+            done.add(record["file"])
+    return done
+
+
+def parse_invoice(path: str) -> str | ProcessResponse:
+    """Extract the text of one invoice, or validate a claim sheet outright (runs in a worker process)."""
+    with open(path, "rb") as f:
+        # Files are already spread across processes, so pages are extracted serially here
+        parsed = parse_file(f, parallel_pages=False)
+    if parsed["type"] == "unknown":
+        raise ValueError(f"Unsupported file type: {path}")
+    if is_claim_sheet(parsed):
+        # Too many lines for one prompt; checked against the catalogs in bulk instead
+        return claims_verdict(parsed["data"])
+    return analysis_text(parsed)
+
+
+async def run_batch(paths: list[str], agent, output_path: str, parse_workers: int, concurrency: int) -> dict:
+    """Parse and analyse invoices, appending one JSON line per invoice as it completes."""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=concurrency * 2)
+    counts = {"done": 0, "failed": 0}
+    started = time.time()
+
+    with ProcessPoolExecutor(max_workers=parse_workers) as parse_pool, open(output_path, "a", encoding="utf-8") as out:
+
+        def write(record: dict):
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+
+        async def worker():
+            while True:
+                path = await queue.get()
+                if path is None:
+                    return
+                invoice_start = time.time()
+                try:
+                    parsed = await loop.run_in_executor(parse_pool, parse_invoice, path)
+                    result = parsed if isinstance(parsed, ProcessResponse) else await agent.aprocess(parsed)
+                    write({"file": path, **result.model_dump(), "seconds": round(time.time() - invoice_start, 3)})
+                    # A partial verdict is kept for reference but counts as failed, and is retried on resume
+                    counts["failed" if result.incomplete else "done"] += 1
+                except Exception as e:
+                    write({"file": path, "error": str(e), "seconds": round(time.time() - invoice_start, 3)})
+                    counts["failed"] += 1
+
+                finished = counts["done"] + counts["failed"]
+                if finished % 100 == 0:
+                    rate = finished / (time.time() - started)
+                    log_with_timestamp(f"{finished}/{len(paths)} invoices processed ({rate:.1f}/s)")
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        for path in paths:
+            await queue.put(path)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+    counts["seconds"] = time.time() - started
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse a batch of invoices and write results to JSONL.")
+    parser.add_argument("source", help="Directory of invoices or a manifest file with one path per line")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--agent", choices=sorted(AGENTS), default="standard")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 2, help="Processes used for file parsing")
+    parser.add_argument("--concurrency", type=int, default=16, help="Invoices analysed at the same time")
+    args = parser.parse_args()
+
+    load_dotenv()
+
+    paths = list_invoices(args.source)
+    done = load_checkpoint(args.output)
+    remaining = [path for path in paths if path not in done]
+    log_with_timestamp(f"{len(paths)} invoices found, {len(paths) - len(remaining)} already done, {len(remaining)} to process")
+    if not remaining:
+        return
+
+    agent = get_agent(AGENTS[args.agent], model=args.model)
+    # Batch model calls wait behind interactive requests for the shared rate limits
+    with use_lane("batch"):
+        counts = asyncio.run(run_batch(remaining, agent, args.output, args.parse_workers, args.concurrency))
+    log_with_timestamp(
+        f"Finished: {counts['done']} analysed, {counts['failed']} failed in {counts['seconds']:.1f}s",
+        "SUCCESS" if not counts["failed"] else "WARNING",
+    )
+    if args.agent == "cascade":
+        log_with_timestamp(cascade_stats.summary())
+
+
+if __name__ == "__main__":
+    main()
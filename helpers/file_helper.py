@@ -1,41 +1,153 @@
-import streamlit as st
+import os
+import tempfile
+import time
 import pandas as pd
 import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
+from typing import Iterator
 from PyPDF2 import PdfReader
 
+from helpers.spreadsheet_helper import read_claim_lines
 
-def parse_file(uploaded_file):
-    filename = uploaded_file.name.lower()
+PREVIEW_CHARS = 1000
+PREVIEW_ROWS = 20
+# Rows of a table handed to an agent; claim sheets are validated in bulk instead
+AGENT_TABLE_ROWS = 200
+# With parallel extraction, PDFs with at least this many pages are split across worker processes
+PARALLEL_PAGE_THRESHOLD = 24
+PAGES_PER_TASK = 8
+
+
+_worker_pdf: PdfReader | None = None
+
+
+def _open_worker_pdf(path: str):
+    """Open the PDF once per worker process (pool initializer)."""
+    global _worker_pdf
+    _worker_pdf = PdfReader(path)
+
+
+def _extract_page_range(start: int, stop: int) -> list[tuple[int, str, float]]:
+    """Extract pages [start, stop) of the worker's PDF (runs in a worker process)."""
+    pages = []
+    for number in range(start, stop):
+        page_start = time.perf_counter()
+        text = _worker_pdf.pages[number].extract_text() or ""
+        pages.append((number + 1, text, time.perf_counter() - page_start))
+    return pages
+
+
+def iter_pdf_pages(uploaded_file, parallel: bool = False) -> Iterator[tuple[int, str, float]]:
+    """Yield (page number, text, extraction seconds) for each page of a PDF, in page order.
+
+    With `parallel`, large PDFs are split into page ranges extracted by worker processes.
+    The PDF is written to a temporary file each worker opens once, and only a few ranges
+    per worker are in flight, so memory stays bounded however long the document is.
+    Forking worker processes is unsafe from a threaded process, so this is opt-in and
+    meant for single-threaded callers such as scripts.
+    """
+    pdf_bytes = uploaded_file.read()
+    pdf = PdfReader(BytesIO(pdf_bytes))
+    page_count = len(pdf.pages)
 
-    # CSV
-    if filename.endswith(".csv"):
-        df = pd.read_csv(uploaded_file)
-        return {"type": "csv", "data": df.head().to_dict(orient="records")}
+    if not parallel or page_count < PARALLEL_PAGE_THRESHOLD:
+        for number, page in enumerate(pdf.pages, 1):
+            page_start = time.perf_counter()
+            text = page.extract_text() or ""
+            yield number, text, time.perf_counter() - page_start
+        return
 
-    # Excel
-    elif filename.endswith((".xls", ".xlsx")):
-        df = pd.read_excel(uploaded_file)
-        return {"type": "excel", "data": df.head().to_dict(orient="records")}
+    ranges = [(start, min(start + PAGES_PER_TASK, page_count)) for start in range(0, page_count, PAGES_PER_TASK)]
+    workers = min(len(ranges), os.cpu_count() or 2)
+    del pdf
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as spilled:
+        spilled.write(pdf_bytes)
+        spilled.flush()
+        del pdf_bytes
+        with ProcessPoolExecutor(max_workers=workers, initializer=_open_worker_pdf, initargs=(spilled.name,)) as pool:
+            pending = deque()
+            for start, stop in ranges:
+                pending.append(pool.submit(_extract_page_range, start, stop))
+                if len(pending) >= workers * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+
+def parse_file(uploaded_file, parallel_pages: bool = False):
+    """Parse an uploaded file.
+
+    "data" holds the full content used for analysis and "preview" a short excerpt for display.
+    """
+    filename = uploaded_file.name.lower()
+
+    # CSV / Excel: every claim line, structured into a line-item table
+    if filename.endswith((".csv", ".xls", ".xlsx")):
+        kind = "csv" if filename.endswith(".csv") else "excel"
+        try:
+            table, columns = read_claim_lines(uploaded_file, kind)
+        except ValueError:
+            # Not a claim sheet (no item code column): keep the rows as they are
+            uploaded_file.seek(0)
+            table = pd.read_csv(uploaded_file) if kind == "csv" else pd.read_excel(uploaded_file)
+            columns = {}
+        return {
+            "type": kind,
+            "data": table,
+            "preview": table.head(PREVIEW_ROWS),
+            "rows": len(table),
+            "columns": columns,
+        }
 
     # JSON
     elif filename.endswith(".json"):
         data = json.load(uploaded_file)
-        return {"type": "json", "data": data}
+        return {"type": "json", "data": data, "preview": data}
 
     # PDF
     elif filename.endswith(".pdf"):
-        pdf = PdfReader(uploaded_file)
-        text = ""
-        for page in pdf.pages:
-            text += page.extract_text() or ""
-        return {"type": "pdf", "data": text[:1000]}  # Preview first 1000 chars
+        texts = []
+        page_timings = []
+        for number, text, seconds in iter_pdf_pages(uploaded_file, parallel=parallel_pages):
+            texts.append(text)
+            page_timings.append({"page": number, "seconds": round(seconds, 4)})
+        text = "\n".join(texts)
+        return {
+            "type": "pdf",
+            "data": text,
+            "preview": text[:PREVIEW_CHARS],
+            "pages": len(texts),
+            "page_timings": page_timings,
+        }
 
     # Plain text
     elif filename.endswith((".txt", ".log")):
         content = uploaded_file.read().decode("utf-8", errors="ignore")
-        return {"type": "text", "data": content[:1000]}
+        return {"type": "text", "data": content, "preview": content[:PREVIEW_CHARS]}
 
     # Unsupported
     else:
         return {"type": "unknown", "data": None}
+
+
+def is_claim_sheet(parsed: dict) -> bool:
+    """Whether a parsed file is a claim spreadsheet, validated in bulk rather than by an agent."""
+    return parsed["type"] in ("csv", "excel") and "item_code" in parsed["columns"]
+
+
+def analysis_text(parsed: dict) -> str:
+    """Render parsed file data as the text handed to an agent.
+
+    Tables are cut to their first AGENT_TABLE_ROWS rows so one upload stays one prompt.
+    """
+    data = parsed["data"]
+    if isinstance(data, pd.DataFrame):
+        if len(data) <= AGENT_TABLE_ROWS:
+            return data.to_csv(index=False)
+        omitted = len(data) - AGENT_TABLE_ROWS
+        return data.head(AGENT_TABLE_ROWS).to_csv(index=False) + f"... {omitted} more rows not shown\n"
+    if isinstance(data, str):
+        return data
+    return json.dumps(data, default=str)
@@ -0,0 +1,100 @@
+"""In-process job queue for running invoice analyses off the HTTP request thread."""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Literal
+
+from pydantic import BaseModel
+
+from agents.models import ProcessResponse
+from agents.tracing import trace_invoice
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at its depth limit."""
+
+
+class Job(BaseModel):
+    id: str
+    status: Literal["queued", "running", "done", "failed"] = "queued"
+    agent: str
+    submitted_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+    result: ProcessResponse | None = None
+    error: str | None = None
+    trace: dict | None = None
+
+    @property
+    def queue_seconds(self) -> float | None:
+        return None if self.started_at is None else self.started_at - self.submitted_at
+
+    @property
+    def run_seconds(self) -> float | None:
+        return None if self.finished_at is None or self.started_at is None else self.finished_at - self.started_at
+
+    def to_dict(self) -> dict:
+        data = self.model_dump()
+        data["timing"] = {"queue_seconds": self.queue_seconds, "run_seconds": self.run_seconds}
+        return data
+
+
+class JobQueue:
+    """Runs jobs on a fixed worker pool, rejecting new work once `max_pending` jobs are unfinished."""
+
+    def __init__(self, workers: int = 4, max_pending: int = 100, max_retained: int = 1000):
+        self.max_pending = max_pending
+        self.max_retained = max_retained
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analyze")
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Number of jobs queued or running."""
+        return self._pending
+
+    def submit(self, agent: str, fn: Callable[[], ProcessResponse]) -> Job:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"Queue is full ({self._pending} jobs pending)")
+            job = Job(id=uuid.uuid4().hex, agent=agent, submitted_at=time.time())
+            self._jobs[job.id] = job
+            self._pending += 1
+            self._trim()
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: Job, fn: Callable[[], ProcessResponse]):
+        job.started_at = time.time()
+        job.status = "running"
+        trace = None
+        try:
+            with trace_invoice(job.agent) as trace:
+                job.result = fn()
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            if trace is not None:
+                job.trace = trace.to_dict()
+            job.finished_at = time.time()
+            with self._lock:
+                self._pending -= 1
+
+    def _trim(self):
+        # Forget the oldest finished jobs once more than max_retained are held
+        excess = len(self._jobs) - self.max_retained
+        if excess <= 0:
+            return
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ("done", "failed")]
+        for job_id in finished[:excess]:
+            del self._jobs[job_id]
@@ -0,0 +1,45 @@
+"""Minimal PDF writer for plain text documents (test fixtures and synthetic invoices).
+
+Writes uncompressed PDF 1.4 with one standard font and one text object per page, which
+is all PyPDF2 needs to extract the text again. Characters outside Latin-1 are replaced.
+"""
+
+LINES_PER_PAGE = 64
+
+
+def _escape(text: str) -> str:
+    text = text.encode("latin-1", errors="replace").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def pdf_bytes(pages: list[list[str]], font: str = "Courier", font_size: float = 9) -> bytes:
+    """Build a PDF with one page per list of lines."""
+    leading = font_size * 1.25
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, f"<< /Type /Font /Subtype /Type1 /BaseFont /{font} >>"]
+    kids = []
+    for lines in pages:
+        body = " T* ".join(f"({_escape(line)}) Tj" for line in lines)
+        stream = f"BT /F1 {font_size:g} Tf {leading:g} TL 40 760 Td {body} ET"
+        objects.append(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+def text_to_pdf(text: str, lines_per_page: int = LINES_PER_PAGE) -> bytes:
+    """Lay out plain text as monospaced PDF pages."""
+    lines = text.strip("\n").split("\n")
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[""]]
+    return pdf_bytes(pages)
@@ -0,0 +1,117 @@
+"""Chunked ingestion of claim spreadsheets into a structured line-item table."""
+import re
+from typing import Iterator
+
+import pandas as pd
+
+CHUNK_ROWS = 50_000
+
+# Header spellings seen in payment request spreadsheets, per line-item field
+COLUMN_ALIASES = {
+    "item_code": ["support item number", "support item", "item code", "item number", "line item code",
+                  "line item", "ndis code", "ndis item", "code"],
+    "description": ["support item name", "description", "item name", "service", "item"],
+    "quantity": ["quantity", "qty", "hours", "units", "unit quantity"],
+    "rate": ["unit price", "rate", "price", "unit cost", "hourly rate", "price per unit"],
+    "amount": ["amount", "total", "claimed amount", "line total", "claim amount"],
+    "service_date": ["service date", "date of service", "support date", "start date", "date"],
+    "state": ["state", "participant state"],
+    "location_type": ["location type", "location", "remoteness", "mmm"],
+}
+
+CLAIM_COLUMNS = list(COLUMN_ALIASES)
+NUMERIC_COLUMNS = ("quantity", "rate", "amount")
+
+
+def _normalize_header(header) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", str(header).lower()).strip()
+
+
+def detect_claim_columns(headers) -> dict[str, str]:
+    """Map line-item fields to spreadsheet headers, trying exact then prefix matches per alias."""
+    normalized = {_normalize_header(h): h for h in headers}
+    mapping: dict[str, str] = {}
+    used = set()
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            match = next((h for n, h in normalized.items() if n == alias and h not in used), None)
+            if match is None:
+                match = next((h for n, h in normalized.items() if n.startswith(alias) and h not in used), None)
+            if match is not None:
+                mapping[field] = match
+                used.add(match)
+                break
+    return mapping
+
+
+def _to_numeric(values: pd.Series) -> pd.Series:
+    cleaned = values.astype(str).str.replace(r"[\s,$]", "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce")
+
+
+def _structure_chunk(chunk: pd.DataFrame, mapping: dict[str, str]) -> pd.DataFrame:
+    """Keep only the mapped columns of a raw chunk, renamed and typed."""
+    table = pd.DataFrame(index=chunk.index)
+    for field in CLAIM_COLUMNS:
+        if field not in mapping:
+            table[field] = pd.NA
+        elif field in NUMERIC_COLUMNS:
+            table[field] = _to_numeric(chunk[mapping[field]])
+        elif field == "service_date":
+            table[field] = pd.to_datetime(chunk[mapping[field]], errors="coerce", dayfirst=True)
+        else:
+            table[field] = chunk[mapping[field]].astype("string").str.strip()
+    return table.dropna(subset=["item_code"])
+
+
+def _iter_raw_csv(source, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    yield from pd.read_csv(source, dtype=str, chunksize=chunk_rows, keep_default_na=False, na_values=[""])
+
+
+def _iter_raw_excel(source, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    if str(getattr(source, "name", "")).lower().endswith(".xls"):
+        # Legacy .xls can't be streamed; read the sheet once and slice it
+        df = pd.read_excel(source, dtype=str)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+        return
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = [str(h).strip() if h is not None else f"column_{i}" for i, h in enumerate(next(rows, []))]
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame(batch, columns=headers, dtype=str)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=headers, dtype=str)
+    finally:
+        workbook.close()
+
+
+def iter_claim_chunks(source, kind: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[tuple[pd.DataFrame, dict[str, str]]]:
+    """Stream a CSV or Excel sheet as structured line-item chunks, with the detected column mapping."""
+    raw_chunks = _iter_raw_csv(source, chunk_rows) if kind == "csv" else _iter_raw_excel(source, chunk_rows)
+    mapping = None
+    for chunk in raw_chunks:
+        if mapping is None:
+            mapping = detect_claim_columns(chunk.columns)
+            if "item_code" not in mapping:
+                raise ValueError(f"No item code column found in {list(chunk.columns)}")
+        yield _structure_chunk(chunk, mapping), mapping
+
+
+def read_claim_lines(source, kind: str, chunk_rows: int = CHUNK_ROWS) -> tuple[pd.DataFrame, dict[str, str]]:
+    """Read a whole claim spreadsheet into one structured line-item table."""
+    chunks = []
+    mapping: dict[str, str] = {}
+    for chunk, mapping in iter_claim_chunks(source, kind, chunk_rows):
+        chunks.append(chunk)
+    if not chunks:
+        return pd.DataFrame(columns=CLAIM_COLUMNS), mapping
+    return pd.concat(chunks, ignore_index=True), mapping
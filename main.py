@@ -1,5 +1,8 @@
 from dotenv import load_dotenv
 
+from agents.registry import get_agent
+from agents.rules import fast_path_stats
+from agents.preprocess import prompt_stats
 from agents.standard import StandardAgent
 
 # Load environment variables
@@ -76,10 +79,11 @@ ACCOUNT NUMBER:  111111 11
 """
 
 if __name__ == "__main__":
-    agent = StandardAgent(
-        model="gpt-4o-mini"
-    )
+    agent = get_agent(StandardAgent, model="gpt-4o-mini")
     result = agent.process(real_data)
     print(f"Is Valid: {result.is_valid}")
     print(f"Reason: {result.reason}")
     print(f"Is Using Old Pricing: {result.is_using_old_pricing}")
+    print(fast_path_stats.summary())
+    print(prompt_stats.summary())
+    print(f"Cache: {agent.cache.stats()}")
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""Compare per-request agent construction with reusing warm agents from the registry.
+
+Only construction overhead is measured (no model calls are made), so this runs offline:
+    OPENAI_API_KEY=dummy python scripts/bench_agent_registry.py
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "dummy")
+
+from agents.ichi import IchiAgent
+from agents.registry import agent_registry
+from agents.standard import StandardAgent
+
+ROUNDS = 50
+
+
+def time_per_call(fn, rounds: int = ROUNDS) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+if __name__ == "__main__":
+    print(f"{'Agent':<16} {'Construct (ms)':>15} {'Registry (ms)':>15}")
+    for agent_cls in (StandardAgent, IchiAgent):
+        fresh = time_per_call(lambda: agent_cls(model="gpt-4o-mini"))
+        agent_registry.get(agent_cls, "gpt-4o-mini")
+        warm = time_per_call(lambda: agent_registry.get(agent_cls, "gpt-4o-mini"))
+        print(f"{agent_cls.__name__:<16} {fresh:>15.3f} {warm:>15.4f}")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Benchmark the agents end to end with a scripted chat model instead of OpenAI.
+
+The scripted model answers deterministically after a configurable delay, so what is left
+is the cost of the agents themselves: prompt preparation, the LangChain agent loop, tool
+execution and catalog lookups. No network access or API key is needed:
+    python scripts/bench_agents_offline.py --concurrency 1,8,32 --latency 0.2 --synthetic 200
+
+Reports throughput, p50/p95/p99 latency, model and tool calls, tokens and peak memory
+for every agent and concurrency level.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "dummy")
+
+from agents.cascade import CascadeAgent, CascadeStats
+from agents.ichi import IchiAgent
+from agents.scripted_llm import ScriptedChatModel
+from agents.standard import StandardAgent
+from agents.synthetic import InvoiceGenerator, read_labels
+from agents.tracing import trace_invoice
+from helpers.file_helper import analysis_text, parse_file
+from tests.test_agent_invoices import INVOICE_TEST_CASES
+
+AGENTS = {
+    "standard": lambda llm, fast_path: StandardAgent(model="scripted", llm=llm, fast_path=fast_path),
+    "standard-single": lambda llm, fast_path: StandardAgent(model="scripted", llm=llm, fast_path=fast_path, batch_tools=False),
+    "ichi": lambda llm, fast_path: IchiAgent(model="scripted", llm=llm),
+    "cascade": lambda llm, fast_path: CascadeAgent(model="scripted", llm=llm, escalation_llm=llm, fast_path=fast_path,
+                                                   stats=CascadeStats()),
+}
+
+
+def synthetic_invoices(count: int, seed: int = 0) -> list[tuple[str, bool]]:
+    """Invoices from the synthetic generator, about 30% of them with injected fraud."""
+    return [(invoice.text, invoice.is_valid) for invoice in InvoiceGenerator(seed=seed).generate(count)]
+
+
+def corpus_invoices(out_dir: str, limit: int | None = None) -> list[tuple[str, bool]]:
+    """Invoices of a corpus written by `python -m agents.synthetic generate`, with their labels."""
+    cases = []
+    for record in read_labels(out_dir)[:limit]:
+        with open(record["file"], "rb") as f:
+            cases.append((analysis_text(parse_file(f, parallel_pages=False)), record["is_valid"]))
+    return cases
+
+
+def run_threads(agent, invoices: list[str], concurrency: int) -> list[tuple[float, object]]:
+    def run(invoice: str):
+        started = time.perf_counter()
+        with trace_invoice(type(agent).__name__, registry=None) as trace:
+            response = agent.process(invoice)
+        return time.perf_counter() - started, trace, response
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(run, invoices))
+
+
+async def run_async(agent, invoices: list[str], concurrency: int) -> list[tuple[float, object]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(invoice: str):
+        async with semaphore:
+            started = time.perf_counter()
+            with trace_invoice(type(agent).__name__, registry=None) as trace:
+                response = await agent.aprocess(invoice)
+            return time.perf_counter() - started, trace, response
+
+    return await asyncio.gather(*(run(invoice) for invoice in invoices))
+
+
+def benchmark(name: str, agent, cases: list[tuple[str, bool]], concurrency: int, mode: str, track_memory: bool) -> dict:
+    invoices = [text for text, _ in cases]
+    if track_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    if mode == "async":
+        results = asyncio.run(run_async(agent, invoices, concurrency))
+    else:
+        results = run_threads(agent, invoices, concurrency)
+    elapsed = time.perf_counter() - started
+    heap_peak = tracemalloc.get_traced_memory()[1] if track_memory else None
+    if track_memory:
+        tracemalloc.stop()
+
+    latencies = np.array([seconds for seconds, _, _ in results]) * 1000
+    traces = [trace for _, trace, _ in results]
+    correct = sum(response.is_valid == expected for (_, _, response), (_, expected) in zip(results, cases))
+    return {
+        "agent": name,
+        "concurrency": concurrency,
+        "invoices": len(invoices),
+        "throughput": len(invoices) / elapsed,
+        "p50": np.percentile(latencies, 50),
+        "p95": np.percentile(latencies, 95),
+        "p99": np.percentile(latencies, 99),
+        "model_calls": sum(trace.steps for trace in traces) / len(traces),
+        "tool_calls": sum(trace.tool_calls for trace in traces) / len(traces),
+        "tokens": sum(trace.input_tokens + trace.output_tokens for trace in traces) / len(traces),
+        "accuracy": correct / len(cases),
+        "heap_peak_mb": heap_peak / 2**20 if heap_peak is not None else None,
+        # ru_maxrss is in KiB on Linux
+        "rss_peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--agents", default="standard,ichi", help=f"Comma-separated, from: {', '.join(AGENTS)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--mode", choices=["async", "threads"], default="async",
+                        help="aprocess on an event loop, or process on a thread pool (like the API's job queue)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Scripted model latency per call in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra latency, as a fraction of --latency")
+    parser.add_argument("--output-tokens", type=int, default=60, help="Output tokens reported per model call")
+    parser.add_argument("--synthetic", type=int, default=100, help="Synthetic invoices added to the test cases")
+    parser.add_argument("--corpus", help="Directory of a generated corpus whose invoices are added to the test cases")
+    parser.add_argument("--corpus-limit", type=int, help="Use at most this many invoices of the corpus")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic invoices")
+    parser.add_argument("--repeat", type=int, default=1, help="Times the test cases are repeated")
+    parser.add_argument("--fast-path", action="store_true", help="Let the rule engine resolve clear-cut invoices")
+    parser.add_argument("--memory", action="store_true", help="Track Python heap peaks (slows the run)")
+    args = parser.parse_args(argv)
+
+    cases = [(case["content"], case["expected_valid"]) for case in INVOICE_TEST_CASES] * args.repeat
+    cases += synthetic_invoices(args.synthetic, args.seed)
+    if args.corpus:
+        cases += corpus_invoices(args.corpus, args.corpus_limit)
+    llm = ScriptedChatModel(latency=args.latency, jitter=args.jitter, output_tokens=args.output_tokens)
+
+    print(f"{len(cases)} invoices, scripted latency {args.latency * 1000:.0f}ms, {args.mode} mode\n")
+    header = (f"{'Agent':<16} {'Conc':>5} {'Inv/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'Model':>6} {'Tools':>6} {'Tokens':>7} {'Acc':>6} {'RSS MB':>7}{' Heap MB':>9}")
+    print(header)
+    print("-" * len(header))
+    for name in args.agents.split(","):
+        agent = AGENTS[name](llm, args.fast_path)
+        # Warm up catalog indexes and the agent graph outside of the measurement
+        agent.process(cases[0][0])
+        for concurrency in (int(level) for level in args.concurrency.split(",")):
+            row = benchmark(name, agent, cases, concurrency, args.mode, args.memory)
+            heap = f"{row['heap_peak_mb']:>9.1f}" if row["heap_peak_mb"] is not None else f"{'-':>9}"
+            print(f"{row['agent']:<16} {row['concurrency']:>5} {row['throughput']:>9.1f} {row['p50']:>8.1f} "
+                  f"{row['p95']:>8.1f} {row['p99']:>8.1f} {row['model_calls']:>6.2f} {row['tool_calls']:>6.2f} "
+                  f"{row['tokens']:>7.0f} {row['accuracy']:>6.1%} {row['rss_peak_mb']:>7.0f}{heap}")
+        if isinstance(agent, CascadeAgent):
+            print(f"  {agent.stats.summary()}")
+
+
+if __name__ == "__main__":
+    main()
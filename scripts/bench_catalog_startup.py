@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Compare cold-start catalog loading from the CSVs with loading the compiled snapshots.
+
+Each round runs in a fresh interpreter, so import costs (pandas for the CSV path) are
+included, as they are for a new gunicorn worker or test process:
+    python scripts/bench_catalog_startup.py
+"""
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from agents.snapshot import build
+
+ROUNDS = 5
+CATALOGS = ("data/nids_source_active.csv", "data/nids_source_inactive.csv")
+
+CSV_LOAD = f"""
+from agents.models import NIDSSource
+for path in {CATALOGS!r}:
+    NIDSSource(path)
+"""
+
+SNAPSHOT_LOAD = f"""
+from agents.snapshot import load_catalog
+for path in {CATALOGS!r}:
+    load_catalog(path, {{snapshot_dir!r}}, write=False)
+"""
+
+
+def cold_start(code: str, rounds: int = ROUNDS) -> float:
+    """Median wall time in ms of running `code` in a new interpreter."""
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        build(str(ROOT / "data"), snapshot_dir)
+        baseline = cold_start("pass")
+        csv_ms = cold_start(CSV_LOAD)
+        snapshot_ms = cold_start(SNAPSHOT_LOAD.format(snapshot_dir=snapshot_dir))
+
+    print(f"{'Load':<12} {'Cold start (ms)':>16} {'Over bare python (ms)':>22}")
+    print(f"{'CSV':<12} {csv_ms:>16.1f} {csv_ms - baseline:>22.1f}")
+    print(f"{'Snapshot':<12} {snapshot_ms:>16.1f} {snapshot_ms - baseline:>22.1f}")
+    print(f"Snapshot loads {(csv_ms - baseline) / max(snapshot_ms - baseline, 1e-9):.1f}x faster")
@@ -1,15 +1,66 @@
 """Flask API server for NDIS fraud detection."""
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
+from io import BytesIO
 import os
 
+from agents.bulk import claims_verdict
+from agents.cascade import CascadeAgent, cascade_stats
+from agents.ichi import IchiAgent
+from agents.ratelimit import LANE_PRIORITY, get_scheduler, use_lane
+from agents.registry import DEFAULT_MODEL, agent_registry, get_agent
+from agents.standard import StandardAgent
+from agents.tools import catalog_manager
+from agents.tracing import metrics, stage, trace_invoice
+from helpers.file_helper import analysis_text, is_claim_sheet, parse_file
+from helpers.job_queue import JobQueue, QueueFullError
+
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Build the agents once per worker so requests don't pay client and graph construction
+if os.getenv('OPENAI_API_KEY'):
+    agent_registry.warm([StandardAgent, IchiAgent, CascadeAgent])
+
+# Pick up price guide updates dropped into data/ without restarting (NIDS_CATALOG_POLL_SECONDS=0 disables)
+catalog_manager.start_watching()
+
+AGENTS = {
+    'standard': StandardAgent,
+    'ichi': IchiAgent,
+    'cascade': CascadeAgent,
+}
+
+# Models a client may pick; each one builds and keeps its own agents, so the set stays small
+ALLOWED_MODELS = {m.strip() for m in os.getenv('ALLOWED_MODELS', f'{DEFAULT_MODEL},gpt-4o').split(',') if m.strip()}
+
+# Analyses run on this pool so HTTP workers return immediately
+job_queue = JobQueue(
+    workers=int(os.getenv('ANALYZE_WORKERS', 8)),
+    max_pending=int(os.getenv('ANALYZE_MAX_PENDING', 200)),
+)
+
+
+def _analyze_upload(agent, filename: str, content: bytes):
+    """Parse an uploaded file and run the agent on its contents."""
+    upload = BytesIO(content)
+    upload.name = filename
+    # Parsing is part of the invoice's trace; the agent's own trace joins this one
+    with trace_invoice(type(agent).__name__):
+        with stage("parsing"):
+            parsed = parse_file(upload)
+        if parsed['type'] == 'unknown':
+            raise ValueError(f'Unsupported file type: {filename}')
+        if is_claim_sheet(parsed):
+            # A claim sheet can have thousands of lines; check them against the catalogs, not in one prompt
+            with stage("bulk_validation"):
+                return claims_verdict(parsed['data'])
+        return agent.process(analysis_text(parsed))
+
 @app.route('/')
 def index():
     """Health check endpoint."""
@@ -24,9 +75,69 @@ def health():
     """Health check endpoint."""
     return jsonify({
         'status': 'ok',
-        'message': 'Service is running'
+        'message': 'Service is running',
+        'queue_depth': job_queue.pending,
+        'catalog_version': catalog_manager.current.version,
+        'catalog_generation': catalog_manager.generation,
+        'cascade': cascade_stats.rows(),
+        'rate_limit': get_scheduler().summary(),
     }), 200
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Per-stage latency, model token and tool call histograms in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/analyze', methods=['POST'])
+def analyze():
+    """Queue an invoice for analysis and return the job id.
+
+    Accepts either a JSON body {"text": "...", "agent": "standard", "model": "..."}
+    or a multipart upload with a "file" field (agent and model as form fields).
+    "lane": "batch" queues the model calls behind interactive requests.
+    """
+    payload = request.form if request.files else (request.get_json(silent=True) or {})
+    agent_name = payload.get('agent', 'standard').lower()
+    if agent_name not in AGENTS:
+        return jsonify({'error': f'Unknown agent "{agent_name}"', 'agents': list(AGENTS)}), 400
+    model = payload.get('model', DEFAULT_MODEL)
+    if model not in ALLOWED_MODELS:
+        return jsonify({'error': f'Unknown model "{model}"', 'models': sorted(ALLOWED_MODELS)}), 400
+    lane = payload.get('lane', 'interactive')
+    if lane not in LANE_PRIORITY:
+        return jsonify({'error': f'Unknown lane "{lane}"', 'lanes': list(LANE_PRIORITY)}), 400
+
+    uploaded = request.files.get('file')
+    if uploaded is None and not payload.get('text'):
+        return jsonify({'error': 'Provide invoice "text" or a "file" upload'}), 400
+
+    agent = get_agent(AGENTS[agent_name], model=model)
+    if uploaded is not None:
+        filename, content = uploaded.filename or '', uploaded.read()
+        analyze_job = lambda: _analyze_upload(agent, filename, content)
+    else:
+        text = payload['text']
+        analyze_job = lambda: agent.process(text)
+
+    def work():
+        with use_lane(lane):
+            return analyze_job()
+
+    try:
+        job = job_queue.submit(agent_name, work)
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 429, {'Retry-After': '5'}
+
+    return jsonify({'job_id': job.id, 'status': job.status, 'status_url': f'/jobs/{job.id}'}), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Return the status, timing, per-stage trace and result of an analysis job."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 200
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     debug = os.getenv('FLASK_ENV', 'production') == 'development'
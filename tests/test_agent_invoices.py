@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 """Test script for NDIS fraud detection agent with realistic invoice scenarios."""
+import argparse
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
 from datetime import datetime
@@ -14,7 +16,14 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 # Load environment variables from .env file
 load_dotenv()
 
+from agents.cassette import Cassette, CassetteChatModel
+from agents.registry import make_llm
+from agents.scripted_llm import ScriptedChatModel
 from agents.standard import StandardAgent
+from agents.tracing import trace_invoice
+
+CASSETTE_PATH = Path(__file__).parent / "cassettes" / "standard_agent.json"
+AGENT_MODEL = "gpt-4o"
 
 
 def log_with_timestamp(message, level="INFO"):
@@ -296,8 +305,37 @@ Total Amount Due: $703.57
 ]
 
 
-def run_agent_tests():
-    """Run all invoice test cases through the StandardAgent."""
+def build_agent(cassette: Cassette | None = None, cassette_mode: str = "replay", scripted: bool = False) -> StandardAgent:
+    """The agent under test: live, or recording to / replaying from a cassette."""
+    if cassette is None:
+        return StandardAgent(model=AGENT_MODEL)
+    inner = None
+    if cassette_mode in ("record", "auto"):
+        inner = ScriptedChatModel() if scripted else make_llm(AGENT_MODEL)
+    llm = CassetteChatModel(cassette=cassette, inner=inner, mode=cassette_mode, model_name=AGENT_MODEL)
+    # The rule fast path would settle every case before the model is asked; cassettes cover the model's side
+    return StandardAgent(model=AGENT_MODEL, fast_path=False, llm=llm)
+
+
+def analyse(agent, test_case):
+    """Run one case: (result, trace, duration, error)."""
+    started = time.time()
+    try:
+        with trace_invoice(type(agent).__name__) as trace:
+            result = agent.process(test_case['content'])
+        return result, trace, time.time() - started, None
+    except Exception as e:
+        return None, None, time.time() - started, e
+
+
+def run_agent_tests(cassette_mode: str | None = None, workers: int = 1, scripted: bool = False,
+                    cassette_path: Path = CASSETTE_PATH):
+    """Run all invoice test cases through the StandardAgent.
+
+    Without a cassette mode the cases run against the live model. "record" (or "auto")
+    stores the model's responses in the cassette, "replay" runs fully offline from it and
+    "check" replays while reporting requests whose prompts or tool schemas have drifted.
+    """
     start_time = time.time()
 
     print("\n" + "=" * 100)
@@ -307,8 +345,9 @@ def run_agent_tests():
 
     log_with_timestamp("Starting test suite initialization")
 
-    # Check for API key
-    if not os.getenv("OPENAI_API_KEY"):
+    # Check for API key (replays and scripted recordings never call OpenAI)
+    needs_model = cassette_mode is None or (cassette_mode in ("record", "auto") and not scripted)
+    if needs_model and not os.getenv("OPENAI_API_KEY"):
         log_with_timestamp("OPENAI_API_KEY not found", "ERROR")
         print("\n✗ ERROR: OPENAI_API_KEY environment variable is not set")
         print("Please set your OpenAI API key:")
@@ -317,12 +356,17 @@ def run_agent_tests():
         print("  OPENAI_API_KEY=your-api-key-here")
         return False
 
-    log_with_timestamp("✓ API key found", "SUCCESS")
+    if needs_model:
+        log_with_timestamp("✓ API key found", "SUCCESS")
 
     # Initialize the agent
-    log_with_timestamp("Initializing StandardAgent with gpt-4o model...")
+    log_with_timestamp(f"Initializing StandardAgent with {AGENT_MODEL} model...")
+    cassette = None
+    if cassette_mode is not None:
+        cassette = Cassette(str(cassette_path))
+        log_with_timestamp(f"Cassette {cassette_path} ({len(cassette)} recordings), mode: {cassette_mode}")
     try:
-        agent = StandardAgent(model="gpt-4o")
+        agent = build_agent(cassette, cassette_mode, scripted)
         log_with_timestamp("✓ Agent initialized successfully", "SUCCESS")
     except Exception as e:
         log_with_timestamp(f"Failed to initialize agent: {e}", "ERROR")
@@ -335,11 +379,12 @@ def run_agent_tests():
     failed = 0
     results = []
 
-    log_with_timestamp(f"Running {total_tests} test cases...\n")
+    log_with_timestamp(f"Running {total_tests} test cases on {workers} worker(s)...\n")
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        outcomes = list(pool.map(lambda test_case: analyse(agent, test_case), INVOICE_TEST_CASES))
 
     # Run each test case
-    for i, test_case in enumerate(INVOICE_TEST_CASES, 1):
-        test_start_time = time.time()
+    for i, (test_case, (result, trace, test_duration, error)) in enumerate(zip(INVOICE_TEST_CASES, outcomes), 1):
 
         print("\n" + "=" * 100)
         print(f"TEST {i}/{total_tests}: {test_case['name']}")
@@ -353,13 +398,11 @@ def run_agent_tests():
         print("-" * 100)
 
         try:
-            log_with_timestamp("Sending invoice to agent for analysis...")
+            if error is not None:
+                raise error
 
-            # Process the invoice through the agent
-            result = agent.process(test_case['content'])
-
-            test_duration = time.time() - test_start_time
             log_with_timestamp(f"Agent analysis completed in {test_duration:.2f}s")
+            log_with_timestamp(f"Breakdown: {trace.summary()}")
 
             # Check if result matches expectation
             test_passed = result.is_valid == test_case['expected_valid']
@@ -399,19 +442,19 @@ def run_agent_tests():
                 "actual_valid": result.is_valid,
                 "reason": result.reason,
                 "duration": test_duration,
+                "trace": trace.to_dict(),
                 "using_old_pricing": result.is_using_old_pricing
             })
 
         except Exception as e:
             failed += 1
             status = "✗ ERROR"
-            test_duration = time.time() - test_start_time
 
             print(f"\n{'⚠️ EXCEPTION OCCURRED':^100}")
             print("-" * 100)
             print(f"Error: {str(e)}")
             print("\nStack trace:")
-            traceback.print_exc()
+            traceback.print_exception(e)
             print("-" * 100)
 
             log_with_timestamp(f"Test {i} ERROR: {str(e)}", "ERROR")
@@ -486,10 +529,24 @@ def run_agent_tests():
     log_with_timestamp(f"Test suite finished: {passed}/{total_tests} passed",
                       "SUCCESS" if passed == total_tests else "WARNING")
 
+    if cassette is not None:
+        log_with_timestamp(f"Cassette: {cassette.hits} replayed, {cassette.recorded} recorded")
+        if cassette.drift:
+            print(f"\n⚠️ {len(cassette.drift)} request(s) drifted from the recording (re-record with --cassette record):")
+            for drift in cassette.drift:
+                print(f"  - {drift.key} (closest recording {drift.closest_key}): {'; '.join(drift.changes)}")
+            return False
+
     return passed == total_tests
 
 
 if __name__ == "__main__":
-    success = run_agent_tests()
+    parser = argparse.ArgumentParser(description="Run the invoice test cases through the StandardAgent.")
+    parser.add_argument("--cassette", choices=["record", "replay", "auto", "check"],
+                        help="Record model responses to, or replay them from, tests/cassettes/")
+    parser.add_argument("--workers", type=int, default=1, help="Cases run in parallel")
+    parser.add_argument("--scripted", action="store_true", help="Record from the offline scripted model instead of OpenAI")
+    args = parser.parse_args()
+    success = run_agent_tests(args.cassette, args.workers, args.scripted)
     sys.exit(0 if success else 1)
 
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Test script for resumable batch analysis."""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path so we can import the batch module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import batch
+from agents.models import ProcessResponse
+from batch import list_invoices, load_checkpoint, run_batch
+
+
+class RecordingAgent:
+    """Stands in for an agent: passes every invoice except the ones it is told to fail or stop early on."""
+
+    def __init__(self, failing: set[str] = frozenset(), incomplete: set[str] = frozenset()):
+        self.failing = failing
+        self.incomplete = incomplete
+        self.seen: list[str] = []
+
+    async def aprocess(self, text: str) -> ProcessResponse:
+        self.seen.append(text)
+        if text in self.failing:
+            raise RuntimeError("upstream error")
+        if text in self.incomplete:
+            return ProcessResponse(is_valid=False, reason="Analysis incomplete", incomplete="the deadline passed")
+        return ProcessResponse(is_valid=True, reason="ok")
+
+
+def write_invoices(directory: str, count: int) -> list[str]:
+    for i in range(count):
+        Path(directory, f"invoice-{i}.txt").write_text(f"INVOICE {i}\n01_011_0107_1_1 1 x $70.23 = $70.23\n")
+    return list_invoices(directory)
+
+def read_records(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_missing_checkpoint():
+    with tempfile.TemporaryDirectory() as tmp:
+        assert load_checkpoint(os.path.join(tmp, "results.jsonl")) == set()
+
+def test_resume_after_crash():
+    with tempfile.TemporaryDirectory() as tmp:
+        invoices = os.path.join(tmp, "invoices")
+        os.makedirs(invoices)
+        paths = write_invoices(invoices, 6)
+        output = os.path.join(tmp, "results.jsonl")
+        failing, incomplete = Path(paths[1]).read_text(), Path(paths[2]).read_text()
+
+        agent = RecordingAgent({failing}, {incomplete})
+        counts = asyncio.run(run_batch(paths, agent, output, parse_workers=1, concurrency=2))
+        # A partial verdict from a deadline or budget stop is recorded but counts as failed
+        assert counts["done"] == 4 and counts["failed"] == 2
+
+        # The run is killed while writing its last record, leaving half a line behind
+        with open(output, "rb") as f:
+            content = f.read()
+        last = content.rstrip(b"\n").rfind(b"\n") + 1
+        cut = json.loads(content[last:])["file"]
+        with open(output, "wb") as f:
+            f.write(content[:last + (len(content) - last) // 2])
+
+        done = load_checkpoint(output)
+        records = read_records(output)
+        assert len(records) == 5 and cut not in {r["file"] for r in records}
+        assert done == {r["file"] for r in records if "error" not in r and not r["incomplete"]}
+        assert paths[1] not in done and paths[2] not in done and cut not in done
+
+        # The rerun skips finished invoices and retries the failed, incomplete and cut-off ones
+        remaining = [path for path in paths if path not in done]
+        agent = RecordingAgent()
+        synced = []
+        fsync = os.fsync
+        batch.os.fsync = lambda fd: (synced.append(fd), fsync(fd))
+        try:
+            counts = asyncio.run(run_batch(remaining, agent, output, parse_workers=1, concurrency=2))
+        finally:
+            batch.os.fsync = fsync
+        assert counts["done"] == len(remaining) and counts["failed"] == 0
+        assert sorted(agent.seen) == sorted(Path(path).read_text() for path in remaining)
+        # Every record is synced to disk as it is written
+        assert len(synced) == len(remaining)
+
+        successes = [r["file"] for r in read_records(output) if "error" not in r and not r["incomplete"]]
+        assert sorted(successes) == sorted(paths)
+        assert load_checkpoint(output) == set(paths)
+
+def test_claim_sheets_skip_the_agent():
+    with tempfile.TemporaryDirectory() as tmp:
+        sheet = Path(tmp, "claims.csv")
+        sheet.write_text("Support Item Number,Hours,Unit Price,Total\n" + "01_011_0107_1_1,2,$70.23,$140.46\n" * 500)
+        Path(tmp, "manifest.txt").write_text("claims.csv\n")
+        output = os.path.join(tmp, "results.jsonl")
+        agent = RecordingAgent()
+        paths = list_invoices(os.path.join(tmp, "manifest.txt"))
+        counts = asyncio.run(run_batch(paths, agent, output, parse_workers=1, concurrency=1))
+        assert counts["done"] == 1 and not agent.seen
+        [record] = read_records(output)
+        assert record["is_valid"] and record["reason"].startswith("500 claim lines checked in bulk")
+
+if __name__ == "__main__":
+    test_missing_checkpoint()
+    test_resume_after_crash()
+    test_claim_sheets_skip_the_agent()
+    print("All batch tests passed!")
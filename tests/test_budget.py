@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Test script for agent run deadlines, step and token budgets, and hedged model calls."""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+from langchain.agents.middleware import ModelRequest
+from langchain_core.messages import HumanMessage
+
+# Add parent directory to path so we can import agents module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.budget import Budget, BudgetExceededError, BudgetMiddleware, LatencyTracker, latency_tracker, run_deadline, time_remaining
+from agents.cache import CachedAgent, ResultCache
+from agents.ichi import IchiAgent
+from agents.ratelimit import RateLimitScheduler, ScheduledChatOpenAI
+from agents.scripted_llm import ScriptedChatModel
+from agents.standard import StandardAgent
+from agents.synthetic import InvoiceGenerator
+
+OVERCHARGED = next(invoice.text for invoice in InvoiceGenerator(seed=9, fraud_rate=1.0, patterns=("inflated_rate",)).generate(5))
+CLEAN = InvoiceGenerator(seed=9, fraud_rate=0.0).invoice(0).text
+
+
+class SlowFirstModel(ScriptedChatModel):
+    """Scripted model whose first request hangs, as a stalled upstream call would."""
+    slow_seconds: float = 2.0
+
+    def _delay(self, messages):
+        with _calls_lock:
+            _calls[self.model_name] = _calls.get(self.model_name, 0) + 1
+            first = _calls[self.model_name] == 1
+        return self.slow_seconds if first else 0.01
+
+
+_calls: dict[str, int] = {}
+_calls_lock = threading.Lock()
+
+
+def standard(llm, **budget) -> StandardAgent:
+    return StandardAgent(model="scripted", llm=llm, fast_path=False, budget=Budget(hedge_percentile=None, **budget))
+
+def test_deadline_scope():
+    assert time_remaining() is None
+    with run_deadline(10):
+        with run_deadline(60):
+            # The sooner, enclosing deadline still applies
+            assert 9 < time_remaining() <= 10
+        with run_deadline(None):
+            assert time_remaining() <= 10
+    assert time_remaining() is None
+
+def test_step_and_token_budgets():
+    # One model turn calls the tools; the answer would need a second
+    response = standard(ScriptedChatModel(), max_steps=1).process(OVERCHARGED)
+    assert not response.is_valid and response.incomplete == "the limit of 1 model turns was reached"
+    assert "Problems found" in response.reason and response.confidence == 0.8 and response.catalog_version
+    assert standard(ScriptedChatModel(), max_steps=2).process(OVERCHARGED).incomplete is None
+
+    response = standard(ScriptedChatModel(), max_tokens=50).process(CLEAN)
+    assert not response.is_valid and response.confidence == 0.0
+    assert response.incomplete.startswith("the budget of 50 tokens was used up")
+
+def test_deadline_cuts_slow_model_calls():
+    started = time.perf_counter()
+    response = standard(ScriptedChatModel(latency=1.0), deadline_seconds=0.2).process(CLEAN)
+    assert time.perf_counter() - started < 0.8
+    assert response.incomplete == "the deadline passed while waiting for the model" and not response.is_valid
+
+    started = time.perf_counter()
+    ichi = IchiAgent(model="scripted", llm=ScriptedChatModel(latency=1.0), budget=Budget(deadline_seconds=0.2))
+    response = asyncio.run(ichi.aprocess(CLEAN))
+    assert time.perf_counter() - started < 0.8 and response.incomplete is not None
+
+def test_incomplete_verdicts_are_not_cached():
+    agent = standard(ScriptedChatModel(), max_steps=1)
+    cached = CachedAgent(agent, cache=ResultCache(":memory:"))
+    assert cached.process(OVERCHARGED).incomplete is not None
+    assert cached.cache.stats()["hits"] == 0 and cached.process(OVERCHARGED).incomplete is not None
+    assert cached.cache.stats()["hits"] == 0
+
+def test_hedged_model_calls():
+    for name in ("hedge-sync", "hedge-async"):
+        for _ in range(latency_tracker.min_samples):
+            latency_tracker.observe(name, 0.05)
+    hedged = latency_tracker.hedged
+    budget = Budget(hedge_percentile=95, min_hedge_seconds=0.1)
+
+    started = time.perf_counter()
+    response = IchiAgent(model="scripted", llm=SlowFirstModel(model_name="hedge-sync"), budget=budget).process(CLEAN)
+    # The duplicate sent after 0.1s answers long before the stalled first request
+    assert time.perf_counter() - started < 1.0 and response.incomplete is None
+    assert latency_tracker.hedged == hedged + 1
+
+    started = time.perf_counter()
+    agent = IchiAgent(model="scripted", llm=SlowFirstModel(model_name="hedge-async"), budget=budget)
+    assert asyncio.run(agent.aprocess(CLEAN)).incomplete is None
+    assert time.perf_counter() - started < 1.0
+    assert latency_tracker.hedged == hedged + 2 and latency_tracker.hedges_won >= 2
+
+def queued_model(tmp: str, sent: list) -> ScheduledChatOpenAI:
+    """A model whose rate-limit bucket is empty, so its next request waits about a second."""
+    def completion(request: httpx.Request) -> httpx.Response:
+        sent.append(time.perf_counter())
+        return httpx.Response(200, json={
+            "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "queued",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+        })
+
+    limiter = RateLimitScheduler(os.path.join(tmp, "ratelimit.sqlite3"), requests_per_minute=60, tokens_per_minute=0)
+    for _ in range(60):
+        limiter.acquire("queued", 1)
+    return ScheduledChatOpenAI(model="queued", api_key="test", scheduler=limiter,
+                               http_client=httpx.Client(transport=httpx.MockTransport(completion)))
+
+def test_rate_limit_wait_is_not_hedged():
+    with tempfile.TemporaryDirectory() as tmp:
+        sent = []
+        request = ModelRequest(model=queued_model(tmp, sent), messages=[HumanMessage("Is this invoice valid?")])
+        tracker = LatencyTracker(min_samples=1)
+        tracker.observe("queued", 0.01)
+        middleware = BudgetMiddleware(Budget(hedge_percentile=50, min_hedge_seconds=0.1), tracker)
+        started = time.perf_counter()
+        with run_deadline(5):
+            assert middleware.wrap_model_call(request, lambda r: r.model.invoke(r.messages)).content == "ok"
+        # The wait for the rate limit neither set off a hedge nor counted as model latency
+        assert time.perf_counter() - started > 0.5 and len(sent) == 1
+        assert tracker.hedged == 0 and tracker.percentile("queued", 100) < 0.5
+
+def test_abandoned_attempts_are_not_sent():
+    with tempfile.TemporaryDirectory() as tmp:
+        sent = []
+        llm = queued_model(tmp, sent)
+        request = ModelRequest(model=llm, messages=[HumanMessage("Is this invoice valid?")])
+        middleware = BudgetMiddleware(Budget(hedge_percentile=None), LatencyTracker())
+        with run_deadline(0.3):
+            try:
+                middleware.wrap_model_call(request, lambda r: r.model.invoke(r.messages))
+                raise AssertionError("the deadline should have passed")
+            except BudgetExceededError as e:
+                assert e.reason == "the deadline passed while waiting for the model"
+        # The attempt leaves the queue after the deadline, gives its slot back and sends nothing
+        time.sleep(1.5)
+        assert not sent and llm.scheduler.levels("queued")["requests"] > 1
+
+if __name__ == "__main__":
+    test_deadline_scope()
+    test_step_and_token_budgets()
+    test_deadline_cuts_slow_model_calls()
+    test_incomplete_verdicts_are_not_cached()
+    test_hedged_model_calls()
+    test_rate_limit_wait_is_not_hedged()
+    test_abandoned_attempts_are_not_sent()
+    print("All budget tests passed!")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Test script for the vectorized bulk claim validation engine."""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path so we can import agents module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.bulk import claims_verdict, validate_claims
+from agents.tools import nids_source
+
+CLAIMS = pd.DataFrame([
+    # item_code,            rate,    qty, amount,  state,      location_type, service_date
+    ("01_011_0107_1_1",      70.23,  4.0, 280.92,  "VIC",      "standard",    "26/10/2025"),
+    ("01_011_0107_1_1",      98.32,  1.0,  98.32,  "NT",       "remote",      "26/10/2025"),
+    ("01_011_0107_1_1",      95.50,  5.0, 477.50,  "NSW",      None,          "26/10/2025"),
+    ("01_019_0120_1_1",      45.00,  2.0,  90.00,  "Victoria", None,          "27/10/2025"),
+    ("99_999_9999_9_9",     150.00,  5.0, 750.00,  None,       None,          "24/10/2025"),
+    ("05_122409171_0105_1_2", 2500.0, 1.0, 2500.0, None,       None,          "27/10/2025"),
+    ("01_003_0107_1_1",     100.00,  1.0, 100.00,  None,       None,          "27/10/2025"),
+    ("01_020_0120_1_1",      58.03,  3.5, 210.00,  None,       None,          "01/01/2020"),
+], columns=["item_code", "rate", "quantity", "amount", "state", "location_type", "service_date"])
+
+
+def test_validate_claims_flags():
+    result, summary = validate_claims(CLAIMS)
+    assert result["is_valid"].tolist() == [True, True, False, False, False, False, True, False]
+    assert result["expected_price"].iloc[1] == 98.32
+    assert result["price_over_cap"].tolist()[2] and not result["price_over_cap"].tolist()[3]
+    assert result["price_mismatch"].iloc[3]
+    assert result["unknown_code"].iloc[4]
+    assert result["inactive_only"].iloc[5] and result["old_pricing"].iloc[5]
+    assert result["quotable"].iloc[6]
+    assert result["arithmetic_error"].iloc[7]
+    assert result["outside_effective_dates"].iloc[7]
+
+    assert summary["rows"] == 8 and summary["invalid_rows"] == 5
+    assert round(summary["overcharged_amount"], 2) == round((95.50 - 70.23) * 5, 2)
+
+def test_backdated_claims():
+    claims = pd.DataFrame({
+        "item_code": ["14_031_0127_8_3"] * 3,
+        "rate": [91.13] * 3, "quantity": [2.0] * 3, "amount": [182.26] * 3,
+        "location_type": ["remote"] * 3,
+        # In effect on the superseded price list; after it ended; before any known price list
+        "service_date": ["01/03/2025", "01/05/2026", "01/03/2018"],
+    })
+    result, _ = validate_claims(claims)
+    assert result["is_valid"].tolist() == [True, False, False]
+    assert result["expected_price"].iloc[0] == 91.13 and not result["old_pricing"].iloc[0]
+    assert result["old_pricing"].iloc[1] and result["outside_effective_dates"].iloc[1]
+    assert result["outside_effective_dates"].iloc[2]
+
+def test_claims_verdict():
+    response = claims_verdict(CLAIMS, max_listed=2)
+    assert not response.is_valid and response.is_using_old_pricing and response.catalog_version
+    assert response.reason.startswith("8 claim lines checked in bulk, 5 invalid")
+    assert "- Line 3 (01_011_0107_1_1): price mismatch" in response.reason
+    assert response.reason.endswith("... and 3 more invalid lines")
+    assert claims_verdict(CLAIMS.iloc[:2]).is_valid
+
+def test_validate_claims_throughput():
+    rng = np.random.default_rng(0)
+    n = 200_000
+    claims = pd.DataFrame({
+        "item_code": np.array(nids_source.codes)[rng.integers(0, len(nids_source), n)],
+        "rate": rng.uniform(10, 200, n).round(2),
+        "quantity": rng.integers(1, 8, n).astype(float),
+        "state": rng.choice(["VIC", "NSW", "QLD"], n),
+    })
+    start = time.perf_counter()
+    result, summary = validate_claims(claims)
+    elapsed = time.perf_counter() - start
+    print(f"Validated {n} claims in {elapsed:.3f}s ({n / elapsed:,.0f} rows/s)")
+    assert len(result) == n
+    # Generous bound so slow CI machines pass; typically well under a second
+    assert elapsed < 5
+
+if __name__ == "__main__":
+    test_validate_claims_flags()
+    test_backdated_claims()
+    test_claims_verdict()
+    test_validate_claims_throughput()
+    print("All bulk validation tests passed!")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Test script for the persistent agent verdict cache."""
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path so we can import agents module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.cache import CachedAgent, ResultCache, cache_key
+from agents.models import BaseAgent, ProcessResponse
+
+
+class CountingAgent(BaseAgent):
+    """Agent stub that records how many times it actually ran."""
+    def __init__(self, model: str):
+        self.model = model
+        self.calls = 0
+
+    def process(self, data: str) -> ProcessResponse:
+        self.calls += 1
+        return ProcessResponse(is_valid=True, reason=f"call {self.calls}")
+
+
+def test_cache_hits_and_persistence():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "verdicts.sqlite3")
+        agent = CountingAgent(model="gpt-4o-mini")
+        cached = CachedAgent(agent, cache=ResultCache(path))
+
+        first = cached.process("INVOICE  #1\n 01_011_0107_1_1   4.0  $70.23")
+        # Whitespace differences don't change the key
+        second = cached.process("INVOICE #1 01_011_0107_1_1 4.0 $70.23")
+        assert agent.calls == 1
+        assert first == second
+        assert cached.cache.stats()["hits"] == 1 and cached.cache.stats()["misses"] == 1
+
+        # A new cache on the same file (e.g. after a restart) serves from disk
+        restarted = CachedAgent(agent, cache=ResultCache(path))
+        assert restarted.process("INVOICE #1 01_011_0107_1_1 4.0 $70.23") == first
+        assert agent.calls == 1
+
+def test_cache_key_includes_agent_and_model():
+    text = "INVOICE #1"
+    assert cache_key(CountingAgent("gpt-4o-mini"), text) != cache_key(CountingAgent("gpt-4o"), text)
+
+def test_cache_eviction():
+    cache = ResultCache(":memory:", max_memory_entries=2, max_disk_entries=2, ttl_seconds=60)
+    for i in range(3):
+        cache.put(f"key-{i}", ProcessResponse(is_valid=True, reason=str(i)))
+    cache.evict()
+    assert cache.stats()["memory_entries"] == 2
+    assert cache.stats()["disk_entries"] == 2
+
+    expired = ResultCache(":memory:", ttl_seconds=0)
+    expired.put("key", ProcessResponse(is_valid=True, reason="stale"))
+    assert expired.get("key") is None
+
+if __name__ == "__main__":
+    test_cache_hits_and_persistence()
+    test_cache_key_includes_agent_and_model()
+    test_cache_eviction()
+    print("All cache tests passed!")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Test script for the cheap-model-first cascade agent."""
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path so we can import agents module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.cascade import CascadeAgent, CascadeStats
+from agents.models import ProcessResponse
+from agents.rules import RuleAssessment, RuleEngine, FastPathStats
+from agents.scripted_llm import ScriptedChatModel
+from agents.synthetic import InvoiceGenerator
+from agents.tracing import trace_invoice
+
+
+class ConfidentModel(ScriptedChatModel):
+    """Scripted model that is sure of its verdict even without tool results."""
+
+    def _result(self, messages, tools):
+        result = super()._result(messages, tools)
+        for call in result.generations[0].message.tool_calls:
+            if call["name"] == "ProcessResponse":
+                call["args"]["confidence"] = 0.95
+        return result
+
+
+def cascade(fast_path: bool = True, cheap=None) -> CascadeAgent:
+    scripted = ScriptedChatModel()
+    return CascadeAgent(model="scripted", llm=cheap or scripted, escalation_llm=scripted, fast_path=fast_path,
+                        stats=CascadeStats())
+
+def test_confidence_in_schema():
+    properties = ProcessResponse.model_json_schema()["properties"]
+    assert "confidence" in properties and "catalog_version" not in properties
+    assert ProcessResponse(is_valid=True, reason="ok").confidence is None
+
+def test_rule_assessment():
+    engine = RuleEngine(stats=FastPathStats())
+    clean = InvoiceGenerator(seed=5, fraud_rate=0.0).invoice(0)
+    assessment = engine.assess(clean.text)
+    assert assessment.response.is_valid and assessment.response.confidence == 1.0 and not assessment.concerns
+    deferred = [engine.assess(invoice.text) for invoice in
+                InvoiceGenerator(seed=5, fraud_rate=1.0, patterns=("wrong_location_tier",)).generate(20)]
+    assert any(a.response is None and a.concerns for a in deferred)
+    assert engine.assess("no line items here").concerns
+
+def test_escalation_reason():
+    agent = cascade()
+    concerns = RuleAssessment(lines=1, concerns=["Charged the Remote price"])
+    assert agent.escalation_reason(ProcessResponse(is_valid=True, reason="", confidence=0.95), None) is None
+    assert agent.escalation_reason(ProcessResponse(is_valid=True, reason=""), None) == "no_confidence"
+    assert agent.escalation_reason(ProcessResponse(is_valid=False, reason="", confidence=0.5), None) == "low_confidence"
+    assert agent.escalation_reason(ProcessResponse(is_valid=True, reason="", confidence=0.95), concerns) == "rules_disagree"
+    # A confident "fraudulent" agrees with the rules' concerns
+    assert agent.escalation_reason(ProcessResponse(is_valid=False, reason="", confidence=0.95), concerns) is None
+
+def test_tiers():
+    invoices = list(InvoiceGenerator(seed=6, fraud_rate=0.0).generate(3))
+    agent = cascade()
+    for invoice in invoices:
+        assert agent.process(invoice.text).is_valid
+    assert agent.stats.counts == {"rules": 3, "cheap": 0, "escalated": 0}
+
+    # Without the rules, the tool-less cheap answer is unsure and escalates to the tool-using agent
+    agent = cascade(fast_path=False)
+    with trace_invoice("test", registry=None) as trace:
+        response = agent.process(invoices[0].text)
+    assert response.is_valid and response.confidence == 0.9 and response.catalog_version
+    assert agent.stats.counts["escalated"] == 1 and agent.stats.escalations == {"low_confidence": 1}
+    assert {span.name for span in trace.spans if span.kind == "stage"} >= {"cheap", "escalated"}
+    assert any(span.name == "verify_line_items" for span in trace.spans)
+
+    agent = cascade(fast_path=False, cheap=ConfidentModel())
+    assert asyncio.run(agent.aprocess(invoices[1].text)).confidence == 0.95
+    assert agent.stats.counts["cheap"] == 1 and agent.stats.hit_rate("cheap") == 1.0
+
+    # The rules defer on a wrong location tier; a confident "valid" from the cheap tier is not trusted
+    tampered = next(invoice for invoice in InvoiceGenerator(seed=5, fraud_rate=1.0, patterns=("wrong_location_tier",)).generate(20)
+                    if RuleEngine(stats=FastPathStats()).assess(invoice.text).response is None)
+    agent = cascade(cheap=ConfidentModel())
+    agent.process(tampered.text)
+    assert agent.stats.escalations == {"rules_disagree": 1}
+    assert "escalated 1 (100.0%)" in agent.stats.summary()
+    assert agent.prompt_version != cascade(fast_path=False).prompt_version
+
+if __name__ == "__main__":
+    test_confidence_in_schema()
+    test_rule_assessment()
+    test_escalation_reason()
+    test_tiers()
+    print("All cascade tests passed!")
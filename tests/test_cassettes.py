@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Test script for recording and replaying chat model calls with cassettes."""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path so we can import agents module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from agents.cassette import Cassette, CassetteChatModel, CassetteMissError
+from agents.scripted_llm import ScriptedChatModel
+from agents.standard import StandardAgent
+from tests.test_agent_invoices import CASSETTE_PATH, INVOICE_TEST_CASES, run_agent_tests
+
+
+def agent_with(cassette: Cassette, mode: str, inner=None, **options) -> StandardAgent:
+    llm = CassetteChatModel(cassette=cassette, inner=inner, mode=mode, model_name="gpt-4o")
+    return StandardAgent(model="gpt-4o", fast_path=False, llm=llm, **options)
+
+def test_record_and_replay():
+    invoice = INVOICE_TEST_CASES[3]["content"]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cassette.json")
+        recorded = agent_with(Cassette(path), "record", ScriptedChatModel()).process(invoice)
+
+        cassette = Cassette(path)
+        assert len(cassette) == 2 and cassette.metadata["recorded_with"] == "scripted-chat"
+        replayed = agent_with(cassette, "replay").process(invoice)
+        assert replayed == recorded and cassette.hits == 2
+
+        # "auto" records only what is missing
+        agent_with(cassette, "auto", ScriptedChatModel()).process(INVOICE_TEST_CASES[4]["content"])
+        assert len(Cassette(path)) == 4 and cassette.recorded == 2
+
+def test_drift_is_reported():
+    invoice = INVOICE_TEST_CASES[3]["content"]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cassette.json")
+        agent_with(Cassette(path), "record", ScriptedChatModel()).process(invoice)
+
+        # A different prompt is a miss in replay mode, with the changed part named
+        try:
+            agent_with(Cassette(path), "replay", compact_prompt=False).process(invoice)
+            raise AssertionError("expected a cassette miss")
+        except CassetteMissError as e:
+            assert "message 1 (human message) changed" in str(e)
+
+        # Check mode keeps going on the closest recording and collects the drift
+        cassette = Cassette(path)
+        response = agent_with(cassette, "check", batch_tools=False).process(invoice)
+        assert response.is_valid is False
+        assert any("tool schemas changed" in drift.changes for drift in cassette.drift)
+
+def test_suite_replays_offline_in_parallel():
+    assert CASSETTE_PATH.exists()
+    start = time.perf_counter()
+    assert run_agent_tests("check", workers=8)
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {len(INVOICE_TEST_CASES)} cases in {elapsed:.2f}s")
+    assert elapsed < 60
+
+if __name__ == "__main__":
+    test_record_and_replay()
+    test_drift_is_reported()
+    test_suite_replays_offline_in_parallel()
+    print("All cassette tests passed!")
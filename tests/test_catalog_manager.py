@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Test script for hot reloading the NIDS catalogs."""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+# Add parent directory to path so we can import agents module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from agents.catalog_manager import CatalogManager, pin_catalogs
+from agents.ichi import IchiAgent
+from agents.models import ProcessResponse
+from agents.scripted_llm import ScriptedChatModel
+from agents.standard import StandardAgent
+from agents.tools import catalog_manager
+from tests.test_agent_invoices import INVOICE_TEST_CASES
+
+NEW_CODE = "99_999_9999_9_9"
+
+
+def _copy_catalogs(tmp: str) -> tuple[Path, Path]:
+    active, inactive = Path(tmp) / "active.csv", Path(tmp) / "inactive.csv"
+    shutil.copy("data/nids_source_active.csv", active)
+    shutil.copy("data/nids_source_inactive.csv", inactive)
+    return active, inactive
+
+def _add_item(csv_path: Path):
+    first_row = csv_path.read_text(encoding="utf-8").splitlines()[1]
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write("\n" + first_row.replace("01_002_0107_1_1", NEW_CODE))
+
+
+def test_reload_swaps_catalogs():
+    with tempfile.TemporaryDirectory() as tmp:
+        active, inactive = _copy_catalogs(tmp)
+        manager = CatalogManager(str(active), str(inactive), snapshot_dir=str(Path(tmp) / "snapshots"))
+        before = manager.current
+        assert manager.generation == 1 and not manager.check()
+
+        _add_item(active)
+        # The first poll only notices the change; the next one (file unchanged since) reloads
+        assert not manager.check()
+        assert manager.current is before
+        assert manager.check()
+        assert manager.generation == 2 and manager.reloads == 1
+        assert NEW_CODE in manager.current.active and NEW_CODE not in before.active
+        assert manager.current.version != before.version
+
+def test_pinned_catalogs_survive_a_swap():
+    with tempfile.TemporaryDirectory() as tmp:
+        active, inactive = _copy_catalogs(tmp)
+        manager = CatalogManager(str(active), str(inactive), snapshot_dir=str(Path(tmp) / "snapshots"))
+        with pin_catalogs(manager) as catalogs:
+            _add_item(active)
+            manager.reload()
+            with pin_catalogs(manager) as nested:
+                assert nested is catalogs
+            assert NEW_CODE not in catalogs.active
+        with pin_catalogs(manager) as catalogs:
+            assert NEW_CODE in catalogs.active
+
+def test_lookups_do_not_block_during_reload():
+    with tempfile.TemporaryDirectory() as tmp:
+        active, inactive = _copy_catalogs(tmp)
+        manager = CatalogManager(str(active), str(inactive), snapshot_dir=str(Path(tmp) / "snapshots"))
+        manager.current
+        lookups = 0
+        done = threading.Event()
+
+        def reload_repeatedly():
+            for _ in range(5):
+                manager.reload()
+            done.set()
+
+        thread = threading.Thread(target=reload_repeatedly)
+        thread.start()
+        while not done.is_set():
+            assert manager.current.active.get_price("01_002_0107_1_1", "ACT") == 78.81
+            lookups += 1
+        thread.join()
+        assert manager.generation == 6 and lookups > 5
+
+def test_failed_reload_keeps_serving():
+    with tempfile.TemporaryDirectory() as tmp:
+        active, inactive = _copy_catalogs(tmp)
+        manager = CatalogManager(str(active), str(inactive), snapshot_dir=str(Path(tmp) / "snapshots"))
+        before = manager.current
+        active.write_text("not,a,catalog\n1,2,3\n", encoding="utf-8")
+        assert not manager.check() and not manager.check()
+        assert manager.current is before and manager.reload_errors == 1
+
+def test_responses_record_catalog_version():
+    agent = StandardAgent(model="gpt-4o-mini")
+    response = agent.process(INVOICE_TEST_CASES[2]["content"])
+    assert response.catalog_version == catalog_manager.current.version
+    ichi = IchiAgent(model="scripted", llm=ScriptedChatModel())
+    assert ichi.process(INVOICE_TEST_CASES[2]["content"]).catalog_version == catalog_manager.current.version
+    # The model is never asked to fill the field in
+    assert "catalog_version" not in ProcessResponse.model_json_schema()["properties"]
+
+if __name__ == "__main__":
+    test_reload_swaps_catalogs()
+    test_pinned_catalogs_survive_a_swap()
+    test_lookups_do_not_block_during_reload()
+    test_failed_reload_keeps_serving()
+    test_responses_record_catalog_version()
+    print("All catalog manager tests passed!")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Test script for the description-vs-code consistency index."""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path so we can import agents module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.bulk import validate_claims
+from agents.descriptions import check_description, description_index
+from agents.rules import FastPathStats, RuleEngine, extract_line_items
+from agents.tools import check_description_matches_code, get_catalogs, verify_line_items
+
+
+def test_scores():
+    index = description_index(get_catalogs())
+    assert description_index(get_catalogs()) is index
+    scores = index.score(["Self-Care weekday", "House cleaning", "Self-Care weekday"],
+                         ["01_011_0107_1_1", "01_002_0107_1_1", "99_999_9999_9_9"])
+    assert scores[0] > 0.4 and scores[1] == 0.0 and np.isnan(scores[2])
+    matches = index.best_matches(["House cleaning"], k=3)[0]
+    assert matches[0].item_code == "01_020_0120_1_1" and len(matches) == 3
+    assert matches[0].score >= matches[1].score >= matches[2].score
+
+def test_check_description():
+    catalogs = get_catalogs()
+    assert check_description(catalogs, "01_002_0107_1_1", "House cleaning").mismatch
+    assert not check_description(catalogs, "01_020_0120_1_1", "House cleaning").mismatch
+    assert not check_description(catalogs, "01_011_0107_1_1", "Self-Care weekday").mismatch
+    assert check_description(catalogs, "99_999_9999_9_9", "House cleaning").score is None
+
+def test_tools_and_rule():
+    result = check_description_matches_code.invoke({"item_code": "01_002_0107_1_1", "description": "House cleaning"})
+    assert "does not match" in result and "01_020_0120_1_1" in result
+    result = verify_line_items.invoke({"items": [{"item_code": "01_020_0120_1_1", "price": 58.03,
+                                                  "description": "House cleaning"}]})
+    assert "Description: ✓" in result
+
+    line = "26/10/2025  01_002_0107_1_1  House cleaning   2.0   $78.81   $157.62"
+    items, _ = extract_line_items(line)
+    assert items[0].description == "House cleaning"
+    engine = RuleEngine(stats=FastPathStats())
+    # Correctly priced, but the description fits a cheaper item: left to the agent
+    assert engine.evaluate(line) is None
+    result = engine.evaluate("26/10/2025  01_020_0120_1_1  House cleaning   2.0   $58.03   $116.06")
+    assert result is not None and result.is_valid
+
+def test_bulk_description_mismatch():
+    claims = pd.DataFrame({
+        "item_code": ["01_002_0107_1_1", "01_020_0120_1_1", "01_011_0107_1_1", "01_011_0107_1_1"],
+        "description": ["House cleaning", "House cleaning", None, "Self-Care weekday"],
+        "rate": [78.81, 58.03, 70.23, 70.23],
+    })
+    result, summary = validate_claims(claims)
+    assert result["description_mismatch"].tolist() == [True, False, False, False]
+    # The flag is reported but does not by itself invalidate a correctly priced claim
+    assert result["is_valid"].all() and summary["description_mismatch"] == 1
+    assert "description_score" in validate_claims(claims.drop(columns="description"))[0]
+
+def test_bulk_throughput():
+    rng = np.random.default_rng(0)
+    index = description_index(get_catalogs())
+    n = 200_000
+    rows = rng.integers(0, len(index), n)
+    claims = pd.DataFrame({
+        "item_code": np.array(index.codes)[rows],
+        "description": np.array(index.names)[rng.integers(0, len(index), n)],
+        "rate": rng.uniform(10, 200, n).round(2),
+    })
+    start = time.perf_counter()
+    result, _ = validate_claims(claims)
+    elapsed = time.perf_counter() - start
+    print(f"Validated {n} described claims in {elapsed:.3f}s ({n / elapsed:,.0f} rows/s)")
+    assert result["description_score"].notna().all()
+    # Generous bound so slow CI machines pass
+    assert elapsed < 30
+
+if __name__ == "__main__":
+    test_scores()
+    test_check_description()
+    test_tools_and_rule()
+    test_bulk_description_mismatch()
+    test_bulk_throughput()
+    print("All description tests passed!")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Test script for file parsing helpers."""
+import sys
+from io import BytesIO
+from pathlib import Path
+
+# Add parent directory to path so we can import helpers module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from helpers import file_helper
+from helpers.file_helper import analysis_text, is_claim_sheet, parse_file
+from helpers.pdf_writer import pdf_bytes
+from helpers.spreadsheet_helper import detect_claim_columns, iter_claim_chunks
+
+
+def make_pdf(pages: list[str]) -> BytesIO:
+    """Build a minimal PDF with one line of Helvetica text per page."""
+    buffer = BytesIO(pdf_bytes([[text] for text in pages], font="Helvetica", font_size=12))
+    buffer.name = "invoice.pdf"
+    return buffer
+
+
+def test_pdf_returns_full_text_and_preview():
+    pages = [f"Page {n} line item 01_011_0107_1_1 " + "x" * 200 for n in range(1, 9)]
+    result = parse_file(make_pdf(pages))
+    assert result["type"] == "pdf"
+    assert result["pages"] == 8
+    # Nothing is truncated for analysis; the preview is kept separately
+    assert "Page 8 line item" in result["data"]
+    assert len(result["data"]) > 1000
+    assert len(result["preview"]) == 1000
+    assert [t["page"] for t in result["page_timings"]] == list(range(1, 9))
+
+def test_large_pdf_pages_extracted_in_parallel_keep_order(monkeypatch):
+    monkeypatch.setattr(file_helper, "PARALLEL_PAGE_THRESHOLD", 4)
+    monkeypatch.setattr(file_helper, "PAGES_PER_TASK", 3)
+    pages = [f"Page {n}" for n in range(1, 11)]
+    result = parse_file(make_pdf(pages), parallel_pages=True)
+    assert result["data"].split("\n") == pages
+    # Parallel extraction is opt-in: threaded callers (the API, the web app) parse serially
+    monkeypatch.setattr(file_helper, "ProcessPoolExecutor", None)
+    result = parse_file(make_pdf(pages))
+    assert result["data"].split("\n") == pages
+
+def test_text_keeps_full_content():
+    upload = BytesIO(("INVOICE " * 500).encode())
+    upload.name = "invoice.txt"
+    result = parse_file(upload)
+    assert len(result["data"]) == 4000
+    assert len(result["preview"]) == 1000
+
+def make_claims_csv(rows: int) -> BytesIO:
+    lines = ["Service Date,Support Item Number,Description,Hours,Unit Price,Total,Participant State"]
+    for n in range(rows):
+        lines.append(f'{n % 28 + 1:02d}/10/2025,01_011_0107_1_1,Self-Care,{n % 5 + 1},$70.23,"$1,000.00",VIC')
+    buffer = BytesIO("\n".join(lines).encode())
+    buffer.name = "claims.csv"
+    return buffer
+
+def test_detect_claim_columns():
+    mapping = detect_claim_columns(["Service Date", "Support Item Number", "Support Item Name", "Qty", "Rate ($)", "Amount"])
+    assert mapping == {
+        "item_code": "Support Item Number",
+        "description": "Support Item Name",
+        "quantity": "Qty",
+        "rate": "Rate ($)",
+        "amount": "Amount",
+        "service_date": "Service Date",
+    }
+
+def test_csv_reads_every_claim_line():
+    result = parse_file(make_claims_csv(5000))
+    table = result["data"]
+    assert result["rows"] == 5000 and len(table) == 5000
+    assert len(result["preview"]) == 20
+    assert table["rate"].iloc[0] == 70.23 and table["amount"].iloc[0] == 1000.0
+    assert table["quantity"].sum() == sum(n % 5 + 1 for n in range(5000))
+    assert table["service_date"].iloc[0].day == 1 and table["service_date"].iloc[0].month == 10
+    assert table["state"].iloc[0] == "VIC"
+    assert is_claim_sheet(result)
+    # An agent only ever sees the first rows of a table
+    text = analysis_text(result)
+    assert text.startswith("item_code,description,quantity,rate,amount")
+    assert len(text.splitlines()) == file_helper.AGENT_TABLE_ROWS + 2 and text.endswith("4800 more rows not shown\n")
+
+def test_claims_are_streamed_in_chunks():
+    chunks = [chunk for chunk, _ in iter_claim_chunks(make_claims_csv(2500), "csv", chunk_rows=1000)]
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+
+def test_excel_claims(tmp_path):
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["Date", "Item Code", "Qty", "Rate", "Amount"])
+    for n in range(30):
+        sheet.append(["26/10/2025", "01_020_0120_1_1", 2, 58.03, 116.06])
+    path = tmp_path / "claims.xlsx"
+    workbook.save(path)
+
+    with open(path, "rb") as f:
+        result = parse_file(f)
+    assert result["type"] == "excel" and result["rows"] == 30
+    assert result["data"]["item_code"].eq("01_020_0120_1_1").all()
+    assert result["data"]["amount"].eq(116.06).all()
+
+def test_sheet_without_item_codes_is_kept_as_is():
+    upload = BytesIO(b"name,value\na,1\nb,2\n")
+    upload.name = "other.csv"
+    result = parse_file(upload)
+    assert result["rows"] == 2 and result["columns"] == {} and not is_claim_sheet(result)
+
+if __name__ == "__main__":
+    test_pdf_returns_full_text_and_preview()
+    test_text_keeps_full_content()
+    test_detect_claim_columns()
+    test_csv_reads_every_claim_line()
+    test_claims_are_streamed_in_chunks()
+    test_sheet_without_item_codes_is_kept_as_is()
+    print("All file helper tests passed!")
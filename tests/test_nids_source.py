@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Test script for the compact NIDS catalog index."""
+import sys
+from pathlib import Path
+
+# Add parent directory to path so we can import agents module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.catalog import PriceHistory, to_yyyymmdd
+from agents.models import NIDSSource, PRICE_COLUMNS
+
+def test_nids_source():
+    active = NIDSSource("data/nids_source_active.csv")
+    inactive = NIDSSource("data/nids_source_inactive.csv")
+
+    # Index lookups
+    assert active.validate_item("01_002_0107_1_1")
+    assert not active.validate_item("99_999_9999_9_9")
+    assert active.row_id("01_002_0107_1_1") == 0
+    assert len(active.index) == len(set(active.codes))
+
+    # Prices are parsed once into float arrays, one per region column
+    assert set(active.prices) == set(PRICE_COLUMNS)
+    assert active.get_price("01_002_0107_1_1", "ACT") == 78.81
+    assert active.get_price("01_002_0107_1_1", "Very Remote") == 118.22
+
+    # Thousands separators and currency symbols are handled
+    assert active.get_price("01_027_0115_1_1", "ACT") == 7040.24
+    assert inactive.get_price("14_031_0127_8_3", "Remote") == 91.13
+
+    # Quotable items have no fixed price and are flagged explicitly
+    assert active.get_price("01_003_0107_1_1", "ACT") is None
+    assert active.is_quotable("01_003_0107_1_1")
+    assert not active.is_quotable("01_002_0107_1_1")
+    print("All NIDS source checks passed!")
+
+def test_price_history():
+    active = NIDSSource("data/nids_source_active.csv")
+    inactive = NIDSSource("data/nids_source_inactive.csv")
+    history = PriceHistory([active, inactive])
+
+    assert to_yyyymmdd("26/10/2025") == 20251026
+    assert to_yyyymmdd("2025-10-26") == 20251026
+    assert to_yyyymmdd("20251026") == 20251026
+    assert to_yyyymmdd("not a date") is None
+
+    # Current item: covered from its start date onwards, nothing before
+    version = history.lookup("01_011_0107_1_1", "26/10/2025")
+    assert version.source is active and version.price("ACT") == 70.23
+    assert history.lookup("01_011_0107_1_1", "05/10/2018") is None
+
+    # Superseded item: only priced while the old list was in effect
+    version = history.lookup("14_031_0127_8_3", "2025-03-01")
+    assert version.source is inactive and version.price("Remote") == 91.13
+    assert history.lookup("14_031_0127_8_3", "2026-05-01") is None
+    assert version.period == "2024-07-01 to 2026-03-31"
+
+if __name__ == "__main__":
+    test_nids_source()
+    test_price_history()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Test script for compact, structured invoice prompts."""
+import os
+import sys
+from pathlib import Path
+
+# Add parent directory to path so we can import agents module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from agents.ichi import IchiAgent
+from agents.preprocess import PromptStats, compact_invoice, count_tokens, prepare_invoice
+from agents.standard import StandardAgent
+from main import real_data
+from tests.test_agent_invoices import INVOICE_TEST_CASES
+
+
+def test_compact_invoice():
+    compact = compact_invoice(INVOICE_TEST_CASES[1]["content"])
+    assert compact.facts.invoice_number == "INV-2025-1293"
+    assert compact.facts.location_type == "remote" and compact.facts.state == "NT"
+    assert compact.facts.totals == [789.35]
+    text = compact.render()
+    assert "01_011_0107_1_1" in text and "98.32" in text and "01_019_0120_1_1" in text
+    # Names and identifiers that don't affect validation are left out
+    assert "ABN" not in text and "James Cooper" not in text
+
+def test_prepare_invoice_reduces_tokens():
+    stats = PromptStats()
+    prepared = prepare_invoice(real_data, stats=stats)
+    print(f"{prepared.raw_tokens} -> {prepared.prompt_tokens} tokens ({prepared.reduction:.1%} reduction)")
+    assert prepared.compact and prepared.prompt_tokens < prepared.raw_tokens
+    assert "BSB" not in prepared.text and "01_020_0120_1_1 | House cleaning | 3 | 41.43 | 124.29" in prepared.text
+
+    # Without line items there is nothing to compact: the raw text is sent as is
+    fallback = prepare_invoice("Please find our quote attached.", stats=stats)
+    assert not fallback.compact and fallback.text == "Please find our quote attached."
+    assert stats.invoices == 2 and stats.compacted == 1 and stats.reduction > 0
+    assert count_tokens("hello world") > 0
+
+def test_agents_send_compact_prompts():
+    invoice = INVOICE_TEST_CASES[0]["content"]
+    for agent in (StandardAgent(model="gpt-4o-mini"), IchiAgent(model="gpt-4o-mini")):
+        content = agent._messages(invoice)["messages"][0]["content"]
+        assert "Line items (service date" in content and "Invoice facts:" in content
+    raw = StandardAgent(model="gpt-4o-mini", compact_prompt=False)
+    assert invoice in raw._messages(invoice)["messages"][0]["content"]
+    assert raw.prompt_version != StandardAgent(model="gpt-4o-mini").prompt_version
+
+if __name__ == "__main__":
+    test_compact_invoice()
+    test_prepare_invoice_reduces_tokens()
+    test_agents_send_compact_prompts()
+    print("All preprocessing tests passed!")
@@ -6,7 +6,7 @@ from pathlib import Path
 # Add parent directory to path so we can import agents module
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from agents.tools import check_nids_item_exists, check_nids_item_pricing, check_if_using_old_pricing
+from agents.tools import check_nids_item_exists, check_nids_item_pricing, check_nids_item_pricing_on_date, check_if_using_old_pricing, verify_line_items
 
 def test_tools():
     print("=" * 80)
@@ -78,6 +78,40 @@ def test_tools():
     })
     print(f"   Result: {result}")
 
+    # Test 10: Verify a whole invoice in one batched call
+    print("\n10. Testing verify_line_items - Batch of line items:")
+    result = verify_line_items.invoke({
+        "items": [
+            {"item_code": "01_002_0107_1_1", "price": 78.81, "location_type": "standard"},
+            {"item_code": "99_999_9999_9_9", "price": 150.00},
+            {"item_code": "05_122409171_0105_1_2", "price": 2500.00},
+        ]
+    })
+    print(f"   Result:\n{result}")
+    assert "Line 1 - 01_002_0107_1_1" in result and "MATCHES" in result
+    assert "99_999_9999_9_9 is NOT found" in result
+    assert "ONLY exists in the inactive database" in result
+
+    # Test 11: Backdated invoice priced against the list in effect on the service date
+    print("\n11. Testing check_nids_item_pricing_on_date - Superseded price list:")
+    result = check_nids_item_pricing_on_date.invoke({
+        "item_code": "14_031_0127_8_3",
+        "price": 65.09,
+        "service_date": "01/03/2025",
+        "location_type": "standard"
+    })
+    print(f"   Result: {result}")
+    assert "MATCHES" in result and "superseded" in result
+
+    # Test 12: A backdated line is not reported as using old pricing
+    print("\n12. Testing verify_line_items - Backdated line:")
+    result = verify_line_items.invoke({
+        "items": [{"item_code": "14_031_0127_8_3", "price": 65.09, "location_type": "standard", "service_date": "01/03/2025"}]
+    })
+    print(f"   Result:\n{result}")
+    assert "MATCHES" in result and "old price applies" in result
+    assert "old pricing should NOT be used" not in result and "OUTDATED" not in result
+
     print("\n" + "=" * 80)
     print("All tests completed!")
     print("=" * 80)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Test script for concurrent batch processing with process_many."""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path so we can import agents module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.models import BaseAgent, ProcessResponse, run_many
+
+
+class SlowAgent(BaseAgent):
+    """Agent stub that waits on simulated network I/O."""
+    def __init__(self, model: str, delay: float = 0.05):
+        self.model = model
+        self.delay = delay
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def process(self, data: str) -> ProcessResponse:
+        time.sleep(self.delay)
+        return ProcessResponse(is_valid=data != "bad", reason=data)
+
+    async def aprocess(self, data: str) -> ProcessResponse:
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay * (1 if data != "slow" else 3))
+        self.in_flight -= 1
+        if data == "boom":
+            raise RuntimeError("upstream error")
+        return ProcessResponse(is_valid=data != "bad", reason=data)
+
+
+def test_process_many_keeps_order_and_bounds_concurrency():
+    agent = SlowAgent(model="stub")
+    invoices = [f"invoice-{i}" for i in range(40)] + ["slow"]
+    start = time.perf_counter()
+    results = run_many(agent, invoices, concurrency=10)
+    elapsed = time.perf_counter() - start
+
+    assert [r.reason for r in results] == invoices
+    assert agent.peak_in_flight == 10
+    # 41 invoices at 10 at a time is ~5 rounds, far below the 2.15s serial time
+    assert elapsed < 1.0
+
+def test_process_many_can_collect_exceptions():
+    results = run_many(SlowAgent(model="stub"), ["ok", "boom", "bad"], return_exceptions=True)
+    assert results[0].is_valid
+    assert isinstance(results[1], RuntimeError)
+    assert not results[2].is_valid
+
+def test_default_aprocess_runs_process_in_a_thread():
+    class SyncOnlyAgent(BaseAgent):
+        def __init__(self, model: str):
+            self.model = model
+
+        def process(self, data: str) -> ProcessResponse:
+            time.sleep(0.05)
+            return ProcessResponse(is_valid=True, reason=data)
+
+    start = time.perf_counter()
+    results = run_many(SyncOnlyAgent(model="stub"), ["a", "b", "c", "d"], concurrency=4)
+    assert [r.reason for r in results] == ["a", "b", "c", "d"]
+    assert time.perf_counter() - start < 0.15
+
+if __name__ == "__main__":
+    test_process_many_keeps_order_and_bounds_concurrency()
+    test_process_many_can_collect_exceptions()
+    test_default_aprocess_runs_process_in_a_thread()
+    print("All process_many tests passed!")
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Test script for the shared rate-limit scheduler."""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+# Add parent directory to path so we can import agents module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "dummy")
+
+from agents.ratelimit import RateLimitScheduler, ScheduledChatOpenAI, current_lane, use_lane
+from agents.registry import get_http_async_client, get_http_client, make_llm
+from agents.tracing import trace_invoice
+
+
+def scheduler(directory: str, **limits) -> RateLimitScheduler:
+    return RateLimitScheduler(os.path.join(directory, "ratelimit.sqlite3"), **limits)
+
+def test_request_bucket():
+    with tempfile.TemporaryDirectory() as tmp:
+        limiter = scheduler(tmp, requests_per_minute=120, tokens_per_minute=0)
+        started = time.perf_counter()
+        for _ in range(120):
+            limiter.acquire("gpt-4o-mini", 10)
+        assert time.perf_counter() - started < 2
+        # The bucket is empty; it refills at 2 requests per second
+        started = time.perf_counter()
+        limiter.acquire("gpt-4o-mini", 10)
+        assert 0.3 < time.perf_counter() - started < 1.5
+        # Models have their own buckets
+        started = time.perf_counter()
+        limiter.acquire("gpt-4o", 10)
+        assert time.perf_counter() - started < 0.3
+
+def test_token_bucket_and_settle():
+    with tempfile.TemporaryDirectory() as tmp:
+        limiter = scheduler(tmp, requests_per_minute=0, tokens_per_minute=6000)
+        limiter.acquire("m", 4000)
+        assert 1900 < limiter.levels("m")["tokens"] < 2100
+        # The call used fewer tokens than estimated: the difference is given back
+        limiter.settle("m", 4000, 1000)
+        assert limiter.levels("m")["tokens"] > 4900
+        # A request larger than the bucket waits for a full bucket instead of forever
+        limiter = scheduler(tmp, requests_per_minute=0, tokens_per_minute=600_000)
+        limiter.acquire("n", 6000)
+        started = time.perf_counter()
+        limiter.acquire("n", 10_000_000)
+        assert 0.3 < time.perf_counter() - started < 3
+        assert limiter.levels("n")["tokens"] < 10_000
+
+def test_interactive_overtakes_batch():
+    with tempfile.TemporaryDirectory() as tmp:
+        # Separate schedulers stand in for separate worker processes sharing the store
+        workers = [scheduler(tmp, requests_per_minute=120, tokens_per_minute=0) for _ in range(3)]
+        for _ in range(120):
+            workers[0].acquire("m", 1)
+        order = []
+
+        def call(worker: RateLimitScheduler, lane: str, name: str):
+            with use_lane(lane):
+                worker.acquire("m", 1)
+            order.append(name)
+
+        batch = [threading.Thread(target=call, args=(workers[1], "batch", f"batch-{i}")) for i in range(2)]
+        for thread in batch:
+            thread.start()
+            time.sleep(0.05)
+        interactive = threading.Thread(target=call, args=(workers[2], "interactive", "interactive"))
+        interactive.start()
+        for thread in batch + [interactive]:
+            thread.join(10)
+        assert order == ["interactive", "batch-0", "batch-1"], order
+        assert workers[1].summary()["batch"]["requests"] == 2 and workers[1].summary()["batch"]["waited_seconds"] > 0.5
+        assert current_lane() == "interactive"
+
+def test_dead_waiters_drop_out():
+    with tempfile.TemporaryDirectory() as tmp:
+        limiter = RateLimitScheduler(os.path.join(tmp, "ratelimit.sqlite3"), 120, 0, waiter_timeout=0.3)
+        # A waiter whose process died while at the head of the queue
+        limiter._db.execute("INSERT INTO waiters VALUES ('dead', 'm', 0, 0, ?)", (time.time(),))
+        started = time.perf_counter()
+        with use_lane("batch"):
+            asyncio.run(limiter.aacquire("m", 1))
+        assert 0.2 < time.perf_counter() - started < 2
+
+def test_async_polls_do_not_block_the_loop():
+    with tempfile.TemporaryDirectory() as tmp:
+        limiter = scheduler(tmp, requests_per_minute=120, tokens_per_minute=0)
+        # Another process holds the store's write lock
+        other = sqlite3.connect(limiter.path, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")
+
+        async def main():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            clock = asyncio.ensure_future(ticker())
+            acquire = asyncio.ensure_future(limiter.aacquire("m", 1))
+            await asyncio.sleep(0.5)
+            assert not acquire.done() and ticks > 20, ticks
+            other.execute("COMMIT")
+            await acquire
+            clock.cancel()
+
+        asyncio.run(main())
+        assert limiter.summary()["interactive"]["requests"] == 1
+
+def test_scheduled_chat_model():
+    def completion(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={
+            "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+            "usage": {"prompt_tokens": 20, "completion_tokens": 5, "total_tokens": 25},
+        })
+
+    assert isinstance(make_llm("gpt-4o-mini"), ScheduledChatOpenAI)
+    with tempfile.TemporaryDirectory() as tmp:
+        limiter = scheduler(tmp, requests_per_minute=60, tokens_per_minute=10_000)
+        llm = ScheduledChatOpenAI(model="gpt-4o-mini", api_key="test", scheduler=limiter,
+                                  http_client=httpx.Client(transport=httpx.MockTransport(completion)))
+        started = time.perf_counter()
+        with trace_invoice("test", registry=None) as trace:
+            assert llm.invoke("Is this invoice valid?").content == "ok"
+        levels = limiter.levels("gpt-4o-mini")
+        elapsed = time.perf_counter() - started
+        # One request spent, and the token estimate settled to the 25 tokens reported, plus what
+        # refilled meanwhile (a request and 10000/60 tokens per second)
+        assert 59 - 0.01 <= levels["requests"] <= 59 + elapsed + 0.01
+        assert 9975 - 1 <= levels["tokens"] <= 9975 + elapsed * 10_000 / 60 + 1
+        assert any(span.name == "rate_limit" for span in trace.spans)
+
+def test_model_clients_share_connection_pools():
+    llm, other = make_llm("gpt-4o-mini"), make_llm("gpt-4o")
+    assert llm.http_client is other.http_client is get_http_client()
+    assert llm.http_async_client is other.http_async_client is get_http_async_client()
+    transport = get_http_async_client()._transport
+
+    async def pools():
+        return transport._pool(), transport._pool()
+
+    # One async pool per event loop, since asyncio.run starts a new loop each time
+    (first, again), (second, _) = asyncio.run(pools()), asyncio.run(pools())
+    assert first is again and first is not second
+
+if __name__ == "__main__":
+    test_request_bucket()
+    test_token_bucket_and_settle()
+    test_interactive_overtakes_batch()
+    test_dead_waiters_drop_out()
+    test_async_polls_do_not_block_the_loop()
+    test_scheduled_chat_model()
+    test_model_clients_share_connection_pools()
+    print("All rate limit tests passed!")
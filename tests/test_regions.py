@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Test script for state resolution and the items x regions price matrix."""
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path so we can import agents module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.bulk import validate_claims
+from agents.models import NIDSSource, PRICE_COLUMNS
+from agents.regions import price_column_for, resolve_state
+from agents.tools import nids_source
+
+# Catalog where one item has a different price in VIC (as in the older state-loaded price guides)
+CSV = (
+    "﻿Support Item Number,Support Item Name,Unit,Quote,Start date,End Date, ACT , NSW , NT , QLD , SA , TAS , VIC , WA , Remote , Very Remote \n"
+    "01_011_0107_1_1,Assistance With Self-Care Activities - Standard - Weekday Daytime,H,No,20250701,99991231,"
+    " 70.23 , 70.23 , 70.23 , 70.23 , 70.23 , 70.23 , 72.10 , 70.23 , 98.32 , 105.35 \n"
+)
+
+
+def test_resolve_state():
+    assert resolve_state("Service Location: Remote Area (Katherine, NT)") == "NT"
+    assert resolve_state("Participant: Jane Doe\n12 Smith St\nMelbourne Vic 3030") == "VIC"
+    assert resolve_state("Richmond 3121") == "VIC"
+    assert resolve_state("Lives in Western Australia") == "WA"
+    # The NDIA's Canberra address is not where the participant lives
+    assert resolve_state("National Disability Insurance Agency\nGPO Box 700 Canberra ACT 2601\nBrisbane QLD 4000") == "QLD"
+    # Ordinary words and dates are not states or postcodes
+    assert resolve_state("Provided under the Privacy Act\nDate: 28 October 2025") is None
+    assert resolve_state("anything", explicit="new south wales") == "NSW"
+
+
+def test_price_column_for():
+    assert price_column_for("standard") == "ACT"
+    assert price_column_for("standard", "vic") == "VIC"
+    assert price_column_for("remote", "VIC") == "Remote"
+    assert price_column_for("very_remote") == "Very Remote"
+
+
+def test_state_prices():
+    assert nids_source.price_matrix.shape == (len(nids_source), len(PRICE_COLUMNS))
+    assert np.shares_memory(nids_source.prices["VIC"], nids_source.price_matrix)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "catalog.csv"
+        path.write_text(CSV, encoding="utf-8")
+        source = NIDSSource(str(path))
+    assert source.get_price("01_011_0107_1_1", "VIC") == 72.10
+    assert source.get_price("01_011_0107_1_1", "NSW") == 70.23
+
+    claims = pd.DataFrame({"item_code": ["01_011_0107_1_1"] * 3, "rate": [72.10, 72.10, 70.23],
+                           "state": ["Victoria", "NSW", None]})
+    result, _ = validate_claims(claims, active=source)
+    assert result["expected_price"].tolist() == [72.10, 70.23, 70.23]
+    assert result["price_mismatch"].tolist() == [False, True, False]
+
+
+if __name__ == "__main__":
+    test_resolve_state()
+    test_price_column_for()
+    test_state_prices()
+    print("All region tests passed!")
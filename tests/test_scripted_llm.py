@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Test script for the scripted chat model and the offline agent benchmark."""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+# Add parent directory to path so we can import agents module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from agents.ichi import IchiAgent
+from agents.models import process_many
+from agents.scripted_llm import ScriptedChatModel
+from agents.standard import StandardAgent
+from agents.tracing import trace_invoice
+from scripts.bench_agents_offline import main as run_benchmark
+from tests.test_agent_invoices import INVOICE_TEST_CASES
+
+
+def test_standard_agent_loop_offline():
+    llm = ScriptedChatModel(input_tokens=500, output_tokens=40)
+    for batch_tools in (True, False):
+        agent = StandardAgent(model="gpt-4o-mini", llm=llm, fast_path=False, batch_tools=batch_tools)
+        for case in INVOICE_TEST_CASES:
+            with trace_invoice("StandardAgent", registry=None) as trace:
+                response = agent.process(case["content"])
+            assert response.is_valid == case["expected_valid"], case["name"]
+            assert trace.steps == 2 and trace.tool_calls >= 1 and trace.input_tokens == 1000
+
+def test_async_and_ichi_offline():
+    agent = StandardAgent(model="gpt-4o-mini", llm=ScriptedChatModel(latency=0.01), fast_path=False)
+    invoices = [case["content"] for case in INVOICE_TEST_CASES]
+    results = asyncio.run(process_many(agent, invoices, concurrency=5))
+    assert [r.is_valid for r in results] == [case["expected_valid"] for case in INVOICE_TEST_CASES]
+
+    # Without verification tools the scripted model answers straight away
+    response = IchiAgent(model="gpt-4o-mini", llm=ScriptedChatModel()).process(INVOICE_TEST_CASES[0]["content"])
+    assert response.is_valid
+
+def test_benchmark_runs():
+    run_benchmark(["--agents", "standard,ichi", "--concurrency", "1,4", "--synthetic", "5", "--memory"])
+    run_benchmark(["--agents", "standard-single", "--concurrency", "2", "--synthetic", "0", "--mode", "threads"])
+
+if __name__ == "__main__":
+    test_standard_agent_loop_offline()
+    test_async_and_ichi_offline()
+    test_benchmark_runs()
+    print("All scripted model tests passed!")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Test script for the asynchronous /analyze job API."""
+import io
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add parent directory to path so we can import the server module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+import server
+from helpers.job_queue import JobQueue
+from tests.test_agent_invoices import INVOICE_TEST_CASES
+
+
+def wait_for(client, job_id, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        body = client.get(f"/jobs/{job_id}").get_json()
+        if body["status"] in ("done", "failed"):
+            return body
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_analyze_text_and_file():
+    client = server.app.test_client()
+
+    # Clear-cut invoices are resolved by the rule engine, so no model call is made
+    response = client.post("/analyze", json={"text": INVOICE_TEST_CASES[2]["content"]})
+    assert response.status_code == 202
+    job = wait_for(client, response.get_json()["job_id"])
+    assert job["status"] == "done"
+    assert job["result"]["is_valid"] is False
+    assert job["timing"]["run_seconds"] is not None
+
+    upload = io.BytesIO(INVOICE_TEST_CASES[0]["content"].encode())
+    response = client.post("/analyze", data={"file": (upload, "invoice.txt")}, content_type="multipart/form-data")
+    assert response.status_code == 202
+    job = wait_for(client, response.get_json()["job_id"])
+    assert job["result"]["is_valid"] is True
+    assert "parsing" in {span["name"] for span in job["trace"]["spans"]}
+
+def test_claim_sheet_is_validated_in_bulk():
+    client = server.app.test_client()
+    lines = ["Service Date,Support Item Number,Hours,Unit Price,Total"]
+    lines += ["26/10/2025,01_011_0107_1_1,2,$70.23,$140.46"] * 3000 + ["26/10/2025,99_999_9999_9_9,1,$150.00,$150.00"]
+    upload = io.BytesIO("\n".join(lines).encode())
+    response = client.post("/analyze", data={"file": (upload, "claims.csv")}, content_type="multipart/form-data")
+    job = wait_for(client, response.get_json()["job_id"])
+    # Thousands of lines are checked against the catalogs, not sent to the model in one prompt
+    assert job["result"]["is_valid"] is False
+    assert job["result"]["reason"].startswith("3001 claim lines checked in bulk, 1 invalid")
+    assert "bulk_validation" in {span["name"] for span in job["trace"]["spans"]}
+
+def test_upload_parsing_is_traced():
+    # Outside the job queue the upload still opens its own trace, so parsing is recorded
+    def parsed_count():
+        return server.metrics.stage_seconds.series().get(("parsing",), ([0], 0.0))[0][-1]
+
+    before = parsed_count()
+    agent = server.get_agent(server.StandardAgent)
+    assert server._analyze_upload(agent, "invoice.txt", INVOICE_TEST_CASES[0]["content"].encode()).is_valid
+    assert parsed_count() == before + 1
+
+def test_analyze_validation_and_missing_job():
+    client = server.app.test_client()
+    assert client.post("/analyze", json={}).status_code == 400
+    assert client.post("/analyze", json={"text": "x", "agent": "nope"}).status_code == 400
+    # Unknown models and lanes are rejected before any agent is built for them
+    built = dict(server.agent_registry._agents)
+    assert client.post("/analyze", json={"text": "x", "model": "gpt-made-up"}).status_code == 400
+    assert client.post("/analyze", json={"text": "x", "lane": "nope"}).status_code == 400
+    assert client.post("/analyze", json={"model": "gpt-4o"}).status_code == 400
+    assert server.agent_registry._agents == built
+    assert client.get("/jobs/does-not-exist").status_code == 404
+
+def test_analyze_backpressure():
+    client = server.app.test_client()
+    original = server.job_queue
+    server.job_queue = JobQueue(workers=1, max_pending=1)
+    release = threading.Event()
+    try:
+        server.job_queue.submit("standard", release.wait)
+        response = client.post("/analyze", json={"text": "INVOICE"})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "5"
+    finally:
+        release.set()
+        server.job_queue = original
+
+if __name__ == "__main__":
+    test_analyze_text_and_file()
+    test_upload_parsing_is_traced()
+    test_claim_sheet_is_validated_in_bulk()
+    test_analyze_validation_and_missing_job()
+    test_analyze_backpressure()
+    print("All server tests passed!")
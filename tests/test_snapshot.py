@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Test script for compiled, memory-mapped catalog snapshots."""
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path so we can import agents module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.models import NIDSSource
+from agents.snapshot import build, load_catalog, snapshot_path
+
+ACTIVE_CSV = "data/nids_source_active.csv"
+
+
+def test_snapshot_matches_csv():
+    csv_source = NIDSSource(ACTIVE_CSV)
+    with tempfile.TemporaryDirectory() as tmp:
+        build("data", tmp)
+        assert snapshot_path(ACTIVE_CSV, csv_source.version, tmp).exists()
+        source = load_catalog(ACTIVE_CSV, tmp)
+
+        assert isinstance(source.price_matrix, np.memmap) and not source.price_matrix.flags.writeable
+        assert source.version == csv_source.version
+        assert source.codes == csv_source.codes and source.index == csv_source.index
+        np.testing.assert_array_equal(source.price_matrix, csv_source.price_matrix)
+        np.testing.assert_array_equal(source.quotable, csv_source.quotable)
+        assert source.get_price("01_002_0107_1_1", "ACT") == 78.81
+        assert source.get_price("01_003_0107_1_1", "ACT") is None
+        assert source.is_quotable("01_003_0107_1_1")
+
+def test_stale_snapshot_falls_back_to_csv():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "nids_source_active.csv"
+        shutil.copy(ACTIVE_CSV, csv_path)
+        snapshots = Path(tmp) / "snapshots"
+        first = load_catalog(str(csv_path), str(snapshots))
+        assert not isinstance(first.price_matrix, np.memmap)
+        assert isinstance(load_catalog(str(csv_path), str(snapshots)).price_matrix, np.memmap)
+
+        # Updating the CSV makes the old snapshot stale: the CSV is parsed again
+        first_row = csv_path.read_text(encoding="utf-8").splitlines()[1]
+        with open(csv_path, "a", encoding="utf-8") as f:
+            f.write("\n" + first_row.replace("01_002_0107_1_1", "99_999_9999_9_9"))
+        updated = load_catalog(str(csv_path), str(snapshots), write=False)
+        assert not isinstance(updated.price_matrix, np.memmap)
+        assert updated.version != first.version and "99_999_9999_9_9" in updated
+
+if __name__ == "__main__":
+    test_snapshot_matches_csv()
+    test_stale_snapshot_falls_back_to_csv()
+    print("All snapshot tests passed!")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Test script for the synthetic invoice generator."""
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path so we can import agents module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.codes import code_index
+from agents.rules import FastPathStats, RuleEngine, extract_line_items
+from agents.synthetic import FRAUD_PATTERNS, InvoiceGenerator, main, read_labels, write_corpus
+from agents.tools import get_catalogs
+from batch import list_invoices
+from helpers.file_helper import parse_file
+
+
+def test_deterministic():
+    generator = InvoiceGenerator(seed=7)
+    assert generator.invoice(42) == InvoiceGenerator(seed=7).invoice(42)
+    assert [i.invoice_id for i in generator.generate(3, start=10)] == ["SYN-7-0000010", "SYN-7-0000011", "SYN-7-0000012"]
+    assert generator.invoice(42).text != InvoiceGenerator(seed=8).invoice(42).text
+
+def test_clean_invoices_pass_rules():
+    engine = RuleEngine(stats=FastPathStats())
+    for invoice in InvoiceGenerator(seed=1, fraud_rate=0.0).generate(100):
+        assert invoice.is_valid and not invoice.fraud_patterns
+        items, malformed = extract_line_items(invoice.text)
+        assert len(items) == len(invoice.lines) and not malformed
+        response = engine.evaluate(invoice.text)
+        assert response is not None and response.is_valid, invoice.text
+
+def test_injected_fraud_is_caught():
+    catalogs = get_catalogs()
+    engine = RuleEngine(stats=FastPathStats())
+    for pattern in FRAUD_PATTERNS:
+        invoices = list(InvoiceGenerator(seed=2, fraud_rate=1.0, patterns=(pattern,)).generate(30))
+        assert all(not i.is_valid and i.fraud_patterns == [pattern] for i in invoices)
+        for invoice in invoices:
+            line = next(line for line in invoice.lines if line.fraud == pattern)
+            if pattern == "unknown_code":
+                assert line.item_code not in catalogs.active and line.item_code not in catalogs.inactive
+                assert not code_index(catalogs).suggest(line.item_code, max_distance=1)
+            elif pattern == "arithmetic_error":
+                assert abs(line.amount - line.quantity * line.rate) > 0.05
+            elif pattern == "wrong_location_tier":
+                assert invoice.location_type == "standard"
+            # The rule engine never passes a fraudulent invoice; some are left to the agent
+            response = engine.evaluate(invoice.text)
+            assert response is None or not response.is_valid, invoice.text
+
+def test_write_corpus():
+    with tempfile.TemporaryDirectory() as out:
+        summary = write_corpus(out, 20, seed=3, per_directory=8)
+        write_corpus(out, 5, seed=3, start=20, per_directory=8)
+        labels = read_labels(out)
+        assert len(labels) == 25 and summary["invoices"] == 20
+        assert summary["fraudulent"] == sum(not r["is_valid"] for r in labels[:20])
+        assert sorted(list_invoices(str(Path(out) / "manifest.txt"))) == sorted(r["file"] for r in labels)
+        assert len({Path(r["file"]).parent.name for r in labels}) == 4
+        first = labels[0]
+        assert Path(first["file"]).read_text() == InvoiceGenerator(seed=3).invoice(0).text
+        assert set(first) >= {"is_valid", "fraud_patterns", "fraud_lines", "state", "location_type"}
+
+def test_pdf_round_trip():
+    with tempfile.TemporaryDirectory() as out:
+        main(["generate", "--count", "3", "--out", out, "--pdf", "--seed", "4", "--fraud-rate", "0"])
+        engine = RuleEngine(stats=FastPathStats())
+        for record in read_labels(out):
+            with open(record["file"], "rb") as f:
+                parsed = parse_file(f)
+            assert parsed["type"] == "pdf" and record["invoice_id"] in parsed["data"]
+            response = engine.evaluate(parsed["data"])
+            assert response is not None and response.is_valid
+        with open(Path(out) / "labels.jsonl") as f:
+            assert json.loads(f.readline())["file"].endswith(".pdf")
+
+if __name__ == "__main__":
+    test_deterministic()
+    test_clean_invoices_pass_rules()
+    test_injected_fraud_is_caught()
+    test_write_corpus()
+    test_pdf_round_trip()
+    print("All synthetic invoice tests passed!")
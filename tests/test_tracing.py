@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Test script for per-stage tracing and the Prometheus metrics endpoint."""
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path so we can import agents module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+import server
+from agents.standard import StandardAgent
+from agents.tools import check_nids_item_exists
+from agents.tracing import (Histogram, PipelineMetrics, TracingCallbackHandler, metrics, stage, trace_invoice,
+                            tracing_config)
+from tests.test_agent_invoices import INVOICE_TEST_CASES
+from tests.test_server import wait_for
+
+
+def test_histogram():
+    histogram = Histogram("latency", "Latency", buckets=(0.1, 1.0, 10.0), labelnames=("stage",))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, stage="rules")
+    cumulative, total = histogram.series()[("rules",)]
+    assert cumulative == [1, 3, 4, 4] and total == 6.05
+    assert histogram.quantile(0.5, cumulative) == 0.55
+    samples = histogram.samples()
+    assert 'latency_bucket{stage="rules",le="1"} 3' in samples
+    assert 'latency_bucket{stage="rules",le="+Inf"} 4' in samples and 'latency_count{stage="rules"} 4' in samples
+
+def test_callback_handler_records_model_and_tool_calls():
+    registry = PipelineMetrics()
+    llm = GenericFakeChatModel(messages=iter([
+        AIMessage(content="ok", usage_metadata={"input_tokens": 120, "output_tokens": 30, "total_tokens": 150}),
+    ]))
+    with trace_invoice("TestAgent", registry=registry) as trace:
+        with stage("parsing"):
+            time.sleep(0.01)
+        llm.invoke("hello", config=tracing_config())
+        check_nids_item_exists.invoke({"item_code": "01_011_0107_1_1"}, config=tracing_config())
+    assert [span.kind for span in trace.spans] == ["stage", "model", "tool"]
+    assert trace.spans[0].seconds >= 0.01
+    assert trace.steps == 1 and trace.tool_calls == 1
+    assert trace.input_tokens == 120 and trace.output_tokens == 30
+    assert trace.spans[2].name == "check_nids_item_exists"
+    assert "1 model calls, 1 tool calls" in trace.summary()
+
+    text = registry.render()
+    assert 'nids_invoices_total{agent="TestAgent",outcome="ok"} 1' in text
+    assert 'nids_model_call_tokens_sum{model="unknown",direction="input"} 120' in text
+    assert 'nids_tool_call_seconds_count{tool="check_nids_item_exists"} 1' in text
+    assert "# TYPE nids_stage_seconds histogram" in text
+    assert any(row["metric"] == "agent_steps" and row["count"] == 1 for row in registry.summary())
+
+    # Nested traces share the outer one, and nothing is traced outside a trace
+    with trace_invoice("Outer", registry=registry) as outer:
+        with trace_invoice("Inner", registry=registry) as inner:
+            assert inner is outer
+    assert tracing_config() == {}
+    assert isinstance(TracingCallbackHandler(outer), TracingCallbackHandler)
+
+def test_agent_and_server_traces():
+    agent = StandardAgent(model="gpt-4o-mini")
+    with trace_invoice("StandardAgent", registry=None) as trace:
+        agent.process(INVOICE_TEST_CASES[2]["content"])
+    # Resolved by the rules: no model call
+    assert [span.name for span in trace.spans] == ["rules"] and trace.steps == 0
+
+    client = server.app.test_client()
+    response = client.post("/analyze", json={"text": INVOICE_TEST_CASES[2]["content"]})
+    job = wait_for(client, response.get_json()["job_id"])
+    assert job["trace"]["agent"] == "standard" and job["trace"]["spans"]
+
+    response = client.get("/metrics")
+    assert response.status_code == 200 and response.mimetype == "text/plain"
+    assert 'nids_invoice_seconds_count{agent="standard"}' in response.get_data(as_text=True)
+    assert metrics.invoices.value(agent="standard", outcome="ok") >= 1
+
+if __name__ == "__main__":
+    test_histogram()
+    test_callback_handler_records_model_and_tool_calls()
+    test_agent_and_server_traces()
+    print("All tracing tests passed!")
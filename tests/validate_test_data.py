@@ -38,9 +38,8 @@ for item_code, info in test_items.items():
     print(f"   Inactive: {'YES' if exists_inactive else 'NO'}")
 
     if exists_active and 'standard' in info:
-        row = nids_active.df[nids_active.df['Support Item Number'] == item_code].iloc[0]
-        actual_standard = float(str(row['ACT']).strip().replace(',', ''))
-        actual_remote = float(str(row['Remote']).strip().replace(',', ''))
+        actual_standard = nids_active.get_price(item_code, 'ACT')
+        actual_remote = nids_active.get_price(item_code, 'Remote')
 
         print(f"   Standard Price: ${actual_standard:.2f} (Expected: ${info['standard']:.2f}) {'✓' if abs(actual_standard - info['standard']) < 0.01 else '✗'}")
         print(f"   Remote Price: ${actual_remote:.2f} (Expected: ${info['remote']:.2f}) {'✓' if abs(actual_remote - info['remote']) < 0.01 else '✗'}")